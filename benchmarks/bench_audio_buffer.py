@@ -0,0 +1,73 @@
+"""
+Peak memory and float32 conversion time for a long recording, captured into a
+BytesIO (previous behaviour) versus an AudioBuffer.
+
+Usage: python3 benchmarks/bench_audio_buffer.py [--minutes 10]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vocalai.audio_buffer import AudioBuffer
+
+RATE = 16000
+CHUNK = 1024
+
+
+def capture(audio_buffer, minutes):
+    chunk = (np.random.default_rng(0).integers(-3000, 3000, CHUNK)).astype(np.int16).tobytes()
+    for _ in range(int(minutes * 60 * RATE / CHUNK)):
+        audio_buffer.write(chunk)
+
+
+def run_bytesio(minutes):
+    audio_buffer = BytesIO()
+    capture(audio_buffer, minutes)
+    start = time.perf_counter()
+    audio_data = np.frombuffer(audio_buffer.getvalue(), dtype=np.int16).astype(np.float32) / 32768.0
+    return time.perf_counter() - start, audio_data
+
+
+def run_audio_buffer(minutes):
+    audio_buffer = AudioBuffer(rate=RATE)
+    capture(audio_buffer, minutes)
+    start = time.perf_counter()
+    audio_data = audio_buffer.as_float32()
+    return time.perf_counter() - start, audio_data
+
+
+def measure(mode, minutes):
+    run = run_bytesio if mode == "bytesio" else run_audio_buffer
+    tracemalloc.start()
+    conversion_time, _ = run(minutes)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{mode:12s} conversion {conversion_time * 1000:8.1f} ms   "
+          f"traced peak {peak / 2**20:7.1f} MiB   max RSS {max_rss_kb / 1024:7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--mode", choices=["bytesio", "audio_buffer"])
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.mode, args.minutes)
+        return
+    # one process per mode so max RSS is not shared between them
+    for mode in ("bytesio", "audio_buffer"):
+        subprocess.run([sys.executable, __file__, "--mode", mode, "--minutes", str(args.minutes)], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Offline end-to-end latency of the listen -> transcribe -> LLM -> TTS -> play
+loop, without a microphone, GPU, speaker or Ollama.
+
+A WAV fixture is fed to SpeechRecognizer in place of the PyAudio stream, the
+LLM is a local OllamaStubServer streaming canned tokens, TTS is either a
+timing-accurate fake or the real model on CPU, and playback goes to a sink.
+Vosk and whisper are faked too unless model paths are given. Latencies come
+from the tracing spans of each turn.
+
+Usage: python3 benchmarks/bench_e2e.py [--turns 5] [--speed 4]
+           [--baseline benchmarks/e2e_baseline.json [--threshold 0.2] | --save-baseline PATH]
+           [--vosk-model PATH] [--whisper-model small.en] [--tts-model tts_models/en/jenny/jenny]
+
+Exits with status 1 when a p50 or p95 regresses past the threshold.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vocalai.pipeline import build_pipeline
+from vocalai.audio_player import AudioPlayer
+from vocalai.audio_source import WavFileStream
+from vocalai.llm_interaction import LLMInteraction
+from vocalai.ollama_stub import OllamaStubServer
+from vocalai.pcm import PCMBuffer
+from vocalai.speech_recognition import SpeechRecognizer
+from vocalai.tracing import current_span, get_tracer
+from vocalai.util import AppConfig
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'test_data', 'pcm_phrase.wav')
+ANSWER = ("Sure, here is a short answer. It has a few sentences of different lengths. "
+          "The third one is here to keep the speaker busy for a while. That is all.")
+# regressions smaller than this are noise, whatever the relative change
+ABSOLUTE_SLACK_SECONDS = 0.005
+
+
+class FakeVosk:
+    """
+    KaldiRecognizer stand-in that "hears" the EOM phrase when the WAV ends.
+    """
+    def __init__(self, stream, eom_phrase, transcript):
+        self.stream = stream
+        self.eom_phrase = eom_phrase
+        self.transcript = transcript
+
+    def AcceptWaveform(self, data):
+        return False
+
+    def PartialResult(self):
+        partial = f"{self.transcript} {self.eom_phrase}" if self.stream.exhausted else ""
+        return json.dumps({"partial": partial})
+
+    def Result(self):
+        return json.dumps({"text": ""})
+
+    def FinalResult(self):
+        return json.dumps({"text": json.loads(self.PartialResult())["partial"]})
+
+    def Reset(self):
+        pass
+
+
+class FakeWhisper:
+    def __init__(self, transcript, rtf):
+        self.transcript = transcript
+        self.rtf = rtf
+
+    def transcribe(self, audio, **options):
+        time.sleep(len(audio) / 16000.0 * self.rtf)
+        return {"text": self.transcript}
+
+
+class FakeTTS:
+    """
+    TTSHandler stand-in: takes rtf times as long as the audio it returns,
+    which lasts seconds_per_char per character.
+    """
+    device = "cuda"
+
+    def __init__(self, rtf, seconds_per_char=0.06, sample_rate=22050):
+        self.rtf = rtf
+        self.seconds_per_char = seconds_per_char
+        self.sample_rate = sample_rate
+
+    def get_audio(self, text):
+        audio_seconds = len(text) * self.seconds_per_char
+        with get_tracer().span("tts_synthesis", chars=len(text), audio_seconds=audio_seconds, cached=False):
+            time.sleep(audio_seconds * self.rtf)
+            return PCMBuffer(bytes(int(audio_seconds * self.sample_rate) * 2), sample_rate=self.sample_rate)
+
+
+class SinkStream:
+    def __init__(self, speed):
+        self.speed = speed
+
+    def write(self, pcm):
+        if self.speed:
+            time.sleep(pcm.duration / self.speed)
+
+    def pending(self):
+        return 0.0
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SinkBackend:
+    """
+    Playback backend that discards audio, taking duration / speed seconds.
+    """
+    def __init__(self, speed):
+        self.speed = speed
+
+    def open_stream(self, pcm):
+        return SinkStream(self.speed)
+
+
+class SpanCollector:
+    def __init__(self):
+        self.spans = []
+        self._changed = threading.Condition()
+
+    def export(self, span):
+        with self._changed:
+            self.spans.append(span)
+            self._changed.notify_all()
+
+    def close(self):
+        pass
+
+    def for_trace(self, trace_id, name):
+        return [span for span in self.spans if span.trace.trace_id == trace_id and span.name == name]
+
+    def wait_for(self, predicate, timeout):
+        with self._changed:
+            return self._changed.wait_for(predicate, timeout)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summarize(collector):
+    samples = {}
+    for span in collector.spans:
+        if "eom" not in span.trace.marks or span.name == "capture":
+            # capture includes waiting for the previous turn; "listen" is the real figure
+            continue
+        samples.setdefault(span.name, []).append(span.duration)
+        if span.name == "llm_request" and "time_to_first_token" in span.attributes:
+            samples.setdefault("llm_first_token", []).append(span.attributes["time_to_first_token"])
+    traces = {span.trace.trace_id: span.trace for span in collector.spans}
+    for trace_id, trace in traces.items():
+        playback = collector.for_trace(trace_id, "playback")
+        if "eom" in trace.marks and playback:
+            samples.setdefault("end_to_end", []).append(max(span.end_time for span in playback) - trace.marks["eom"])
+    return {name: {"count": len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95),
+                   "max": max(values)}
+            for name, values in samples.items()}
+
+
+def compare(summary, baseline, threshold):
+    regressions = []
+    for name, stats in sorted(summary.items()):
+        if name not in baseline:
+            continue
+        for key in ("p50", "p95"):
+            limit = baseline[name][key] * (1 + threshold) + ABSOLUTE_SLACK_SECONDS
+            if stats[key] > limit:
+                regressions.append(f"{name} {key} {stats[key] * 1000:.1f} ms > "
+                                   f"{limit * 1000:.1f} ms (baseline {baseline[name][key] * 1000:.1f} ms)")
+    return regressions
+
+
+def build_components(args, config, stream):
+    speech_recognizer = SpeechRecognizer(config, stream=stream)
+    if args.vosk_model:
+        speech_recognizer._load_fast_recognizer()
+        # a recording will not contain the EOM phrase, so end turns on the pause after it
+        speech_recognizer.set_endpointing("pause")
+    else:
+        speech_recognizer.recognizer = FakeVosk(stream, config.eom_phrase, args.transcript)
+    if args.whisper_model:
+        speech_recognizer._load_whisper()
+    else:
+        speech_recognizer.whisper_model = FakeWhisper(args.transcript, args.whisper_rtf)
+
+    if args.tts_model:
+        from vocalai.tts_handler import TTSHandler
+        tts_handler = TTSHandler(config)
+    else:
+        tts_handler = FakeTTS(args.tts_rtf)
+    audio_player = AudioPlayer(backend=SinkBackend(args.playback_speed))
+    return speech_recognizer, LLMInteraction(config), tts_handler, audio_player
+
+
+def run(args):
+    collector = SpanCollector()
+    get_tracer().add_exporter(collector)
+    tokens = [word + " " for word in ANSWER.split()]
+
+    with OllamaStubServer(tokens=tokens, token_delay=args.token_delay) as stub:
+        config = AppConfig({
+            "llm_url": stub.url, "llm_model": "stub", "instructions": "",
+            "tts_model_path": args.tts_model or "", "tts_device": "cpu", "tts_cache_dir": None,
+            # every turn repeats the same answer, so a cache would hide synthesis time
+            "tts_cache_memory_bytes": 0,
+            "whisper_model_name": args.whisper_model or "", "vosk_model_path": args.vosk_model or "",
+            "stop_phrase": "stop", "eom_phrase": "porcupine", "end_session_phrase": "stop session",
+            "silence_threshold": -40, "eom_pause_duration": 1.0, "trim_silence": True,
+        })
+        stream = WavFileStream(args.wav, speed=args.speed)
+        speech_recognizer, llm_interaction, tts_handler, audio_player = build_components(args, config, stream)
+        pipeline = build_pipeline(speech_recognizer, llm_interaction, tts_handler, audio_player)
+
+        turns = []
+        listen_one_turn = speech_recognizer.listen
+
+        def wait_for_turn(trace_id):
+            # the answer is done once every sentence the LLM stage emitted was played
+            def finished():
+                llm = collector.for_trace(trace_id, "llm")
+                return bool(llm) and len(collector.for_trace(trace_id, "play")) >= llm[0].attributes.get("items", 0)
+            if not collector.wait_for(finished, timeout=60):
+                raise RuntimeError(f"turn {trace_id} did not finish within 60s")
+            audio_player.wait_done(timeout=60)
+
+        def listen():
+            if turns:
+                wait_for_turn(turns[-1])
+            if len(turns) == args.turns:
+                speech_recognizer.end_session_flag = True
+                pipeline.stop()
+                return None
+            # listen runs inside the capture span of the turn's trace
+            turns.append(current_span().trace.trace_id)
+            stream.rewind()
+            # the capture stage span also covers the wait above, so time listening on its own
+            with get_tracer().span("listen"):
+                return listen_one_turn()
+
+        speech_recognizer.listen = listen
+        start = time.monotonic()
+        pipeline.start()
+        pipeline.join()
+        wall = time.monotonic() - start
+        audio_player.cleanup()
+    print(f"{args.turns} turns in {wall:.1f}s ({stream.duration:.1f}s of audio per turn at {args.speed}x)")
+    return summarize(collector)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("wav", nargs="?", default=DEFAULT_FIXTURE)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--speed", type=float, default=4.0, help="WAV feed speed relative to real time, 0 = unpaced")
+    parser.add_argument("--playback-speed", type=float, default=8.0, help="sink playback speed, 0 = instant")
+    parser.add_argument("--transcript", default="what is the weather like today")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between stub LLM tokens")
+    parser.add_argument("--whisper-rtf", type=float, default=0.1, help="fake whisper seconds per audio second")
+    parser.add_argument("--tts-rtf", type=float, default=0.2, help="fake TTS seconds per audio second")
+    parser.add_argument("--vosk-model")
+    parser.add_argument("--whisper-model")
+    parser.add_argument("--tts-model")
+    parser.add_argument("--baseline")
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    summary = run(args)
+    print(f"{'metric':18s} {'count':>5s} {'p50 ms':>9s} {'p95 ms':>9s} {'max ms':>9s}")
+    for name, stats in sorted(summary.items()):
+        print(f"{name:18s} {stats['count']:5d} {stats['p50'] * 1000:9.1f} {stats['p95'] * 1000:9.1f} "
+              f"{stats['max'] * 1000:9.1f}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(summary, baseline_file, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(summary, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+EventManager dispatch latency and throughput with several threads publishing
+and subscribing at once, in synchronous and async (worker queue) mode. Also
+reports how long a stop_audio event waits when the queue is already busy.
+
+Usage: python3 benchmarks/bench_event_manager.py [--threads 4] [--events 20000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vocalai.event_manager import EventManager
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(mode, threads, events, handler_seconds):
+    EventManager.reset_instance()
+    event_manager = EventManager.get_instance()
+    latencies = []
+    stop_latencies = []
+    lock = threading.Lock()
+
+    def on_event(sent):
+        if handler_seconds:
+            time.sleep(handler_seconds)
+        with lock:
+            latencies.append(time.perf_counter() - sent)
+
+    def on_stop(sent):
+        with lock:
+            stop_latencies.append(time.perf_counter() - sent)
+
+    event_manager.subscribe("audio_started", on_event)
+    event_manager.subscribe("stop_audio", on_stop)
+    if mode == "async":
+        event_manager.start_dispatcher()
+
+    per_thread = events // threads
+    done = threading.Event()
+
+    def publisher():
+        for i in range(per_thread):
+            event_manager.publish("audio_started", time.perf_counter())
+            if i % 100 == 0:
+                event_manager.publish("stop_audio", time.perf_counter())
+
+    def churn():
+        # subscribe/unsubscribe traffic competing with the publishers
+        while not done.is_set():
+            callback = lambda data: None
+            event_manager.subscribe("audio_started", callback)
+            event_manager.unsubscribe("audio_started", callback)
+
+    workers = [threading.Thread(target=publisher) for _ in range(threads)]
+    churner = threading.Thread(target=churn)
+    start = time.perf_counter()
+    churner.start()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    publish_seconds = time.perf_counter() - start
+    event_manager.wait_idle()
+    total_seconds = time.perf_counter() - start
+    done.set()
+    churner.join()
+    EventManager.reset_instance()
+
+    delivered = len(latencies)
+    print(f"{mode:6s} published {delivered:6d} in {publish_seconds * 1000:8.1f} ms "
+          f"(publishers blocked {publish_seconds / delivered * 1e6:6.1f} us/event)   "
+          f"delivered {delivered / total_seconds:9.0f} events/s   "
+          f"latency p50 {statistics.median(latencies) * 1e6:8.1f} us  p99 {percentile(latencies, 0.99) * 1e6:9.1f} us   "
+          f"stop_audio p99 {percentile(stop_latencies, 0.99) * 1e6:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--handler-us", type=float, default=0.0,
+                        help="simulated work per routine event handler")
+    args = parser.parse_args()
+    for mode in ("sync", "async"):
+        run(mode, args.threads, args.events, args.handler_us / 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compares post-EOM whisper latency of full-buffer and incremental transcription.
+
+Usage: python3 benchmarks/bench_incremental_transcription.py [wav ...] [--model small.en]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vocalai.incremental_transcriber import IncrementalTranscriber
+from vocalai.util import load_wav
+
+RATE = 16000
+CHUNK = 1024
+DEFAULT_FIXTURES = [os.path.join(os.path.dirname(__file__), '..', 'tests', 'test_data', 'pcm_phrase.wav')]
+
+
+def full_buffer(model, samples):
+    start = time.monotonic()
+    text = model.transcribe(samples.astype(np.float32) / 32768.0)["text"].strip()
+    return text, time.monotonic() - start
+
+
+def incremental(model, samples):
+    transcriber = IncrementalTranscriber(model, rate=RATE).start()
+    data = samples.tobytes()
+    for i in range(0, len(data), CHUNK * 2):
+        transcriber.feed(data[i:i + CHUNK * 2])
+        time.sleep(CHUNK / RATE)  # the microphone delivers audio in real time
+    text = transcriber.finish()
+    return text, transcriber.post_eom_latency
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("wavs", nargs="*", default=DEFAULT_FIXTURES)
+    parser.add_argument("--model", default="small.en")
+    args = parser.parse_args()
+
+    import whisper
+    model = whisper.load_model(args.model)
+
+    for path in args.wavs:
+        samples = load_wav(path)
+        full_text, full_latency = full_buffer(model, samples)
+        inc_text, inc_latency = incremental(model, samples)
+        print(f"{os.path.basename(path)} ({len(samples) / RATE:.1f}s audio)")
+        print(f"  full buffer: {full_latency:.3f}s post-EOM  '{full_text}'")
+        print(f"  incremental: {inc_latency:.3f}s post-EOM  '{inc_text}'")
+        print(f"  transcripts match: {full_text == inc_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Microphone overflows caused by logging from the capture loop while the log
+sink is slow (e.g. a backed-up syslog daemon). Compares handlers called on the
+capture thread (previous setup) with the queued, rate-limited setup.
+
+A producer thread stands in for PyAudio: it delivers a chunk every
+chunk/rate seconds into a small input buffer and counts an overflow whenever
+the buffer is full.
+
+Usage: python3 benchmarks/bench_logging.py [--seconds 5] [--sink-ms 30]
+"""
+import argparse
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vocalai.logger import DroppingQueueHandler, RateLimitFilter
+
+RATE = 16000
+CHUNK = 1024
+INPUT_BUFFER_CHUNKS = 4
+
+
+class SlowHandler(logging.Handler):
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+        self.setFormatter(logging.Formatter('%(asctime)s - %(name)s - [%(levelname)s] %(message)s'))
+        self.emitted = 0
+
+    def emit(self, record):
+        self.format(record)
+        time.sleep(self.delay)
+        self.emitted += 1
+
+
+def run(mode, seconds, sink_delay):
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.DEBUG)
+    sink = SlowHandler(sink_delay)
+    listener = None
+    if mode == "direct":
+        root.addHandler(sink)
+    else:
+        queue_handler = DroppingQueueHandler(queue.Queue(maxsize=10000))
+        queue_handler.addFilter(RateLimitFilter(interval=1.0, burst=10))
+        root.addHandler(queue_handler)
+        listener = logging.handlers.QueueListener(queue_handler.queue, sink)
+        listener.start()
+
+    logger = logging.getLogger("vocalai.speech_recognition")
+    input_buffer = collections.deque()
+    available = threading.Condition()
+    overflows = 0
+    done = threading.Event()
+
+    def microphone():
+        nonlocal overflows
+        period = CHUNK / float(RATE)
+        next_time = time.perf_counter()
+        while not done.is_set():
+            next_time += period
+            time.sleep(max(0.0, next_time - time.perf_counter()))
+            with available:
+                if len(input_buffer) >= INPUT_BUFFER_CHUNKS:
+                    overflows += 1
+                    input_buffer.popleft()
+                input_buffer.append(b"\x00\x00" * CHUNK)
+                available.notify()
+
+    producer = threading.Thread(target=microphone)
+    producer.start()
+    chunks = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        with available:
+            available.wait_for(lambda: input_buffer, timeout=0.5)
+            if not input_buffer:
+                continue
+            input_buffer.popleft()
+        chunks += 1
+        # what the capture loop logs per chunk at DEBUG
+        logger.debug("Recognized text: '%s'", "hello there")
+        logger.debug("chunk level %.1f dBFS", -42.0)
+        logger.info("You Said: '%s'", "hello there")
+    done.set()
+    producer.join()
+    if listener is not None:
+        listener.stop()
+    root.removeHandler(root.handlers[0])
+    print(f"{mode:7s} chunks read {chunks:5d}   microphone overflows {overflows:5d}   records written {sink.emitted:5d}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--sink-ms", type=float, default=30.0, help="time the log sink takes per record")
+    args = parser.parse_args()
+    for mode in ("direct", "queued"):
+        run(mode, args.seconds, args.sink_ms / 1000.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Whisper throughput against batch size, and latency against the batching
+window, for BatchTranscriber on the CPU.
+
+1. Throughput: --requests utterances submitted at once, decoded with
+   max_batch 1, 2, 4, 8.
+2. Queueing: utterances arrive as a Poisson process at --arrival-rate per
+   second, and each window in --windows is tried with max_batch 8. Reports
+   p50/p95 latency from submit to result, so a window can be chosen that keeps
+   p95 acceptable.
+
+Utterances are cut from the WAV fixture. Without a downloaded checkpoint,
+--random-dims builds a randomly initialised model with the dimensions of a
+released one; its timings are representative, its transcripts are not.
+
+Usage: python3 benchmarks/bench_whisper_batching.py [--model tiny.en | --random-dims tiny]
+           [--requests 8] [--windows 0,0.05,0.1,0.2] [--arrival-rate 1.0] [--max-tokens 32]
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from vocalai.batch_transcriber import BatchTranscriber
+from vocalai.util import load_wav
+
+RATE = 16000
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'test_data', 'pcm_phrase.wav')
+RANDOM_DIMS = {
+    "tiny": dict(n_audio_state=384, n_audio_head=6, n_audio_layer=4,
+                 n_text_state=384, n_text_head=6, n_text_layer=4),
+    "base": dict(n_audio_state=512, n_audio_head=8, n_audio_layer=6,
+                 n_text_state=512, n_text_head=8, n_text_layer=6),
+}
+
+
+def load_model(args):
+    import whisper
+    if not args.random_dims:
+        return whisper.load_model(args.model, device="cpu")
+    from whisper.model import ModelDimensions, Whisper
+    torch.manual_seed(0)
+    dims = ModelDimensions(n_mels=80, n_vocab=51864, n_audio_ctx=1500, n_text_ctx=448,
+                           **RANDOM_DIMS[args.random_dims])
+    return Whisper(dims).eval()
+
+
+def utterances(path, seconds, count):
+    samples = load_wav(path).astype(np.float32) / 32768.0
+    size = int(seconds * RATE)
+    clips = [samples[start:start + size] for start in range(0, max(1, len(samples) - size + 1), size)]
+    return list(itertools.islice(itertools.cycle(clips), count))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def throughput(model, audio, max_batch, max_tokens):
+    transcriber = BatchTranscriber(model, window_seconds=0.0, max_batch=max_batch, max_tokens=max_tokens)
+    # queue everything before the scheduler starts, so batches are full
+    futures = [transcriber.submit(clip) for clip in audio]
+    start = time.monotonic()
+    transcriber.start()
+    for future in futures:
+        future.result()
+    elapsed = time.monotonic() - start
+    transcriber.stop()
+    return len(audio) / elapsed, transcriber.stats()
+
+
+def queueing(model, audio, window, arrival_rate, max_tokens, seed=0):
+    transcriber = BatchTranscriber(model, window_seconds=window, max_batch=8, max_tokens=max_tokens).start()
+    arrivals = random.Random(seed)
+    latencies = []
+    futures = []
+    start = time.monotonic()
+    for clip in audio:
+        submitted = time.monotonic()
+        future = transcriber.submit(clip)
+        future.add_done_callback(lambda _, submitted=submitted: latencies.append(time.monotonic() - submitted))
+        futures.append(future)
+        time.sleep(arrivals.expovariate(arrival_rate))
+    for future in futures:
+        future.result()
+    elapsed = time.monotonic() - start
+    transcriber.stop()
+    return latencies, len(audio) / elapsed, transcriber.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("wav", nargs="?", default=DEFAULT_FIXTURE)
+    parser.add_argument("--model", default="tiny.en")
+    parser.add_argument("--random-dims", choices=sorted(RANDOM_DIMS))
+    parser.add_argument("--seconds", type=float, default=3.0, help="length of each utterance")
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--batch-sizes", default="1,2,4,8")
+    parser.add_argument("--windows", default="0,0.05,0.1,0.2")
+    parser.add_argument("--arrival-rate", type=float, default=1.0, help="utterances per second")
+    parser.add_argument("--max-tokens", type=int, help="fixes the decode length; default 32 with --random-dims")
+    parser.add_argument("--threads", type=int, help="torch CPU threads")
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    max_tokens = args.max_tokens or (32 if args.random_dims else None)
+
+    model = load_model(args)
+    audio = utterances(args.wav, args.seconds, args.requests)
+    print(f"{args.random_dims or args.model} on CPU ({torch.get_num_threads()} threads), "
+          f"{len(audio)} utterances of {args.seconds:.1f}s")
+
+    print(f"{'max_batch':>9s} {'utt/s':>7s} {'speedup':>8s} {'mean batch':>10s}")
+    base = None
+    for max_batch in (int(size) for size in args.batch_sizes.split(",")):
+        rate, stats = throughput(model, audio, max_batch, max_tokens)
+        base = base or rate
+        print(f"{max_batch:9d} {rate:7.2f} {rate / base:7.2f}x {stats['mean_batch_size']:10.1f}")
+
+    print(f"\narrivals at {args.arrival_rate:.1f}/s, max_batch 8")
+    print(f"{'window ms':>9s} {'p50 ms':>8s} {'p95 ms':>8s} {'utt/s':>7s} {'mean batch':>10s}")
+    for window in (float(value) for value in args.windows.split(",")):
+        latencies, rate, stats = queueing(model, audio, window, args.arrival_rate, max_tokens)
+        print(f"{window * 1000:9.0f} {percentile(latencies, 0.5) * 1000:8.0f} "
+              f"{percentile(latencies, 0.95) * 1000:8.0f} {rate:7.2f} {stats['mean_batch_size']:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
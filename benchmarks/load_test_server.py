@@ -0,0 +1,211 @@
+"""
+Load test for the multi-session websocket server: N simulated clients each
+speak a few turns in real time and wait for the spoken reply, against one
+server with shared fake models (whisper and TTS sleep for a configurable
+fraction of the audio they process) and a local stub LLM.
+
+Reports the reply latency (end of the user's pause to the first reply audio)
+across all clients, how many clients were turned away, and the per-session
+stats the server sends at the end.
+
+Usage: python3 benchmarks/load_test_server.py [--clients 6] [--max-sessions 4]
+           [--turns 3] [--whisper-rtf 0.1] [--tts-rtf 0.2]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import connect
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_e2e import ANSWER, FakeTTS, FakeWhisper, percentile
+from vocalai.llm_client import LLMClient
+from vocalai.ollama_stub import OllamaStubServer
+from vocalai.server import SharedModels, VoiceServer
+from vocalai.util import AppConfig
+
+RATE = 16000
+CHUNK_BYTES = 2048
+PAUSE_SECONDS = 0.5
+VAD_HANGOVER_SECONDS = 0.2
+
+
+class SilentRecognizer:
+    """
+    Vosk stand-in that never hears a phrase; turns end on the pause.
+    """
+    def AcceptWaveform(self, data):
+        return False
+
+    def PartialResult(self):
+        return json.dumps({"partial": ""})
+
+    def Result(self):
+        return json.dumps({"text": ""})
+
+    def FinalResult(self):
+        return json.dumps({"text": ""})
+
+    def Reset(self):
+        pass
+
+
+def utterance(seconds):
+    # syllable-like bursts of a tone, loud enough for the VAD
+    t = np.arange(int(seconds * RATE)) / float(RATE)
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    return (np.sin(2 * np.pi * 180 * t) * envelope * 6000).astype(np.int16).tobytes()
+
+
+class Client(threading.Thread):
+    """
+    One simulated user. A microphone thread streams silence continuously, as
+    a real client would, with the utterance spliced in at the start of each
+    turn.
+    """
+    def __init__(self, url, turns, speech):
+        super().__init__(daemon=True)
+        self.url = url
+        self.turns = turns
+        self.speech = speech
+        self.latencies = []
+        self.rejected = False
+        self.stats = None
+        self.error = None
+        self._to_say = []
+        self._said = threading.Event()
+        self._speech_sent_at = None
+        self._stopped = threading.Event()
+
+    def _microphone(self, client):
+        silence = bytes(CHUNK_BYTES)
+        next_time = time.monotonic()
+        pending = b""
+        while not self._stopped.is_set():
+            if not pending and self._to_say:
+                pending = self._to_say.pop()
+            chunk, pending = (pending[:CHUNK_BYTES], pending[CHUNK_BYTES:]) if pending else (silence, b"")
+            try:
+                client.send(chunk)
+            except ConnectionClosed:
+                return
+            if chunk is not silence and not pending:
+                self._speech_sent_at = time.monotonic()
+                self._said.set()
+            next_time += CHUNK_BYTES / 2.0 / RATE
+            time.sleep(max(0.0, next_time - time.monotonic()))
+
+    def _say(self):
+        self._said.clear()
+        self._to_say.append(self.speech)
+        self._said.wait()
+        # the VAD holds speech for its hangover before the pause starts counting
+        return self._speech_sent_at + VAD_HANGOVER_SECONDS + PAUSE_SECONDS
+
+    def _wait_for_reply(self, client, pause_ended):
+        first_audio = None
+        playback_end = None
+        while True:
+            timeout = 30.0 if playback_end is None else playback_end - time.monotonic() + 0.2
+            try:
+                message = client.recv(timeout=max(0.01, timeout))
+            except TimeoutError:
+                return
+            if not isinstance(message, str):
+                continue
+            message = json.loads(message)
+            if message["type"] != "audio":
+                continue
+            now = time.monotonic()
+            if first_audio is None:
+                first_audio = now
+                self.latencies.append(max(0.0, now - pause_ended))
+            seconds = message["bytes"] / 2.0 / message["channels"] / message["sample_rate"]
+            playback_end = max(playback_end or now, now) + seconds
+
+    def run(self):
+        try:
+            with connect(self.url, max_size=None) as client:
+                hello = json.loads(client.recv(timeout=10))
+                if hello["type"] == "error":
+                    self.rejected = True
+                    return
+                microphone = threading.Thread(target=self._microphone, args=(client,), daemon=True)
+                microphone.start()
+                for _ in range(self.turns):
+                    self._wait_for_reply(client, self._say())
+                self._stopped.set()
+                microphone.join()
+                client.send(json.dumps({"type": "end"}))
+                while self.stats is None:
+                    message = client.recv(timeout=10)
+                    if isinstance(message, str) and json.loads(message)["type"] == "stats":
+                        self.stats = json.loads(message)
+        except ConnectionClosed as e:
+            self.rejected = e.rcvd is not None and e.rcvd.code == 1013
+            if not self.rejected:
+                self.error = e
+        except Exception as e:
+            self.error = e
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=6)
+    parser.add_argument("--max-sessions", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--speech-seconds", type=float, default=1.5)
+    parser.add_argument("--whisper-rtf", type=float, default=0.1, help="fake whisper seconds per audio second")
+    parser.add_argument("--tts-rtf", type=float, default=0.2, help="fake TTS seconds per audio second")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between stub LLM tokens")
+    args = parser.parse_args()
+
+    tokens = [word + " " for word in ANSWER.split()]
+    with OllamaStubServer(tokens=tokens, token_delay=args.token_delay) as stub:
+        config = AppConfig({
+            "llm_url": stub.url, "llm_model": "stub", "instructions": "",
+            "stop_phrase": "stop", "eom_phrase": "porcupine", "end_session_phrase": "stop session",
+            "endpointing": "pause", "silence_threshold": -40, "eom_pause_duration": PAUSE_SECONDS,
+            "event_dispatch": "async",
+        })
+        models = SharedModels(lambda rate: SilentRecognizer(), FakeWhisper("what time is it", args.whisper_rtf),
+                              FakeTTS(args.tts_rtf, seconds_per_char=0.01), LLMClient(stub.url))
+        server = VoiceServer(config, models, port=0, max_sessions=args.max_sessions).start()
+
+        speech = utterance(args.speech_seconds)
+        clients = [Client(server.url, args.turns, speech) for _ in range(args.clients)]
+        start = time.monotonic()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        wall = time.monotonic() - start
+        server.stop()
+        models.close()
+
+    latencies = [latency for client in clients for latency in client.latencies]
+    served = [client for client in clients if client.stats is not None]
+    print(f"{args.clients} clients, {args.max_sessions} sessions max, {args.turns} turns each, {wall:.1f}s wall")
+    print(f"served {len(served)}   rejected {sum(client.rejected for client in clients)}   "
+          f"errors {sum(client.error is not None for client in clients)}")
+    if latencies:
+        print(f"reply latency over {len(latencies)} turns: p50 {percentile(latencies, 0.5) * 1000:.0f} ms   "
+              f"p95 {percentile(latencies, 0.95) * 1000:.0f} ms   max {max(latencies) * 1000:.0f} ms")
+    for client in served:
+        stats = client.stats
+        busy = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stats["busy_time"].items())
+        print(f"  session {stats['session']}: {stats['turns']} turns, {stats['audio_seconds_in']:.1f}s in, "
+              f"{stats['audio_seconds_out']:.1f}s out, busy: {busy}")
+    for client in clients:
+        if client.error is not None:
+            print(f"  client error: {client.error!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,61 @@
 import logging
 from vocalai.audio_player import AudioPlayer
+from vocalai.event_manager import EventManager
+from vocalai.pipeline import build_pipeline
 from vocalai.speech_recognition import SpeechRecognizer
+from vocalai.startup import StartupOrchestrator
+from vocalai import tracing
 from vocalai.llm_interaction import LLMInteraction
 from vocalai.tts_handler import TTSHandler
 from vocalai.util import load_config, AppConfig
-from vocalai.logger import setup_logging
+from vocalai.logger import setup_logging_from_config, shutdown_logging
 
 
 def main():
-    setup_logging()
-    logger = logging.getLogger(__name__)
-
     config_dict = load_config("config.json")
     config = AppConfig(config_dict)
+    setup_logging_from_config(config)
+    logger = logging.getLogger(__name__)
     logger.info("Config loaded")
+    tracer = tracing.configure(config)
 
     audio_player = AudioPlayer()
     llm_interaction = LLMInteraction(config)
     speech_recognizer = SpeechRecognizer(config)
-    tts_handler = TTSHandler(config)
 
+    startup = StartupOrchestrator()
+    startup.add("vosk", speech_recognizer._load_fast_recognizer, speech_recognizer.warm_up_fast_recognizer, imports=("vosk",))
+    startup.add("whisper", speech_recognizer._load_whisper, speech_recognizer.warm_up_whisper, imports=("whisper",))
+    startup.add("tts", lambda: TTSHandler(config), TTSHandler.warm_up, imports=("TTS.api",))
+    if getattr(config, "preload_llm", True):
+        startup.add("ollama", llm_interaction.preload)
+    tts_handler = startup.run()["tts"]
+    startup.write_report(getattr(config, "startup_report_path", "startup_times.jsonl"))
+
+    event_manager = EventManager.get_instance()
+    if getattr(config, "event_dispatch", "sync") == "async":
+        event_manager.start_dispatcher()
+    event_manager.publish("ready", None)
     logger.info("Init completed")
 
-    while True:
-        logger.debug("Started main loop")
-        audio_prompt = speech_recognizer.listen_until_stop_phrase()
-        logger.debug("audio prompt acquired")
-        text_prompt = speech_recognizer.transcribe(audio_prompt)
-        logger.debug("text prompt acquired")
-        cleaned_prompt = speech_recognizer.remove_command_words(text_prompt)
-        logger.debug("cleaned prompt acquired")
-        llm_answer = llm_interaction.query_llm(cleaned_prompt)
-        logger.debug("llm answer acquired")
-        audio_response = tts_handler.get_audio(llm_answer)
-        logger.debug("audio response acquired")
-        audio_player.play(audio_response)
-        logger.debug("audio player completed")
-
-        if speech_recognizer.end_session_flag:
-            logger.debug("end session flag detected, breaking main loop")
-            break
+    pipeline = build_pipeline(speech_recognizer, llm_interaction, tts_handler, audio_player)
+    # flush before the player stops, so the play stage cannot queue a stale
+    # sentence in between
+    event_manager.subscribe("stop_audio", pipeline.flush, synchronous=True, first=True)
+    event_manager.subscribe("end_session", pipeline.stop)
+
+    pipeline.start()
+    pipeline.join()
+    logger.debug("pipeline stopped")
+    pipeline.log_stats()
 
     logger.debug("running cleanup on audio_player and speech_recognizer")
     audio_player.cleanup()
     speech_recognizer.cleanup()
+    event_manager.stop_dispatcher()
+    tracer.close()
     logger.debug("end of file reached")
+    shutdown_logging()
 
 if __name__ == "__main__":
     main()
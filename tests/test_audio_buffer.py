@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+from vocalai.audio_buffer import AudioBuffer
+
+
+def write_in_chunks(audio_buffer, samples, chunk=4):
+    for i in range(0, len(samples), chunk):
+        audio_buffer.write(samples[i:i + chunk].tobytes())
+
+
+class TestAudioBuffer(unittest.TestCase):
+    def test_grows_in_blocks_without_losing_audio(self):
+        samples = np.arange(-500, 500, dtype=np.int16)
+        audio_buffer = AudioBuffer(rate=100, block_seconds=0.3)
+        write_in_chunks(audio_buffer, samples, chunk=7)
+        self.assertEqual(len(samples), len(audio_buffer))
+        self.assertEqual(10.0, audio_buffer.duration)
+        np.testing.assert_array_equal(samples, audio_buffer.samples())
+        self.assertEqual(samples.tobytes(), audio_buffer.getvalue())
+
+    def test_as_float32_matches_reference_conversion(self):
+        samples = np.array([-32768, -1, 0, 1, 32767] * 50, dtype=np.int16)
+        audio_buffer = AudioBuffer(rate=100, block_seconds=0.3)
+        write_in_chunks(audio_buffer, samples)
+        expected = samples.astype(np.float32) / 32768.0
+        np.testing.assert_array_equal(expected, audio_buffer.as_float32())
+        np.testing.assert_array_equal(expected[10:], audio_buffer.as_float32(start=10))
+
+    def test_as_float32_reuses_scratch(self):
+        audio_buffer = AudioBuffer(rate=100, block_seconds=1)
+        audio_buffer.write(np.ones(100, dtype=np.int16).tobytes())
+        first = audio_buffer.as_float32()
+        second = audio_buffer.as_float32()
+        self.assertTrue(np.shares_memory(first, second))
+
+    def test_ring_overflow_keeps_newest_audio(self):
+        samples = np.arange(57, dtype=np.int16)
+        audio_buffer = AudioBuffer(rate=10, block_seconds=1, max_seconds=3, overflow="ring")
+        write_in_chunks(audio_buffer, samples)
+        kept = audio_buffer.samples()
+        np.testing.assert_array_equal(samples[-len(kept):], kept)
+        self.assertLessEqual(len(kept), 30)
+        self.assertEqual(len(samples) - len(kept), audio_buffer.dropped_samples)
+        self.assertEqual(3, len(audio_buffer._blocks))
+
+    def test_spill_overflow_keeps_everything(self):
+        samples = np.arange(57, dtype=np.int16)
+        audio_buffer = AudioBuffer(rate=10, block_seconds=1, max_seconds=3, overflow="spill")
+        write_in_chunks(audio_buffer, samples)
+        self.assertEqual(3, len(audio_buffer._blocks))
+        np.testing.assert_array_equal(samples, audio_buffer.samples())
+        np.testing.assert_array_equal(samples[25:].astype(np.float32) / 32768.0, audio_buffer.as_float32(start=25))
+        audio_buffer.close()
+        self.assertEqual(0, len(audio_buffer))
+
+    def test_invalid_overflow(self):
+        with self.assertRaises(ValueError):
+            AudioBuffer(overflow="grow")
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from vocalai.audio_cache import AudioCache, cache_key, normalize_text
+
+
+class TestAudioCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "tts")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key_uses_normalized_text_model_and_format(self):
+        key = cache_key("Hello   there.\n", "model-a", "wav")
+        self.assertEqual(key, cache_key(" Hello there.", "model-a", "wav"))
+        self.assertNotEqual(key, cache_key("Hello there.", "model-b", "wav"))
+        self.assertNotEqual(key, cache_key("Hello there.", "model-a", "pcm"))
+        self.assertNotEqual(key, cache_key("hello there.", "model-a", "wav"))
+        self.assertEqual("a b", normalize_text("  a \t b "))
+
+    def test_memory_hit_and_miss(self):
+        cache = AudioCache(memory_bytes=100)
+        self.assertIsNone(cache.get("k"))
+        cache.put("k", b"audio")
+        self.assertEqual(b"audio", cache.get("k"))
+        self.assertEqual(1, cache.stats.memory_hits)
+        self.assertEqual(1, cache.stats.misses)
+
+    def test_memory_lru_is_byte_bounded(self):
+        cache = AudioCache(memory_bytes=10)
+        cache.put("a", b"12345")
+        cache.put("b", b"12345")
+        cache.get("a")  # "b" is now least recently used
+        cache.put("c", b"12345")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(b"12345", cache.get("a"))
+        self.assertEqual(1, cache.stats.memory_evictions)
+
+    def test_disk_tier_survives_restart(self):
+        cache = AudioCache(memory_bytes=100, cache_dir=self.cache_dir)
+        cache.put("k", b"audio")
+
+        reopened = AudioCache(memory_bytes=100, cache_dir=self.cache_dir)
+        self.assertEqual(b"audio", reopened.get("k"))
+        self.assertEqual(1, reopened.stats.disk_hits)
+        # promoted into memory
+        self.assertEqual(b"audio", reopened.get("k"))
+        self.assertEqual(1, reopened.stats.memory_hits)
+
+    def test_disk_tier_evicts_least_recently_used(self):
+        cache = AudioCache(memory_bytes=0, cache_dir=self.cache_dir, disk_bytes=10)
+        cache.put("a", b"12345")
+        cache.put("b", b"12345")
+        cache.get("a")
+        cache.put("c", b"12345")
+        self.assertEqual(1, cache.stats.disk_evictions)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(b"12345", cache.get("a"))
+        self.assertEqual(2, len([n for n in os.listdir(self.cache_dir) if n.endswith(".audio")]))
+
+    def test_clear(self):
+        cache = AudioCache(cache_dir=self.cache_dir)
+        cache.put("k", b"audio")
+        cache.clear()
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual([], os.listdir(self.cache_dir))
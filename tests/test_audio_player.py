@@ -1,6 +1,10 @@
+import threading
+import time
 import unittest
+import wave
+from io import BytesIO
 from unittest.mock import MagicMock, patch
-from vocalai.audio_player import AudioPlayer
+from vocalai.audio_player import AudioPlayer, PCMBuffer
 import simpleaudio as sa
 
 
@@ -13,7 +17,7 @@ class TestAudioPlayer(unittest.TestCase):
 
     def test_init(self):
         """Test initialization of AudioPlayer."""
-        self.mock_event_manager.subscribe.assert_called_with("stop_audio", self.audio_player.stop)
+        self.mock_event_manager.subscribe.assert_called_with("stop_audio", self.audio_player.stop, synchronous=True)
         self.assertIsNone(self.audio_player.audio_thread)
         self.assertIsNone(self.audio_player.play_obj)
 
@@ -43,7 +47,8 @@ class TestAudioPlayer(unittest.TestCase):
         self.audio_player.stop()
         self.audio_player.play_obj.stop.assert_called_once()
         mock_thread.join.assert_called_with(timeout=1)
-        self.mock_event_manager.publish.assert_called_with("audio_stopped", None)
+        # the playback thread reports audio_stopped itself when it ends
+        self.mock_event_manager.publish.assert_not_called()
 
     def test_is_playing(self):
         """Test is_playing method."""
@@ -52,3 +57,141 @@ class TestAudioPlayer(unittest.TestCase):
         self.assertTrue(self.audio_player.is_playing())
         self.audio_player.play_obj.is_playing.return_value = False
         self.assertFalse(self.audio_player.is_playing())
+
+
+class FakeStream:
+    """
+    Plays written audio in real time from a small device buffer, counting an
+    underrun whenever a write comes after the buffer ran dry.
+    """
+    def __init__(self, pcm, buffer_seconds=0.05):
+        self.format = (pcm.channels, pcm.sample_width, pcm.sample_rate)
+        self.buffer_seconds = buffer_seconds
+        self.data = bytearray()
+        self.ends_at = None
+        self.underruns = 0
+        self.stopped = threading.Event()
+        self.closed = False
+
+    def write(self, pcm):
+        now = time.monotonic()
+        if self.ends_at is not None and self.ends_at < now:
+            self.underruns += 1
+        self.ends_at = max(self.ends_at or now, now) + pcm.duration
+        self.data += pcm.data
+        time.sleep(max(0, self.ends_at - time.monotonic() - self.buffer_seconds))
+
+    def pending(self):
+        return max(0.0, self.ends_at - time.monotonic()) if self.ends_at is not None else 0.0
+
+    def stop(self):
+        self.stopped.set()
+        self.ends_at = time.monotonic()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeBackend:
+    def __init__(self):
+        self.streams = []
+
+    def open_stream(self, pcm):
+        stream = FakeStream(pcm)
+        self.streams.append(stream)
+        return stream
+
+
+class TestAudioPlayerQueue(unittest.TestCase):
+    @patch('vocalai.audio_player.EventManager.get_instance')
+    def setUp(self, mock_event_manager):
+        self.mock_event_manager = mock_event_manager.return_value
+        self.backend = FakeBackend()
+        self.audio_player = AudioPlayer(backend=self.backend)
+
+    def tearDown(self):
+        self.audio_player.cleanup()
+
+    def _pcm(self, seconds, rate=8000):
+        return PCMBuffer(b"\x00\x00" * int(seconds * rate), sample_rate=rate)
+
+    def _wav(self, seconds, rate=8000):
+        buffer = BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(rate)
+            wav_file.writeframes(b"\x00\x00" * int(seconds * rate))
+        buffer.seek(0)
+        return buffer
+
+    def _wait_for(self, condition, timeout=2):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertTrue(condition())
+
+    def _published(self, event):
+        return [c.args for c in self.mock_event_manager.publish.call_args_list].count((event, None))
+
+    def test_buffers_play_back_to_back(self):
+        for _ in range(3):
+            self.audio_player.enqueue(self._pcm(0.1))
+        self.assertTrue(self.audio_player.wait_done(timeout=2))
+        # one stream for the whole run, never running dry between buffers
+        self.assertEqual(1, len(self.backend.streams))
+        self.assertEqual(0, self.backend.streams[0].underruns)
+        self.assertEqual(3 * len(self._pcm(0.1).data), len(self.backend.streams[0].data))
+
+    def test_audio_stopped_after_the_output_played_out(self):
+        self.audio_player.enqueue(self._pcm(0.1))
+        self.assertTrue(self.audio_player.wait_done(timeout=2))
+        self.assertEqual(0.0, self.backend.streams[0].pending())
+
+    def test_format_change_reopens_the_stream(self):
+        self.audio_player.enqueue(self._pcm(0.02))
+        self.audio_player.enqueue(self._pcm(0.02, rate=16000))
+        self.assertTrue(self.audio_player.wait_done(timeout=2))
+        self.assertEqual([(1, 2, 8000), (1, 2, 16000)], [stream.format for stream in self.backend.streams])
+        self.assertTrue(self.backend.streams[0].closed)
+
+    def test_wave_input_is_converted(self):
+        self.audio_player.enqueue(self._wav(0.02, rate=16000))
+        self.assertTrue(self.audio_player.wait_done(timeout=2))
+        stream = self.backend.streams[0]
+        self.assertEqual((1, 2, 16000), stream.format)
+        self.assertEqual(640, len(stream.data))
+
+    def test_started_and_stopped_published_once_per_run(self):
+        for _ in range(3):
+            self.audio_player.enqueue(self._pcm(0.02))
+        self.assertTrue(self.audio_player.wait_done(timeout=2))
+        self._wait_for(lambda: self._published("audio_stopped") == 1)
+        self.assertEqual(1, self._published("audio_started"))
+
+    def test_flush_stops_within_one_buffer(self):
+        for _ in range(5):
+            self.audio_player.enqueue(self._pcm(0.2))
+        time.sleep(0.05)
+        start = time.monotonic()
+        self.audio_player.flush()
+        self.assertTrue(self.audio_player.wait_done(timeout=1))
+        self.assertLess(time.monotonic() - start, 0.2)
+        self.assertEqual(1, len(self.backend.streams))
+        self.assertTrue(self.backend.streams[0].stopped.is_set())
+
+    def test_stop_audio_flushes_queue(self):
+        for _ in range(3):
+            self.audio_player.enqueue(self._pcm(0.2))
+        time.sleep(0.05)
+        self.audio_player.stop()
+        self.assertTrue(self.audio_player.wait_done(timeout=1))
+        self.assertLess(len(self.backend.streams[0].data), len(self._pcm(0.2).data))
+        self._wait_for(lambda: self._published("audio_stopped") == 1)
+        time.sleep(0.05)
+        self.assertEqual(1, self._published("audio_stopped"))
+
+    def test_players_do_not_share_a_lock(self):
+        other = AudioPlayer(backend=FakeBackend())
+        self.addCleanup(other.cleanup)
+        self.assertIsNot(self.audio_player._lock, other._lock)
@@ -0,0 +1,111 @@
+import os
+import socket
+import sys
+import time
+import unittest
+import numpy as np
+from unittest.mock import MagicMock, patch
+from vocalai.audio_source import (AudioSource, PipeSource, PyAudioSource, SocketSource, WavFileSource,
+                                  WavFileStream, create_audio_source)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'test_data', '591282__awchacon__stop.wav')
+
+
+class TestWavFileStream(unittest.TestCase):
+    def test_reads_file_then_silence(self):
+        stream = WavFileStream(FIXTURE, speed=0)
+        chunks = []
+        while not stream.exhausted:
+            chunks.append(stream.read(1024))
+        read = b"".join(chunks)
+        self.assertEqual(stream.data, read[:len(stream.data)])
+        self.assertEqual(bytes(len(read) - len(stream.data)), read[len(stream.data):])
+        self.assertIsNotNone(stream.exhausted_at)
+        self.assertEqual(bytes(2048), stream.read(1024))
+
+        stream.rewind()
+        self.assertFalse(stream.exhausted)
+        self.assertEqual(stream.data[:2048], stream.read(1024))
+
+    def test_paces_like_a_microphone(self):
+        stream = WavFileStream(FIXTURE, speed=4.0)
+        start = time.monotonic()
+        for _ in range(8):
+            stream.read(1024)
+        # 8 chunks of 64 ms at 4x, the first one is not delayed
+        self.assertGreater(time.monotonic() - start, 0.1)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_resamples_to_mono_16k(self):
+        stream = WavFileStream(FIXTURE, rate=16000)
+        self.assertAlmostEqual(0.824, stream.duration, places=2)
+        self.assertGreater(np.abs(np.frombuffer(stream.data, dtype=np.int16)).max(), 0)
+
+
+class TestAudioSource(unittest.TestCase):
+    def test_read_rechunks_pushed_audio(self):
+        source = AudioSource(rate=16000, chunk=4).start()
+        source._push(b"\x01\x00" * 3)
+        source._push(b"\x02\x00" * 3)
+        self.assertEqual(b"\x01\x00" * 3 + b"\x02\x00", source.read(4))
+        source._end()
+        self.assertEqual(b"\x02\x00" * 2, source.read(4))
+        self.assertIsNone(source.read(4))
+        self.assertTrue(source.ended)
+
+    def test_overflow_drops_oldest_and_counts(self):
+        source = AudioSource(rate=1000, chunk=100, max_queue_seconds=0.3).start()
+        for value in range(5):
+            source._push(bytes([value, 0]) * 100)
+        self.assertEqual(2, source.overflows)
+        self.assertEqual(200, source.dropped_frames)
+        self.assertEqual(500, source.captured_frames)
+        self.assertEqual(bytes([2, 0]) * 100, source.read(100))
+
+    def test_capture_does_not_wait_for_consumer(self):
+        source = WavFileSource(FIXTURE, chunk=1024, speed=0).start()
+        deadline = time.monotonic() + 2
+        while source.overflows == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        source.stop()
+        self.assertGreater(source.overflows, 0)
+        self.assertGreater(source.captured_frames, source.dropped_frames)
+
+    def test_pipe_source_until_eof(self):
+        read_fd, write_fd = os.pipe()
+        source = PipeSource(os.fdopen(read_fd, "rb"), chunk=4).start()
+        with os.fdopen(write_fd, "wb") as pipe:
+            # an odd number of bytes per write must not split samples
+            pipe.write(b"\x01\x00\x02")
+            pipe.flush()
+            pipe.write(b"\x00\x03\x00")
+        self.assertEqual(b"\x01\x00\x02\x00\x03\x00", source.read(4))
+        self.assertIsNone(source.read(4))
+        source.close()
+
+    def test_socket_source(self):
+        source = SocketSource(port=0, chunk=2).start()
+        with socket.create_connection(source.address) as client:
+            client.sendall(b"\x05\x00" * 4)
+        self.assertEqual(b"\x05\x00" * 2, source.read(2))
+        self.assertEqual(b"\x05\x00" * 2, source.read(2))
+        self.assertIsNone(source.read(2))
+        source.close()
+
+    def test_pyaudio_callback_counts_device_overflows(self):
+        fake_pyaudio = MagicMock(paInputOverflow=2, paContinue=0)
+        with patch.dict(sys.modules, {"pyaudio": fake_pyaudio}):
+            source = PyAudioSource(chunk=2).start()
+        _, kwargs = fake_pyaudio.PyAudio.return_value.open.call_args
+        self.assertEqual(source._callback, kwargs["stream_callback"])
+        self.assertEqual((None, 0), source._callback(b"\x01\x00" * 2, 2, {}, 0))
+        source._callback(b"\x02\x00" * 2, 2, {}, fake_pyaudio.paInputOverflow)
+        self.assertEqual(1, source.device_overflows)
+        self.assertEqual(b"\x01\x00" * 2, source.read(2))
+
+    def test_create_audio_source(self):
+        config = MagicMock(audio_source=f"wav:{FIXTURE}", audio_queue_seconds=1.0)
+        self.assertIsInstance(create_audio_source(config), WavFileSource)
+        config.audio_source = "telepathy"
+        with self.assertRaises(ValueError):
+            create_audio_source(config)
@@ -0,0 +1,100 @@
+import unittest
+import numpy as np
+import torch
+from whisper.model import ModelDimensions, Whisper
+from vocalai.batch_transcriber import BatchTranscriber
+
+
+class FakeModel:
+    is_multilingual = False
+    device = torch.device("cpu")
+
+    def __init__(self):
+        self.transcribe_calls = []
+
+    def transcribe(self, audio, **options):
+        self.transcribe_calls.append(options)
+        return {"text": "single", "segments": []}
+
+
+class RecordingTranscriber(BatchTranscriber):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_sizes = []
+
+    def decode_batch(self, audios):
+        self.batch_sizes.append(len(audios))
+        return [f"{len(audio)} samples" for audio in audios]
+
+
+def tiny_whisper():
+    torch.manual_seed(0)
+    dims = ModelDimensions(n_mels=80, n_vocab=51864, n_audio_ctx=1500, n_audio_state=64, n_audio_head=2,
+                           n_audio_layer=1, n_text_ctx=448, n_text_state=64, n_text_head=2, n_text_layer=1)
+    return Whisper(dims).eval()
+
+
+class TestBatchTranscriber(unittest.TestCase):
+
+    def test_requests_within_window_are_decoded_together(self):
+        transcriber = RecordingTranscriber(FakeModel(), window_seconds=0.5, max_batch=8).start()
+        self.addCleanup(transcriber.stop)
+        futures = [transcriber.submit(np.zeros(1600 * (i + 1), dtype=np.float32)) for i in range(3)]
+        results = [future.result(timeout=5) for future in futures]
+        self.assertEqual(transcriber.batch_sizes, [3])
+        self.assertEqual([result["text"] for result in results], ["1600 samples", "3200 samples", "4800 samples"])
+        self.assertEqual(transcriber.stats()["mean_batch_size"], 3.0)
+
+    def test_batches_are_capped_at_max_batch(self):
+        transcriber = RecordingTranscriber(FakeModel(), window_seconds=0.0, max_batch=2)
+        futures = [transcriber.submit(np.zeros(1600, dtype=np.float32)) for _ in range(5)]
+        transcriber.start()
+        self.addCleanup(transcriber.stop)
+        for future in futures:
+            future.result(timeout=5)
+        self.assertEqual(transcriber.batch_sizes, [2, 2, 1])
+
+    def test_requests_with_options_or_long_audio_are_not_batched(self):
+        model = FakeModel()
+        transcriber = RecordingTranscriber(model, window_seconds=0.2).start()
+        self.addCleanup(transcriber.stop)
+        prompted = transcriber.submit(np.zeros(1600, dtype=np.float32), initial_prompt="hello")
+        long = transcriber.submit(np.zeros(16000 * 31, dtype=np.float32))
+        short = transcriber.submit(np.zeros(1600, dtype=np.float32))
+        self.assertEqual(prompted.result(timeout=5)["text"], "single")
+        self.assertEqual(long.result(timeout=5)["text"], "single")
+        self.assertEqual(short.result(timeout=5)["text"], "1600 samples")
+        self.assertEqual(model.transcribe_calls, [{"initial_prompt": "hello"}, {}])
+        self.assertEqual(transcriber.batch_sizes, [1])
+
+    def test_failed_batch_fails_every_future(self):
+        transcriber = BatchTranscriber(FakeModel(), window_seconds=0.1)
+        transcriber.decode_batch = lambda audios: 1 / 0
+        transcriber.start()
+        self.addCleanup(transcriber.stop)
+        futures = [transcriber.submit(np.zeros(1600, dtype=np.float32)) for _ in range(2)]
+        for future in futures:
+            with self.assertRaises(ZeroDivisionError):
+                future.result(timeout=5)
+
+    def test_stop_fails_queued_and_later_requests(self):
+        transcriber = RecordingTranscriber(FakeModel(), window_seconds=0.0)
+        queued = transcriber.submit(np.zeros(1600, dtype=np.float32))
+        transcriber.stop()
+        with self.assertRaises(RuntimeError):
+            queued.result(timeout=1)
+        with self.assertRaises(RuntimeError):
+            transcriber.transcribe(np.zeros(1600, dtype=np.float32))
+        self.assertEqual(transcriber.batch_sizes, [])
+
+    def test_batched_whisper_decode_matches_one_at_a_time(self):
+        model = tiny_whisper()
+        rng = np.random.default_rng(0)
+        audios = [rng.standard_normal(16000 * seconds).astype(np.float32) * 0.1 for seconds in (1, 2, 3)]
+        transcriber = BatchTranscriber(model, max_tokens=4)
+        single = [transcriber.decode_batch([audio])[0] for audio in audios]
+        self.assertEqual(transcriber.decode_batch(audios), single)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from vocalai.conversation import Conversation, estimate_tokens
+
+
+class TestConversation(unittest.TestCase):
+
+    def test_first_turn_sends_instructions_and_prompt(self):
+        conversation = Conversation()
+        self.assertEqual(conversation.request("Be brief. ", "hello"), {"prompt": "Be brief. hello"})
+
+    def test_returned_context_is_sent_back(self):
+        conversation = Conversation()
+        conversation.record("hello", "hi there", {"done": True, "context": [1, 2, 3], "prompt_eval_count": 5})
+        self.assertEqual(conversation.request("Be brief. ", "how are you"),
+                         {"prompt": "how are you", "context": [1, 2, 3]})
+        self.assertEqual(conversation.prompt_eval_counts, [5])
+
+    def test_full_context_falls_back_to_recent_history(self):
+        conversation = Conversation(context_tokens=100, history_tokens=30, response_tokens=10)
+        for index in range(5):
+            conversation.record(f"question {index}", f"answer {index}", {"done": True, "context": [0] * 95})
+        payload = conversation.request("Be brief. ", "next")
+        self.assertNotIn("context", payload)
+        self.assertTrue(payload["prompt"].startswith("Be brief. Conversation so far:\n"))
+        self.assertTrue(payload["prompt"].endswith("next"))
+        self.assertIn("question 4", payload["prompt"])
+        self.assertNotIn("question 0", payload["prompt"])
+        self.assertLessEqual(estimate_tokens(payload["prompt"]), 30 + estimate_tokens("Be brief. next") + 5)
+        self.assertEqual(conversation.rebuilds, 1)
+
+    def test_interrupted_answer_drops_the_context(self):
+        conversation = Conversation()
+        conversation.record("hello", "hi there", {"done": True, "context": [1, 2, 3]})
+        conversation.record("tell me a story", "once upon", None)
+        payload = conversation.request("", "go on")
+        self.assertNotIn("context", payload)
+        self.assertIn("Assistant: once upon", payload["prompt"])
+
+    def test_dropped_turns_are_summarized(self):
+        prompts = []
+
+        def summarizer(prompt):
+            prompts.append(prompt)
+            return "The user asked about the weather."
+
+        conversation = Conversation(history_tokens=20, summarizer=summarizer)
+        for index in range(4):
+            conversation.record(f"what is the weather on day {index}", "sunny", None)
+        payload = conversation.request("", "and tomorrow")
+        self.assertIn("Summary of the earlier conversation: The user asked about the weather.", payload["prompt"])
+        self.assertIn("day 0", prompts[0])
+        # turns folded into the summary are not summarized again
+        conversation.record("and tomorrow", "rain", None)
+        conversation.request("", "thanks")
+        self.assertEqual(len(prompts), 2)
+        self.assertIn("Earlier summary: The user asked about the weather.", prompts[1])
+        self.assertNotIn("day 0", prompts[1])
+
+    def test_provisional_request_changes_no_state(self):
+        prompts = []
+        conversation = Conversation(history_tokens=20, summarizer=lambda prompt: prompts.append(prompt) or "summary")
+        for index in range(4):
+            conversation.record(f"what is the weather on day {index}", "sunny", None)
+        payload = conversation.request("", "and tomorrow", provisional=True)
+        self.assertIn("day 3", payload["prompt"])
+        self.assertNotIn("day 0", payload["prompt"])
+        self.assertEqual(prompts, [])
+        self.assertEqual(conversation.rebuilds, 0)
+        # the committed request still summarizes what was left out
+        conversation.request("", "and tomorrow")
+        self.assertEqual(len(prompts), 1)
+        self.assertEqual(conversation.rebuilds, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,6 @@
+import threading
 import unittest
+from collections import Counter
 from unittest.mock import Mock
 from vocalai.event_manager import EventManager
 
@@ -41,6 +43,14 @@ class TestEventManager(unittest.TestCase):
         self.assertEqual(mock_callback, event_manager.listeners["event_name"][0])
         self.assertEqual(mock_callback1, event_manager.listeners["event_name"][1])
 
+    def test_subscribe_first_runs_before_earlier_listeners(self):
+        event_manager = EventManager()
+        order = []
+        event_manager.subscribe("stop_audio", lambda: order.append("player"), synchronous=True)
+        event_manager.subscribe("stop_audio", lambda: order.append("pipeline"), synchronous=True, first=True)
+        event_manager.publish("stop_audio", None)
+        self.assertEqual(["pipeline", "player"], order)
+
     def test_publish(self):
         event_manager = EventManager()
         mock_callback = Mock()
@@ -64,3 +74,103 @@ class TestEventManager(unittest.TestCase):
         event_manager.subscribe("event_name", mock_callback1)
         event_manager.unsubscribe("event_name", mock_callback)
         self.assertIn("event_name", event_manager.listeners)
+
+    def test_publish_without_listeners_is_noop(self):
+        event_manager = EventManager()
+        event_manager.publish("nobody_listens", "data")
+
+    def test_listener_errors_do_not_stop_delivery(self):
+        event_manager = EventManager()
+        failing = Mock(side_effect=ValueError("boom"))
+        mock_callback = Mock()
+        event_manager.subscribe("event_name", failing)
+        event_manager.subscribe("event_name", mock_callback)
+        event_manager.publish("event_name", None)
+        mock_callback.assert_called_once_with()
+
+    def test_subscribe_while_publishing(self):
+        event_manager = EventManager()
+        late_callback = Mock()
+
+        def subscribe_another():
+            event_manager.subscribe("event_name", late_callback)
+
+        event_manager.subscribe("event_name", subscribe_another)
+        event_manager.publish("event_name", None)
+        late_callback.assert_not_called()
+        self.assertEqual(2, len(event_manager.listeners["event_name"]))
+
+
+class TestEventManagerDispatcher(unittest.TestCase):
+    def setUp(self):
+        EventManager.reset_instance()
+        self.event_manager = EventManager.get_instance()
+        self.event_manager.start_dispatcher()
+
+    def tearDown(self):
+        EventManager.reset_instance()
+
+    def test_async_delivery_on_worker_thread(self):
+        threads = []
+        self.event_manager.subscribe("event_name", lambda data: threads.append(threading.current_thread()))
+        self.event_manager.publish("event_name", "data")
+        self.assertTrue(self.event_manager.wait_idle(timeout=1))
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.current_thread(), threads[0])
+
+    def test_synchronous_listener_runs_on_publisher_thread(self):
+        threads = []
+        async_callback = Mock()
+        self.event_manager.subscribe("stop_audio", lambda: threads.append(threading.current_thread()), synchronous=True)
+        self.event_manager.subscribe("stop_audio", async_callback)
+        self.event_manager.publish("stop_audio", None)
+        self.assertEqual([threading.current_thread()], threads)
+        self.assertTrue(self.event_manager.wait_idle(timeout=1))
+        async_callback.assert_called_once_with()
+
+    def test_priority_lane_jumps_queue(self):
+        order = []
+        release = threading.Event()
+        self.event_manager.subscribe("blocker", lambda: release.wait(1))
+        self.event_manager.subscribe("audio_started", lambda: order.append("audio_started"))
+        self.event_manager.subscribe("stop_audio", lambda: order.append("stop_audio"))
+
+        self.event_manager.publish("blocker", None)
+        self.event_manager.publish("audio_started", None)
+        self.event_manager.publish("audio_started", None)
+        self.event_manager.publish("stop_audio", None)
+        release.set()
+
+        self.assertTrue(self.event_manager.wait_idle(timeout=1))
+        self.assertEqual(["stop_audio", "audio_started", "audio_started"], order)
+
+    def test_concurrent_publish_and_subscribe(self):
+        counter = Counter()
+        self.event_manager.subscribe("event_name", lambda data: counter.update([data]))
+
+        def publisher(name):
+            for _ in range(200):
+                self.event_manager.publish("event_name", name)
+
+        def subscriber():
+            for _ in range(200):
+                callback = Mock()
+                self.event_manager.subscribe("event_name", callback)
+                self.event_manager.unsubscribe("event_name", callback)
+
+        threads = [threading.Thread(target=publisher, args=(f"p{i}",)) for i in range(4)]
+        threads.append(threading.Thread(target=subscriber))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(self.event_manager.wait_idle(timeout=5))
+        self.assertEqual({f"p{i}": 200 for i in range(4)}, dict(counter))
+
+    def test_stop_dispatcher_returns_to_synchronous_delivery(self):
+        mock_callback = Mock()
+        self.event_manager.subscribe("event_name", mock_callback)
+        self.event_manager.stop_dispatcher()
+        self.event_manager.publish("event_name", "data")
+        mock_callback.assert_called_once_with("data")
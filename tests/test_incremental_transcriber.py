@@ -0,0 +1,110 @@
+import threading
+import unittest
+import numpy as np
+from vocalai.incremental_transcriber import IncrementalTranscriber
+
+RATE = 16000
+
+
+class FakeWhisper:
+    """
+    Decodes audio made of constant-valued blocks: a block with value k/100 is
+    the word "wk". A block cut off by the end of the audio decodes to a
+    garbled word, like a real model hearing half a word.
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe(self, audio, **options):
+        self.calls += 1
+        values = np.rint(audio * 32768.0 / 100).astype(int)
+        segments = []
+        start = None
+        for i in range(len(values) + 1):
+            value = values[i] if i < len(values) else 0
+            if start is not None and value != values[start]:
+                word = f" w{values[start]}"
+                if i == len(values):
+                    word += "-"
+                segments.append({"start": start / RATE, "end": i / RATE, "text": word})
+                start = None
+            if start is None and value != 0 and i < len(values):
+                start = i
+        return {"text": "".join(s["text"] for s in segments), "segments": segments}
+
+
+def make_speech(words, word_seconds=0.4, gap_seconds=0.2):
+    parts = []
+    for k in words:
+        parts.append(np.full(int(word_seconds * RATE), k * 100, dtype=np.int16))
+        parts.append(np.zeros(int(gap_seconds * RATE), dtype=np.int16))
+    return np.concatenate(parts)
+
+
+class TestIncrementalTranscriber(unittest.TestCase):
+    """
+    Drives the passes with step() after every chunk instead of a background
+    thread, as if whisper always kept up, so the results do not depend on
+    timing.
+    """
+    def _feed(self, transcriber, samples, chunk=1024):
+        data = samples.tobytes()
+        for i in range(0, len(data), chunk * 2):
+            transcriber.feed(data[i:i + chunk * 2])
+            transcriber.step()
+
+    def test_matches_full_buffer_transcription(self):
+        model = FakeWhisper()
+        samples = make_speech(range(1, 31))
+        expected = model.transcribe(samples.astype(np.float32) / 32768.0)["text"].strip()
+
+        transcriber = IncrementalTranscriber(model, rate=RATE, step_seconds=1.0, overlap_seconds=0.5)
+        self._feed(transcriber, samples)
+        text = transcriber.finish()
+
+        self.assertEqual(expected, text)
+        self.assertGreater(transcriber.passes, 1)
+        self.assertGreater(transcriber.committed_sample, 0)
+
+    def test_only_tail_is_decoded_after_eom(self):
+        model = FakeWhisper()
+        samples = make_speech(range(1, 21))
+        transcriber = IncrementalTranscriber(model, rate=RATE, step_seconds=1.0, overlap_seconds=0.5)
+        self._feed(transcriber, samples)
+        committed_before_eom = transcriber.committed_sample
+        calls_before_eom = model.calls
+        transcriber.finish()
+        self.assertGreater(committed_before_eom, len(samples) // 2)
+        self.assertEqual(calls_before_eom + 1, model.calls)
+        self.assertIsNotNone(transcriber.post_eom_latency)
+
+    def test_never_commits_words_cut_at_window_edge(self):
+        model = FakeWhisper()
+        transcriber = IncrementalTranscriber(model, rate=RATE, step_seconds=0.5, overlap_seconds=0.3)
+        self._feed(transcriber, make_speech([1, 2, 3, 4, 5, 6]))
+        for segment in transcriber.committed_segments:
+            self.assertNotIn("-", segment["text"])
+        self.assertEqual("w1 w2 w3 w4 w5 w6", transcriber.finish())
+
+    def test_short_audio_is_decoded_at_finish(self):
+        model = FakeWhisper()
+        transcriber = IncrementalTranscriber(model, rate=RATE)
+        self._feed(transcriber, make_speech([7]))
+        self.assertEqual("w7", transcriber.finish())
+        self.assertEqual(0, transcriber.passes)
+
+    def test_silence_only(self):
+        transcriber = IncrementalTranscriber(FakeWhisper(), rate=RATE, step_seconds=0.5, max_window_seconds=1.0)
+        self._feed(transcriber, np.zeros(RATE * 3, dtype=np.int16))
+        # silence is skipped instead of growing the window past max_window_seconds
+        self.assertGreater(transcriber.committed_sample, RATE)
+        self.assertEqual("", transcriber.finish())
+
+    def test_background_thread_runs_passes(self):
+        transcriber = IncrementalTranscriber(FakeWhisper(), rate=RATE, step_seconds=0.5).start()
+        passed = threading.Event()
+        step = transcriber.step
+        transcriber.step = lambda: step() and passed.set()
+        transcriber.feed(make_speech([1, 2]).tobytes())
+        self.assertTrue(passed.wait(timeout=2))
+        self.assertEqual("w1 w2", transcriber.finish())
@@ -0,0 +1,146 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+import requests
+from vocalai.llm_client import AsyncLLMClient, LLMClient, LLMRequestError
+from vocalai.ollama_stub import OllamaStubServer
+
+
+class TestLLMClient(unittest.TestCase):
+    def setUp(self):
+        self.stub = OllamaStubServer(tokens=["a", "b", "c"]).start()
+        self.client = LLMClient(self.stub.url, retry_backoff=0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.stub.stop()
+
+    def test_stream_yields_chunks_until_done(self):
+        chunks = list(self.client.stream({"model": "m", "prompt": "p"}))
+        self.assertEqual(["a", "b", "c", ""], [c["response"] for c in chunks])
+        self.assertTrue(chunks[-1]["done"])
+
+    def test_keep_alive_reuses_connection(self):
+        for _ in range(4):
+            list(self.client.stream({"model": "m", "prompt": "p"}))
+        self.assertEqual(1, len(set(self.stub.client_ports)))
+        metrics = self.client.metrics.as_dict()
+        self.assertEqual(4, metrics["requests"])
+        self.assertEqual(1, metrics["connections_opened"])
+        self.assertEqual(3, metrics["connections_reused"])
+
+    def test_retries_gateway_errors(self):
+        self.stub.fail_first = 2
+        chunks = list(self.client.stream({"model": "m", "prompt": "p"}))
+        self.assertEqual("a", chunks[0]["response"])
+        self.assertEqual(3, len(self.stub.requests))
+        self.assertEqual(2, self.client.metrics.retries)
+
+    def test_gives_up_after_max_retries(self):
+        self.stub.fail_first = 5
+        with self.assertRaises(LLMRequestError) as context:
+            list(self.client.stream({"model": "m", "prompt": "p"}))
+        self.assertEqual(503, context.exception.status_code)
+        self.assertEqual(3, len(self.stub.requests))
+        self.assertEqual(1, self.client.metrics.failures)
+
+    def test_client_errors_are_not_retried(self):
+        self.stub.fail_first = 1
+        self.stub.fail_status = 400
+        with self.assertRaises(LLMRequestError):
+            list(self.client.stream({"model": "m", "prompt": "p"}))
+        self.assertEqual(1, len(self.stub.requests))
+
+    def test_read_timeout(self):
+        self.stub.token_delay = 0.5
+        client = LLMClient(self.stub.url, read_timeout=0.1, max_retries=0)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            list(client.stream({"model": "m", "prompt": "p"}))
+        client.close()
+
+    def test_connection_refused_is_retried_then_raised(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        client = LLMClient(f"http://127.0.0.1:{port}/api/generate", max_retries=1, retry_backoff=0.01)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            list(client.stream({"model": "m", "prompt": "p"}))
+        self.assertEqual(1, client.metrics.retries)
+        client.close()
+
+    def _read_in_background(self, stream):
+        chunks = []
+        reader = threading.Thread(target=lambda: chunks.extend(stream), daemon=True)
+        reader.start()
+        return reader, chunks
+
+    def test_open_stream_can_be_cancelled_during_prefill(self):
+        self.stub.prefill_delay = 5.0
+        stream = self.client.open_stream({"model": "m", "prompt": "p"})
+        reader, chunks = self._read_in_background(stream)
+        while not self.stub.requests:
+            time.sleep(0.01)
+        start = time.monotonic()
+        stream.close()
+        reader.join(2)
+        self.assertFalse(reader.is_alive())
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(chunks, [])
+        self.assertEqual(len(self.stub.requests), 1)  # not retried
+
+    def test_open_stream_can_be_cancelled_between_chunks(self):
+        self.stub.token_delay = 5.0
+        self.stub.tokens = ["a", "b"]
+        stream = self.client.open_stream({"model": "m", "prompt": "p"})
+        reader, chunks = self._read_in_background(stream)
+        time.sleep(0.2)  # headers are in, the first token is not
+        stream.close()
+        reader.join(2)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(chunks, [])
+        # the pool still works afterwards
+        self.stub.token_delay = 0.0
+        self.assertEqual(len(list(self.client.stream({"model": "m", "prompt": "p"}))), 3)
+
+
+class TestAsyncLLMClient(unittest.TestCase):
+    def setUp(self):
+        self.stub = OllamaStubServer(tokens=["a", "b"]).start()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def _run(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_stream_and_reuse(self):
+        async def scenario():
+            client = AsyncLLMClient(self.stub.url, retry_backoff=0.01)
+            try:
+                turns = []
+                for _ in range(3):
+                    turns.append([chunk["response"] async for chunk in client.stream({"model": "m", "prompt": "p"})])
+                return turns, client.metrics.as_dict()
+            finally:
+                await client.close()
+
+        turns, metrics = self._run(scenario())
+        self.assertEqual([["a", "b", ""]] * 3, turns)
+        self.assertEqual(1, metrics["connections_opened"])
+        self.assertEqual(2, metrics["connections_reused"])
+
+    def test_retries_then_fails(self):
+        self.stub.fail_first = 5
+
+        async def scenario():
+            client = AsyncLLMClient(self.stub.url, max_retries=1, retry_backoff=0.01)
+            try:
+                return [chunk async for chunk in client.stream({"model": "m", "prompt": "p"})]
+            finally:
+                await client.close()
+
+        with self.assertRaises(LLMRequestError):
+            self._run(scenario())
+        self.assertEqual(2, len(self.stub.requests))
@@ -1,6 +1,21 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 from vocalai.llm_interaction import LLMInteraction
+from vocalai.ollama_stub import OllamaStubServer
+from vocalai.response_cache import ResponseCache
+
+
+class ContextStubServer(OllamaStubServer):
+    """
+    Emulates Ollama's context: one token per word, and only the words of the
+    prompt sent with the request need evaluating.
+    """
+    def final_chunk(self, payload, tokens):
+        chunk = super().final_chunk(payload, tokens)
+        prompt_tokens = len(payload["prompt"].split())
+        chunk["context"] = payload.get("context", []) + [0] * (prompt_tokens + len(tokens))
+        chunk["prompt_eval_count"] = prompt_tokens
+        return chunk
 
 
 class MockConfig:
@@ -8,16 +23,22 @@ class MockConfig:
         self.instructions = instructions
         self.llm_url = llm_url
         self.llm_model = llm_model
+        self.llm_max_retries = 0
 
 class TestLLMInteraction(unittest.TestCase):
     def setUp(self):
+        self.stub = OllamaStubServer(tokens=["Hello, world!", " How are you?"]).start()
         self.config = MockConfig(
             instructions="Please respond to: ",
-            llm_url="http://fake-url.com/api",
+            llm_url=self.stub.url,
             llm_model="generic-large-model"
         )
         self.llm_interaction = LLMInteraction(self.config)
 
+    def tearDown(self):
+        self.llm_interaction.client.close()
+        self.stub.stop()
+
     @patch('torch.cuda.is_available')
     def test_device_selection(self, mock_cuda_avail):
         mock_cuda_avail.return_value = True
@@ -28,30 +49,146 @@ class TestLLMInteraction(unittest.TestCase):
         llm_interaction = LLMInteraction(self.config)
         self.assertEqual(llm_interaction.device, "cpu")
 
-    @patch('requests.post')
-    def test_query_llm_successful(self, mock_post):
-        # Set up the mock to return a successful response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.text = '{"response":"Hello, world!"}\n{"response":" How are you?"}'
-        mock_post.return_value = mock_response
-
+    def test_query_llm_successful(self):
         prompt = "Hello LLM"
         expected_response = "Hello, world! How are you?"
         result = self.llm_interaction.query_llm(prompt)
         self.assertEqual(result, expected_response)
-        mock_post.assert_called_once_with(self.config.llm_url, json={'model': self.config.llm_model, 'prompt': self.config.instructions + prompt})
+        self.assertEqual(self.stub.requests, [{'model': self.config.llm_model, 'prompt': self.config.instructions + prompt}])
 
-    @patch('requests.post')
-    def test_query_llm_failure(self, mock_post):
-        # Set up the mock to return a failed response
-        mock_response = MagicMock()
-        mock_response.status_code = 400
-        mock_response.text = 'Bad request'
-        mock_post.return_value = mock_response
+    def test_query_llm_failure(self):
+        self.stub.fail_first = 1
+        self.stub.fail_status = 400
 
         prompt = "Hello LLM"
         with self.assertRaises(Exception) as context:
             self.llm_interaction.query_llm(prompt)
 
-        self.assertIn('LLM query failed: 400 Bad request', str(context.exception))
+        self.assertIn('LLM query failed: 400 stub failure', str(context.exception))
+
+    def test_stream_llm_yields_tokens(self):
+        tokens = list(self.llm_interaction.stream_llm("Hello LLM"))
+        self.assertEqual(["Hello, world!", " How are you?"], tokens)
+
+    def test_stream_sentences(self):
+        self.stub.tokens = ["The sky ", "is blue.", " Grass is green."]
+        sentences = list(self.llm_interaction.stream_sentences("colors"))
+        self.assertEqual(["The sky is blue.", "Grass is green."], sentences)
+
+    def test_connection_reused_across_turns(self):
+        for _ in range(3):
+            self.llm_interaction.query_llm("again")
+        self.assertEqual(1, len(set(self.stub.client_ports)))
+        self.assertEqual(2, self.llm_interaction.client.metrics.connections_reused)
+
+    def test_preload_sends_empty_prompt(self):
+        self.llm_interaction.preload()
+        self.assertEqual([{"model": self.config.llm_model, "prompt": ""}], self.stub.requests)
+
+    def test_context_keeps_prompt_eval_flat(self):
+        with ContextStubServer(tokens=["Fine, ", "thanks."]) as stub:
+            llm_interaction = LLMInteraction(MockConfig("Please respond to: ", stub.url, "model"))
+            for turn in range(10):
+                llm_interaction.query_llm(f"question number {turn}")
+            llm_interaction.client.close()
+        counts = llm_interaction.conversation.prompt_eval_counts
+        self.assertEqual(counts[0], 6)
+        self.assertEqual(set(counts[1:]), {3})
+        self.assertEqual(stub.requests[1]["context"], [0] * 8)
+        self.assertEqual(llm_interaction.conversation.rebuilds, 0)
+
+    def test_full_context_is_rebuilt_from_bounded_history(self):
+        with ContextStubServer(tokens=["Fine, ", "thanks."]) as stub:
+            config = MockConfig("Please respond to: ", stub.url, "model")
+            config.llm_context_tokens = 300
+            config.llm_history_tokens = 40
+            llm_interaction = LLMInteraction(config)
+            for turn in range(40):
+                llm_interaction.query_llm(f"question number {turn}")
+            llm_interaction.client.close()
+        conversation = llm_interaction.conversation
+        self.assertGreater(conversation.rebuilds, 0)
+        # a rebuilt prompt is bounded by the history budget, however long the conversation
+        self.assertLessEqual(max(conversation.prompt_eval_counts), 40)
+        self.assertLessEqual(max(len(request.get("context", ())) for request in stub.requests), 300)
+
+    def test_stateless_mode_sends_standalone_prompts(self):
+        self.config.llm_conversation = False
+        llm_interaction = LLMInteraction(self.config)
+        llm_interaction.query_llm("one")
+        llm_interaction.query_llm("two")
+        llm_interaction.client.close()
+        self.assertEqual(self.stub.requests[1], {"model": self.config.llm_model,
+                                                 "prompt": self.config.instructions + "two"})
+
+    def test_cached_answer_is_replayed_as_a_stream(self):
+        self.config.llm_cache = True
+        self.config.llm_conversation = False
+        llm_interaction = LLMInteraction(self.config)
+        first = list(llm_interaction.stream_llm("What time is it?"))
+        replayed = list(llm_interaction.stream_llm("um, what time is it"))
+        llm_interaction.client.close()
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual("".join(replayed), "".join(first))
+        self.assertEqual(replayed, ["Hello,", " world!", " How", " are", " you?"])
+        self.assertEqual(llm_interaction.cache.stats.hits, 1)
+
+    def test_cache_can_be_bypassed_per_request(self):
+        self.config.llm_cache = True
+        self.config.llm_conversation = False
+        llm_interaction = LLMInteraction(self.config)
+        llm_interaction.query_llm("What time is it?")
+        llm_interaction.query_llm("What time is it?", use_cache=False)
+        llm_interaction.client.close()
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_interrupted_answers_are_not_cached(self):
+        self.config.llm_cache = True
+        self.config.llm_conversation = False
+        llm_interaction = LLMInteraction(self.config)
+        stream = llm_interaction.stream_llm("What time is it?")
+        next(stream)
+        stream.close()
+        llm_interaction.query_llm("What time is it?")
+        llm_interaction.client.close()
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_cache_is_off_during_a_conversation(self):
+        self.config.llm_cache = True
+        shared = LLMInteraction(self.config, cache=ResponseCache())
+        self.addCleanup(shared.client.close)
+        self.assertIsNone(shared.cache)
+        shared.query_llm("capital of france")
+        shared.query_llm("capital of france")
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_speculative_answer_is_kept_when_transcripts_agree(self):
+        self.stub.token_delay = 0.01
+        self.llm_interaction.speculate("what time is it in tokyo")
+        answer = self.llm_interaction.query_llm("What time is it in Tokyo?")
+        self.assertEqual(answer, "Hello, world! How are you?")
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(self.stub.requests[0]["prompt"], self.config.instructions + "what time is it in tokyo")
+        stats = self.llm_interaction.speculation_stats.as_dict()
+        self.assertEqual((stats["accepted"], stats["discarded"]), (1, 0))
+        self.assertGreaterEqual(stats["saved_seconds"], 0.0)
+        self.assertEqual(self.llm_interaction.conversation.turns[0][0], "what time is it in tokyo")
+
+    def test_speculative_answer_is_reissued_when_transcripts_differ(self):
+        self.stub.token_delay = 0.01
+        self.llm_interaction.speculate("what time is it in tokyo")
+        answer = self.llm_interaction.query_llm("What's the weather in Kyoto?")
+        self.assertEqual(answer, "Hello, world! How are you?")
+        self.assertCountEqual([request["prompt"] for request in self.stub.requests],
+                              [self.config.instructions + "what time is it in tokyo",
+                               self.config.instructions + "What's the weather in Kyoto?"])
+        stats = self.llm_interaction.speculation_stats.as_dict()
+        self.assertEqual((stats["accepted"], stats["discarded"]), (0, 1))
+
+    def test_no_speculation_while_an_answer_is_streaming(self):
+        stream = self.llm_interaction.stream_llm("first question")
+        next(stream)
+        self.llm_interaction.speculate("second question")
+        list(stream)
+        self.assertIsNone(self.llm_interaction._speculation)
+        self.assertEqual(len(self.stub.requests), 1)
@@ -0,0 +1,96 @@
+import io
+import logging
+import queue
+import time
+import unittest
+from contextlib import redirect_stderr
+from vocalai.logger import DroppingQueueHandler, RateLimitFilter, setup_logging, shutdown_logging
+
+
+def make_record(msg="chunk %d", args=(1,), level=logging.DEBUG, lineno=10):
+    return logging.LogRecord("vocalai.test", level, "test.py", lineno, msg, args, None)
+
+
+class TestRateLimitFilter(unittest.TestCase):
+    def test_limits_each_call_site(self):
+        rate_filter = RateLimitFilter(interval=60, burst=3)
+        passed = [rate_filter.filter(make_record()) for _ in range(10)]
+        self.assertEqual([True] * 3 + [False] * 7, passed)
+        self.assertTrue(rate_filter.filter(make_record(lineno=11)))
+
+    def test_warnings_always_pass(self):
+        rate_filter = RateLimitFilter(interval=60, burst=1)
+        self.assertTrue(all(rate_filter.filter(make_record(level=logging.WARNING)) for _ in range(5)))
+
+    def test_reports_suppressed_count_in_next_window(self):
+        rate_filter = RateLimitFilter(interval=0.05, burst=1)
+        for _ in range(4):
+            rate_filter.filter(make_record())
+        time.sleep(0.06)
+        record = make_record()
+        self.assertTrue(rate_filter.filter(record))
+        self.assertEqual("chunk 1 (3 similar messages suppressed)", record.getMessage())
+
+
+class TestDroppingQueueHandler(unittest.TestCase):
+    def test_drops_instead_of_blocking_when_full(self):
+        handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+        for i in range(5):
+            handler.handle(make_record(args=(i,)))
+        self.assertEqual(2, handler.queue.qsize())
+        self.assertEqual(3, handler.dropped)
+
+    def test_message_is_frozen_on_the_calling_thread(self):
+        handler = DroppingQueueHandler(queue.Queue())
+        words = ["hello"]
+        handler.handle(make_record(msg="heard %s", args=(words,)))
+        words.append("later")
+        queued = handler.queue.get_nowait()
+        self.assertEqual("heard ['hello']", queued.getMessage())
+        self.assertIsNone(queued.args)
+        self.assertIsNone(queued.exc_info)
+
+    def test_dropped_count_is_reported_once_there_is_room(self):
+        handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+        for i in range(5):
+            handler.handle(make_record(args=(i,)))
+        handler.queue.get_nowait()
+        handler.queue.get_nowait()
+        handler.handle(make_record(args=(5,)))
+        self.assertEqual("chunk 5", handler.queue.get_nowait().getMessage())
+        report = handler.queue.get_nowait()
+        self.assertEqual(logging.WARNING, report.levelno)
+        self.assertEqual("3 log records dropped (log queue was full)", report.getMessage())
+        handler.handle(make_record(args=(6,)))
+        self.assertEqual(1, handler.queue.qsize())
+
+    def _setup_root(self, output, **kwargs):
+        root = logging.getLogger()
+        saved_handlers, saved_level = root.handlers[:], root.level
+        root.handlers = []
+        self.addCleanup(setattr, root, "handlers", saved_handlers)
+        self.addCleanup(root.setLevel, saved_level)
+        with redirect_stderr(output):
+            return setup_logging(level="INFO", syslog_address=None, **kwargs)
+
+    def test_shutdown_reports_total_dropped(self):
+        output = io.StringIO()
+        handler = self._setup_root(output)
+        handler.dropped = 7
+        with redirect_stderr(output):
+            shutdown_logging()
+        self.assertIn("7 log records dropped (total since start)", output.getvalue())
+
+    def test_rate_limit_applies_only_to_hot_path_loggers(self):
+        hot, other = logging.getLogger("vocalai.test_hot"), logging.getLogger("vocalai.test_other")
+        output = io.StringIO()
+        self._setup_root(output, rate_limit_burst=2, rate_limited_loggers=(hot.name,))
+        self.addCleanup(hot.filters.clear)
+        with redirect_stderr(output):
+            for i in range(5):
+                hot.info("hot %d", i)
+                other.info("other %d", i)
+            shutdown_logging()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(2, sum("hot" in line for line in lines))
+        self.assertEqual(5, sum("other" in line for line in lines))
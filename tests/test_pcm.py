@@ -0,0 +1,27 @@
+import unittest
+import numpy as np
+from io import BytesIO
+from vocalai.pcm import PCMBuffer
+
+
+class TestPCMBuffer(unittest.TestCase):
+    def test_from_float_clips_and_converts(self):
+        samples = np.array([0.0, 0.5, -0.5, 1.5, -1.5], dtype=np.float32)
+        pcm = PCMBuffer.from_float(samples, sample_rate=22050)
+
+        self.assertEqual([0, 16383, -16383, 32767, -32767], np.frombuffer(pcm.data, dtype=np.int16).tolist())
+        self.assertEqual(22050, pcm.sample_rate)
+        self.assertAlmostEqual(5 / 22050.0, pcm.duration)
+
+    def test_from_float_accepts_lists(self):
+        pcm = PCMBuffer.from_float([0.25, -0.25], sample_rate=16000)
+        self.assertEqual([8191, -8191], np.frombuffer(pcm.data, dtype=np.int16).tolist())
+
+    def test_wave_round_trip(self):
+        pcm = PCMBuffer.from_float(np.linspace(-1, 1, 100, dtype=np.float32), sample_rate=24000)
+        wav_file = BytesIO()
+        pcm.to_wave(wav_file)
+
+        decoded = PCMBuffer.from_wave(wav_file)
+        self.assertEqual(bytes(pcm.data), decoded.data)
+        self.assertEqual(24000, decoded.sample_rate)
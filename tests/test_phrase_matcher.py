@@ -0,0 +1,47 @@
+import unittest
+from vocalai.phrase_matcher import PhraseMatcher, tokenize
+
+
+class TestPhraseMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = PhraseMatcher({
+            "eom": "porcupine",
+            "end_session": "stop session",
+            "stop": "stop",
+        })
+
+    def test_tokenize(self):
+        self.assertEqual(["stop", "session", "don't"], tokenize("Stop, SESSION. don't"))
+
+    def test_find(self):
+        self.assertEqual({"stop", "end_session"}, self.matcher.find("please stop session"))
+        self.assertEqual({"eom"}, self.matcher.find("Example words. porcupine"))
+        self.assertEqual(set(), self.matcher.find("stopping porcupines"))
+
+    def test_overlapping_phrases(self):
+        matcher = PhraseMatcher({"x": "a b c", "y": "b c d"})
+        self.assertEqual({"x", "y"}, matcher.find("a b c d"))
+        self.assertEqual({"y"}, matcher.find("a b b c d"))
+
+    def test_stream_fires_from_partial_once(self):
+        stream = self.matcher.stream()
+        self.assertEqual(set(), stream.feed_partial("tell me"))
+        self.assertEqual({"stop"}, stream.feed_partial("tell me stop"))
+        self.assertEqual(set(), stream.feed_partial("tell me stop"))
+        self.assertEqual(set(), stream.feed_final("tell me stop"))
+
+    def test_stream_handles_revised_partials(self):
+        stream = self.matcher.stream()
+        self.assertEqual(set(), stream.feed_partial("pork"))
+        self.assertEqual({"eom"}, stream.feed_partial("porcupine"))
+        self.assertEqual(set(), stream.feed_final("porcupine"))
+
+    def test_stream_phrase_spans_utterances(self):
+        stream = self.matcher.stream()
+        self.assertEqual({"stop"}, stream.feed_final("stop"))
+        self.assertEqual({"end_session"}, stream.feed_partial("session"))
+
+    def test_stream_same_phrase_in_new_utterance_fires_again(self):
+        stream = self.matcher.stream()
+        self.assertEqual({"stop"}, stream.feed_final("stop"))
+        self.assertEqual({"stop"}, stream.feed_final("stop"))
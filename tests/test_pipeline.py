@@ -0,0 +1,201 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from vocalai.pipeline import Pipeline, build_pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.pipeline = Pipeline(poll_interval=0.01)
+
+    def tearDown(self):
+        self.pipeline.stop()
+        self.pipeline.join(timeout=1)
+
+    def _source(self, items):
+        items = list(items)
+
+        def produce():
+            if items:
+                return items.pop(0)
+            time.sleep(0.01)
+            return None
+        return produce
+
+    def _wait_for(self, condition, timeout=2):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertTrue(condition())
+
+    def test_items_flow_through_all_stages(self):
+        results = []
+        self.pipeline.add_stage("source", self._source([1, 2, 3]))
+        self.pipeline.add_stage("double", lambda x: x * 2)
+        self.pipeline.add_stage("sink", results.append)
+        self.pipeline.start()
+        self._wait_for(lambda: len(results) == 3)
+        self.assertEqual([2, 4, 6], results)
+
+    def test_generator_items_are_emitted_incrementally(self):
+        first_seen = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def split(text):
+            for word in text.split():
+                yield word
+                if word == "one":
+                    release.wait(timeout=2)
+
+        def sink(word):
+            results.append(word)
+            if word == "one":
+                first_seen.set()
+
+        self.pipeline.add_stage("source", self._source(["one two"]))
+        self.pipeline.add_stage("split", split)
+        self.pipeline.add_stage("sink", sink)
+        self.pipeline.start()
+        # The sink sees the first word while the generator is still blocked.
+        self.assertTrue(first_seen.wait(timeout=2))
+        release.set()
+        self._wait_for(lambda: results == ["one", "two"])
+
+    def test_stages_overlap(self):
+        results = []
+
+        def slow(x):
+            time.sleep(0.1)
+            return x
+
+        self.pipeline.add_stage("source", self._source([1, 2, 3]))
+        self.pipeline.add_stage("a", slow)
+        self.pipeline.add_stage("b", slow)
+        self.pipeline.add_stage("sink", results.append)
+        start = time.monotonic()
+        self.pipeline.start()
+        self._wait_for(lambda: len(results) == 3)
+        # Sequential execution would take 0.6s
+        self.assertLess(time.monotonic() - start, 0.55)
+
+    def test_flush_drops_pending_items_in_flushable_stages(self):
+        release = threading.Event()
+        results = []
+
+        def speak(text):
+            for i in range(5):
+                yield f"{text}-{i}"
+
+        def play(item):
+            release.wait(timeout=2)
+            if not self.pipeline.current_item_is_stale():
+                results.append(item)
+
+        self.pipeline.add_stage("source", self._source(["answer"]))
+        self.pipeline.add_stage("speak", speak, maxsize=1, flushable=True)
+        self.pipeline.add_stage("play", play, maxsize=1, flushable=True)
+        self.pipeline.start()
+        self._wait_for(lambda: self.pipeline.stats()["play"]["items_in"] == 1)
+        self.pipeline.flush()
+        release.set()
+        time.sleep(0.1)
+        self.assertEqual([], results)
+        self.assertGreater(self.pipeline.stats()["speak"]["dropped"] + self.pipeline.stats()["play"]["dropped"], 0)
+
+    def test_stage_combines_only_items_already_queued(self):
+        busy = threading.Event()
+        release = threading.Event()
+        spoken = []
+
+        def sentences(text):
+            first, *rest = text.split("|")
+            yield first
+            busy.wait(timeout=2)
+            yield from rest
+
+        def speak(text):
+            spoken.append(text)
+            busy.set()
+            release.wait(timeout=2)
+
+        def combine(text, sentence):
+            return None if len(text) + len(sentence) > 12 else text + " " + sentence
+
+        self.pipeline.add_stage("source", self._source(["One.|Two.|Three.|Four four."]))
+        self.pipeline.add_stage("llm", sentences)
+        self.pipeline.add_stage("tts", speak, combine=combine)
+        self.pipeline.start()
+        # the first sentence is taken alone; the rest pile up meanwhile
+        self._wait_for(lambda: self.pipeline.stats()["tts"]["queue_depth"] == 3)
+        release.set()
+        self._wait_for(lambda: len(spoken) == 3)
+        self.assertEqual(["One.", "Two. Three.", "Four four."], spoken)
+        self.assertEqual(4, self.pipeline.stats()["tts"]["items_in"])
+
+    def test_stop_ends_workers(self):
+        self.pipeline.add_stage("source", self._source([]))
+        self.pipeline.add_stage("sink", lambda x: x)
+        self.pipeline.start()
+        self.pipeline.stop()
+        self.pipeline.join(timeout=1)
+        for stage in self.pipeline.stages:
+            self.assertFalse(stage.thread.is_alive())
+        self.assertFalse(self.pipeline.is_running())
+
+    def test_stats_report_wait_and_busy_time(self):
+        results = []
+        self.pipeline.add_stage("source", self._source([1]))
+        self.pipeline.add_stage("work", lambda x: time.sleep(0.05) or x)
+        self.pipeline.add_stage("sink", results.append)
+        self.pipeline.start()
+        self._wait_for(lambda: results == [1])
+        stats = self.pipeline.stats()
+        self.assertGreaterEqual(stats["work"]["busy_time"], 0.05)
+        self.assertGreater(stats["sink"]["wait_time"], 0)
+        self.assertEqual(1, stats["work"]["items_in"])
+
+    def test_failing_stage_backs_off(self):
+        calls = []
+
+        def broken():
+            calls.append(time.monotonic())
+            raise OSError("input device gone")
+
+        self.pipeline.max_error_backoff = 0.04
+        self.pipeline.add_stage("source", broken)
+        self.pipeline.add_stage("sink", lambda x: x)
+        self.pipeline.start()
+        time.sleep(0.3)
+        self.pipeline.stop()
+        # waits 0.01, 0.02, then 0.04 between calls instead of spinning
+        self.assertLess(len(calls), 12)
+        self.assertGreaterEqual(calls[-1] - calls[-2], 0.035)
+
+    def test_capture_stops_the_pipeline_once_the_session_ended(self):
+        speech_recognizer = MagicMock(end_session_flag=True)
+        tts_handler = SimpleNamespace(device="cuda", get_audio=lambda text: text)
+        pipeline = build_pipeline(speech_recognizer, MagicMock(), tts_handler, MagicMock())
+        pipeline.start()
+        pipeline.join(timeout=1)
+        self.assertFalse(pipeline.is_running())
+        self.assertFalse(pipeline.stages[0].thread.is_alive())
+        speech_recognizer.listen.assert_not_called()
+
+    def test_play_drops_audio_flushed_while_it_was_queued(self):
+        turns = ["audio"]
+        speech_recognizer = MagicMock(end_session_flag=False)
+        speech_recognizer.listen.side_effect = lambda: turns.pop() if turns else time.sleep(0.01)
+        tts_handler = SimpleNamespace(device="cuda", get_audio=lambda text: text)
+        audio_player = MagicMock()
+        pipeline = build_pipeline(speech_recognizer, MagicMock(speculative=False), tts_handler, audio_player)
+        self.addCleanup(pipeline.join, 1)
+        self.addCleanup(pipeline.stop)
+        # the user barges in while the play stage is queuing the sentence
+        audio_player.enqueue.side_effect = lambda audio: pipeline.flush()
+        pipeline.start()
+        self._wait_for(lambda: audio_player.flush.called)
+        audio_player.enqueue.assert_called_once()
+
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from vocalai.response_cache import ResponseCache, normalize_prompt, response_cache_key
+
+
+class TestNormalizePrompt(unittest.TestCase):
+
+    def test_case_punctuation_and_fillers_are_ignored(self):
+        self.assertEqual(normalize_prompt("Um, what's the weather?"), "whats the weather")
+        self.assertEqual(normalize_prompt(" What's   the WEATHER "), "whats the weather")
+
+    def test_whisper_artifacts_are_removed(self):
+        self.assertEqual(normalize_prompt("[BLANK_AUDIO] What time is it in Tokyo? (coughs) ♪"),
+                         "what time is it in tokyo")
+
+    def test_key_depends_on_model_and_instructions(self):
+        key = response_cache_key("llama3", "Be brief. ", "what time is it")
+        self.assertEqual(key, response_cache_key("llama3", "Be brief. ", "Uh, what time is it?"))
+        self.assertNotEqual(key, response_cache_key("mistral", "Be brief. ", "what time is it"))
+        self.assertNotEqual(key, response_cache_key("llama3", "Be chatty. ", "what time is it"))
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_hits_are_counted_per_entry(self):
+        cache = ResponseCache()
+        cache.put("a", "What time is it?", "Noon.")
+        cache.put("b", "Weather?", "Sunny.")
+        self.assertEqual(cache.get("a"), "Noon.")
+        self.assertEqual(cache.get("a"), "Noon.")
+        self.assertIsNone(cache.get("c"))
+        self.assertEqual(cache.entries(), [("what time is it", 2), ("weather", 0)])
+        self.assertEqual(cache.stats.as_dict()["hits"], 2)
+        self.assertEqual(cache.stats.misses, 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", "a", "A")
+        cache.put("b", "b", "B")
+        cache.get("a")
+        cache.put("c", "c", "C")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "A")
+        self.assertEqual(cache.stats.evictions, 1)
+
+    def test_expired_entries_are_not_served(self):
+        cache = ResponseCache(ttl_seconds=60)
+        with patch("vocalai.response_cache.time.time", return_value=1000.0):
+            cache.put("a", "a", "A")
+        with patch("vocalai.response_cache.time.time", return_value=1059.0):
+            self.assertEqual(cache.get("a"), "A")
+        with patch("vocalai.response_cache.time.time", return_value=1061.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats.expirations, 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_entries_persist_to_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "responses.json")
+            cache = ResponseCache(path=path)
+            cache.put("a", "What time is it?", "Noon.")
+            reloaded = ResponseCache(path=path)
+            self.assertEqual(reloaded.get("a"), "Noon.")
+
+    def test_unreadable_file_starts_empty(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as file:
+            file.write("not json")
+        self.addCleanup(os.remove, file.name)
+        self.assertEqual(len(ResponseCache(path=file.name)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import json
+import time
+import unittest
+import numpy as np
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import connect
+from vocalai.event_manager import EventManager
+from vocalai.llm_client import LLMClient
+from vocalai.ollama_stub import OllamaStubServer
+from vocalai.pcm import PCMBuffer
+from vocalai.server import Session, SharedModels, VoiceServer
+from vocalai.util import AppConfig
+
+RATE = 16000
+
+
+class FakeRecognizer:
+    def AcceptWaveform(self, data):
+        return False
+
+    def PartialResult(self):
+        return json.dumps({"partial": ""})
+
+    def Result(self):
+        return json.dumps({"text": ""})
+
+    def FinalResult(self):
+        return json.dumps({"text": ""})
+
+    def Reset(self):
+        pass
+
+
+class EndSessionRecognizer(FakeRecognizer):
+    def AcceptWaveform(self, data):
+        return True
+
+    def Result(self):
+        return json.dumps({"text": "stop session"})
+
+
+class FakeWhisper:
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe(self, audio, **options):
+        self.calls += 1
+        return {"text": "hello there"}
+
+
+class FakeTTS:
+    device = "cuda"
+
+    def get_audio(self, text):
+        return PCMBuffer(bytes(2 * 2205), sample_rate=22050)
+
+
+def speech_then_pause(speech_seconds=0.6, pause_seconds=1.0):
+    t = np.arange(int(speech_seconds * RATE)) / float(RATE)
+    tone = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+    return tone.tobytes() + bytes(int(pause_seconds * RATE) * 2)
+
+
+class TestVoiceServer(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = OllamaStubServer(tokens=["Hi ", "there. "]).start()
+        self.config = AppConfig({
+            "llm_url": self.stub.url, "llm_model": "stub", "instructions": "",
+            "stop_phrase": "stop", "eom_phrase": "porcupine", "end_session_phrase": "stop session",
+            "endpointing": "pause", "silence_threshold": -40, "eom_pause_duration": 0.5,
+            "event_dispatch": "async",
+        })
+        self.whisper = FakeWhisper()
+        self.models = SharedModels(lambda rate: FakeRecognizer(), self.whisper, FakeTTS(),
+                                   LLMClient(self.stub.url))
+
+    def tearDown(self):
+        self.models.close()
+        self.stub.stop()
+        EventManager.reset_instance()
+
+    def start_server(self, max_sessions=2):
+        server = VoiceServer(self.config, self.models, port=0, max_sessions=max_sessions).start()
+        self.addCleanup(server.stop)
+        return server
+
+    @staticmethod
+    def receive_until(client, message_type, timeout=10):
+        deadline = time.monotonic() + timeout
+        while True:
+            message = client.recv(timeout=max(0.01, deadline - time.monotonic()))
+            if isinstance(message, str) and json.loads(message)["type"] == message_type:
+                return json.loads(message)
+
+    def test_session_replies_with_audio_and_reports_stats(self):
+        server = self.start_server()
+        audio = speech_then_pause()
+        with connect(server.url) as client:
+            self.assertEqual(self.receive_until(client, "ready")["session"], 1)
+            for offset in range(0, len(audio), 2048):
+                client.send(audio[offset:offset + 2048])
+            header = self.receive_until(client, "audio")
+            self.assertEqual(header["sample_rate"], 22050)
+            self.assertEqual(len(client.recv(timeout=5)), header["bytes"])
+            client.send(json.dumps({"type": "end"}))
+            stats = self.receive_until(client, "stats")
+        self.assertEqual(stats["turns"], 1)
+        self.assertEqual(stats["bytes_in"], len(audio))
+        self.assertGreater(stats["bytes_out"], 0)
+        self.assertIn("transcribe", stats["busy_time"])
+        self.assertEqual(self.whisper.calls, 1)
+        self.assertEqual(server.stats()["active"], 0)
+
+    def test_end_session_phrase_closes_the_connection_and_frees_the_slot(self):
+        self.models.recognizer_factory = lambda rate: EndSessionRecognizer()
+        server = self.start_server(max_sessions=1)
+        with connect(server.url) as client:
+            self.receive_until(client, "ready")
+            client.send(bytes(2048))
+            stats = self.receive_until(client, "stats")
+            with self.assertRaises(ConnectionClosed):
+                client.recv(timeout=5)
+        self.assertEqual(stats["session"], 1)
+        self.assertEqual(server.stats()["active"], 0)
+
+    def test_rejects_clients_beyond_max_sessions(self):
+        server = self.start_server(max_sessions=1)
+        with connect(server.url) as first:
+            self.receive_until(first, "ready")
+            with connect(server.url) as second:
+                self.assertEqual(json.loads(second.recv(timeout=5))["type"], "error")
+                with self.assertRaises(ConnectionClosed) as closed:
+                    second.recv(timeout=5)
+                self.assertEqual(closed.exception.rcvd.code, 1013)
+        self.assertEqual(server.stats()["rejected"], 1)
+
+    def test_sessions_do_not_share_state(self):
+        server = self.start_server()
+        with connect(server.url) as first, connect(server.url) as second:
+            self.receive_until(first, "ready")
+            self.receive_until(second, "ready")
+            one, two = server.sessions.values()
+            self.assertIsNot(one.speech_recognizer, two.speech_recognizer)
+            self.assertIsNot(one.speech_recognizer.recognizer, two.speech_recognizer.recognizer)
+            self.assertIsNot(one.event_manager, two.event_manager)
+            self.assertIsNot(one.event_manager, EventManager.get_instance())
+
+            generation = two.pipeline._generation
+            one.event_manager.publish("stop_audio", None)
+            one.event_manager.wait_idle(timeout=1)
+            self.assertEqual(two.pipeline._generation, generation)
+
+    def test_stop_audio_flushes_the_pipeline_before_the_player_stops(self):
+        session = Session(1, self.config, self.models, send=lambda message: None)
+        self.addCleanup(session.close, 1)
+        session.start()
+        generation = session.pipeline._generation
+        session.event_manager.publish("stop_audio", None)
+        # delivered on the publisher's thread even with the async dispatcher
+        self.assertEqual(generation + 1, session.pipeline._generation)
+        self.assertEqual([session.pipeline.flush, session.audio_player.stop],
+                         list(session.event_manager.listeners["stop_audio"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import threading
+import unittest
+from vocalai.speculation import Speculation, word_error_rate
+
+
+class TestWordErrorRate(unittest.TestCase):
+
+    def test_identical_transcripts(self):
+        self.assertEqual(word_error_rate("what time is it", "what time is it"), 0.0)
+
+    def test_substitution_insertion_and_deletion(self):
+        self.assertEqual(word_error_rate("what time is it", "what tim is it"), 0.25)
+        self.assertEqual(word_error_rate("what time is it", "what time is it now"), 0.25)
+        self.assertEqual(word_error_rate("what time is it", "time is it"), 0.25)
+
+    def test_empty_reference(self):
+        self.assertEqual(word_error_rate("", ""), 0.0)
+        self.assertEqual(word_error_rate("", "hello"), 1.0)
+
+
+class GatedChunks:
+    """
+    NDJSON chunks released one at a time by the test.
+    """
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.release = threading.Semaphore(0)
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.release.acquire()
+            if self.closed.is_set():
+                return
+            yield chunk
+
+    def close(self):
+        self.closed.set()
+        self.release.release()  # like closing the socket a read is blocked on
+
+
+class TestSpeculation(unittest.TestCase):
+
+    def test_buffered_and_later_chunks_are_yielded_in_order(self):
+        chunks = [{"response": "Hi", "done": False}, {"response": " there", "done": False},
+                  {"response": "", "done": True}]
+        source = GatedChunks(chunks)
+        speculation = Speculation("hello", iter(source))
+        source.release.release()
+        stream = speculation.chunks()
+        self.assertEqual(next(stream), chunks[0])
+        source.release.release()
+        source.release.release()
+        self.assertEqual(list(stream), chunks[1:])
+
+    def test_cancel_closes_the_stream_while_the_reader_is_blocked(self):
+        source = GatedChunks([{"response": "Hi", "done": False}] * 3)
+        speculation = Speculation("hello", source)
+        speculation.cancel()
+        self.assertTrue(source.closed.is_set())
+        # no further chunk is released, yet the reader stops
+        speculation._thread.join(5)
+        self.assertFalse(speculation._thread.is_alive())
+        self.assertEqual(list(speculation.chunks()), [])
+
+    def test_errors_are_raised_to_the_consumer(self):
+        def failing():
+            yield {"response": "Hi", "done": False}
+            raise ConnectionError("reset")
+
+        speculation = Speculation("hello", failing())
+        stream = speculation.chunks()
+        self.assertEqual(next(stream)["response"], "Hi")
+        with self.assertRaises(ConnectionError):
+            next(stream)
+
+
+if __name__ == '__main__':
+    unittest.main()
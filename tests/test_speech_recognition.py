@@ -1,10 +1,15 @@
+import json
 import numpy as np
+import time
 import unittest
 import wave
 from contextlib import contextmanager
 from io import BytesIO
 from unittest.mock import MagicMock, patch
+from vocalai.audio_player import AudioPlayer
+from vocalai.pcm import PCMBuffer
 from vocalai.speech_recognition import SpeechRecognizer
+from tests.test_audio_player import FakeBackend
 from vocalai.util import AppConfig, suppress_output, restore_output
 
 
@@ -48,12 +53,61 @@ class TestSpeechRecognizer(unittest.TestCase):
     def tearDown(self):
         del self.sr
 
+    @staticmethod
+    def _vosk_mock():
+        recognizer = MagicMock()
+        recognizer.FinalResult.return_value = '{"text": ""}'
+        return recognizer
+
     def test_publish_stop_audio(self):
         with patch.object(self.sr.event_manager, 'publish', autospec=True) as mock_publish:
             self.sr.is_audio_playing = False
             self.sr._publish_stop_audio()
             mock_publish.assert_called_with("stop_audio", None)
 
+    def test_publish_stop_audio_times_out(self):
+        with patch.object(self.sr.event_manager, 'publish', autospec=True):
+            self.sr.is_audio_playing = True
+            self.sr.barge_in_timeout = 0.05
+            self.sr.last_barge_in_latency = None
+            start = time.monotonic()
+            self.assertFalse(self.sr._publish_stop_audio())
+            self.assertLess(time.monotonic() - start, 0.5)
+            self.assertIsNone(self.sr.last_barge_in_latency)
+        self.sr.is_audio_playing = False
+
+    def test_barge_in_silences_player(self):
+        """Drives stop detection through the event manager into a player on a fake backend."""
+        backend = FakeBackend()
+        with patch('vocalai.audio_player.EventManager.get_instance', return_value=self.sr.event_manager):
+            audio_player = AudioPlayer(backend=backend)
+        try:
+            audio_player.enqueue(PCMBuffer(b"\x00\x00" * 8000 * 10, sample_rate=8000))
+            deadline = time.monotonic() + 2
+            while not self.sr.is_audio_playing and time.monotonic() < deadline:
+                time.sleep(0.005)
+            self.assertTrue(self.sr.is_audio_playing)
+
+            self.sr.model = MagicMock()
+            self.sr.recognizer = self._vosk_mock()
+            self.sr.recognizer.AcceptWaveform.return_value = False
+            self.sr.recognizer.PartialResult.side_effect = [
+                '{"partial": "no"}',
+                '{"partial": "no stop"}',
+                '{"partial": "no stop porcupine"}',
+            ]
+            self.sr.end_session_flag = False
+            with patch.object(self.sr, '_read_audio_data', return_value=b"\x01\x00" * 1024):
+                self.sr.listen_until_stop_phrase()
+
+            self.assertFalse(self.sr.is_audio_playing)
+            self.assertTrue(backend.streams[0].stopped.is_set())
+            self.assertIsNotNone(self.sr.last_barge_in_latency)
+            self.assertLess(self.sr.last_barge_in_latency, 0.5)
+        finally:
+            self.sr.event_manager.unsubscribe("stop_audio", audio_player.stop)
+            audio_player.cleanup()
+
     #def test_
         
 
@@ -132,4 +186,180 @@ class TestSpeechRecognizer(unittest.TestCase):
         self.sr._react_to_stop_phrase.assert_called_once()
 
     def test_process_audio_data(self):
-        pass
+        self.sr.recognizer = self._vosk_mock()
+        self.sr.fast_transcript = []
+        self.sr.phrase_stream = self.sr.phrase_matcher.stream()
+        audio_buffer = BytesIO()
+
+        self.sr.recognizer.AcceptWaveform.return_value = False
+        self.sr.recognizer.PartialResult.return_value = '{"partial": "please stop"}'
+        self.assertEqual({"stop"}, self.sr._process_audio_data(b"\x00\x00", audio_buffer))
+
+        self.sr.recognizer.AcceptWaveform.return_value = True
+        self.sr.recognizer.Result.return_value = '{"text": "please stop"}'
+        self.assertEqual(set(), self.sr._process_audio_data(b"\x00\x00", audio_buffer))
+        self.assertEqual(["please stop"], self.sr.fast_transcript)
+        self.assertEqual(b"\x00\x00" * 2, audio_buffer.getvalue())
+
+    def test_listen_until_stop_phrase_ends_on_partial_eom(self):
+        self.sr.model = MagicMock()
+        self.sr.recognizer = self._vosk_mock()
+        self.sr.recognizer.AcceptWaveform.return_value = False
+        self.sr.recognizer.PartialResult.side_effect = [
+            '{"partial": "what is"}',
+            '{"partial": "what is the time"}',
+            '{"partial": "what is the time porcupine"}',
+        ]
+        self.sr.end_session_flag = False
+        with patch.object(self.sr, '_read_audio_data', return_value=b"\x01\x00"):
+            audio_buffer = self.sr.listen_until_stop_phrase()
+        self.assertEqual(b"\x01\x00" * 3, audio_buffer.getvalue())
+
+    def test_listen_ends_session_when_input_ends(self):
+        self.sr.model = MagicMock()
+        self.sr.recognizer = self._vosk_mock()
+        self.sr.recognizer.AcceptWaveform.return_value = False
+        self.sr.recognizer.PartialResult.return_value = '{"partial": "hello"}'
+        self.sr.end_session_flag = False
+        with patch.object(self.sr, '_read_audio_data', side_effect=[b"\x01\x00", None]), \
+                patch.object(self.sr.event_manager, 'publish') as mock_publish:
+            audio_buffer = self.sr.listen_until_stop_phrase()
+        self.assertTrue(self.sr.end_session_flag)
+        mock_publish.assert_called_with("end_session", None)
+        self.assertEqual(b"\x01\x00", audio_buffer.getvalue())
+        self.sr.end_session_flag = False
+
+    def test_transcribe_finishes_incremental_transcription(self):
+        audio_buffer = BytesIO(b"\x00\x00" * 16)
+        audio_buffer.incremental_transcriber = MagicMock()
+        audio_buffer.incremental_transcriber.finish.return_value = "hello there"
+        self.assertEqual("hello there", self.sr.transcribe(audio_buffer))
+        audio_buffer.incremental_transcriber.finish.assert_called_once()
+        self.assertIsNotNone(self.sr.last_transcribe_latency)
+
+    def test_is_silent(self):
+        self.sr.config.silence_threshold = -40
+        self.assertTrue(self.sr._is_silent(np.zeros(1024, dtype=np.int16).tobytes()))
+        self.assertFalse(self.sr._is_silent(np.full(1024, 3000, dtype=np.int16).tobytes()))
+
+    def test_listen_until_pause(self):
+        self.sr.config.silence_threshold = -40
+        self.sr.config.eom_pause_duration = 0.5
+        self.sr.model = MagicMock()
+        self.sr.recognizer = self._vosk_mock()
+        self.sr.recognizer.AcceptWaveform.return_value = False
+        self.sr.recognizer.PartialResult.return_value = '{"partial": "hello"}'
+        self.sr.is_audio_playing = False
+        self.sr.end_session_flag = False
+
+        speech = [np.full(1024, 3000, dtype=np.int16).tobytes()] * 10
+        quiet = [np.zeros(1024, dtype=np.int16).tobytes()] * 20
+        with patch.object(self.sr, '_read_audio_data', side_effect=quiet[:5] + speech + quiet):
+            audio_buffer = self.sr.listen_until_pause()
+        self.assertTrue(self.sr.speech_detected)
+        chunks = len(audio_buffer.getvalue()) // 2048
+        self.assertGreater(chunks, 15)
+        self.assertLess(chunks, 30)
+
+    def test_set_endpointing(self):
+        self.sr.set_endpointing("pause")
+        with patch.object(self.sr, 'listen_until_pause') as mock_listen:
+            self.sr.listen()
+            mock_listen.assert_called_once()
+        self.sr.set_endpointing("phrase")
+        with self.assertRaises(ValueError):
+            self.sr.set_endpointing("telepathy")
+
+    def test_transcribe_trims_silence(self):
+        self.sr.config.trim_silence = True
+        self.sr.config.silence_threshold = -40
+        self.sr.whisper_model = MagicMock()
+        self.sr.whisper_model.transcribe.return_value = {"text": "hi"}
+        samples = np.concatenate((np.zeros(16000, dtype=np.int16), np.full(16000, 3000, dtype=np.int16),
+                                  np.zeros(16000, dtype=np.int16)))
+        self.assertEqual("hi", self.sr.transcribe(BytesIO(samples.tobytes())))
+        sent = self.sr.whisper_model.transcribe.call_args[0][0]
+        self.assertLess(len(sent), 16000 * 1.5)
+        self.assertGreater(self.sr.last_trimmed_seconds, 1.5)
+
+        self.sr.whisper_model.transcribe.reset_mock()
+        self.assertEqual("", self.sr.transcribe(BytesIO(np.zeros(16000, dtype=np.int16).tobytes())))
+        self.sr.whisper_model.transcribe.assert_not_called()
+
+    def _tiered_recognizer(self):
+        self.sr.config.tiered_transcription = True
+        self.sr.__init__(self.sr.config, stream=MagicMock())
+        self.sr.logger = MagicMock()
+        self.sr.whisper_model = MagicMock()
+        self.sr.whisper_model.transcribe.return_value = {"text": " Kyoto"}
+
+    def test_listen_keeps_vosk_words_relative_to_the_turn(self):
+        self._tiered_recognizer()
+        self.sr.model = MagicMock()
+        self.sr.recognizer = self._vosk_mock()
+        self.sr._fast_samples = 16000 * 10  # ten seconds into the recognizer's stream
+        self.sr.recognizer.AcceptWaveform.side_effect = [True, False]
+        self.sr.recognizer.Result.return_value = (
+            '{"text": "hello", "result": [{"word": "hello", "conf": 0.9, "start": 10.1, "end": 10.4}]}')
+        self.sr.recognizer.PartialResult.return_value = '{"partial": "porcupine"}'
+        self.sr.recognizer.FinalResult.return_value = (
+            '{"text": "porcupine", "result": [{"word": "porcupine", "conf": 1.0, "start": 10.5, "end": 10.9}]}')
+        with patch.object(self.sr, '_read_audio_data', return_value=b"\x00\x00" * 1024):
+            audio_buffer = self.sr.listen_until_stop_phrase()
+        self.assertEqual(audio_buffer.fast_transcript, "hello porcupine")
+        self.assertEqual([word["word"] for word in audio_buffer.fast_words], ["hello", "porcupine"])
+        self.assertAlmostEqual(audio_buffer.fast_words[0]["start"], 0.1)
+        self.assertAlmostEqual(audio_buffer.fast_words[1]["end"], 0.9)
+
+    def test_tiered_transcription_skips_whisper_for_confident_words(self):
+        self._tiered_recognizer()
+        audio_buffer = BytesIO(np.zeros(16000 * 2, dtype=np.int16).tobytes())
+        audio_buffer.fast_words = [{"word": "hello", "conf": 1.0, "start": 0.2, "end": 0.6},
+                                   {"word": "there", "conf": 0.95, "start": 0.7, "end": 1.1}]
+        self.assertEqual("hello there", self.sr.transcribe(audio_buffer))
+        self.sr.whisper_model.transcribe.assert_not_called()
+        self.assertEqual(self.sr.tier_stats.turns["vosk"], 1)
+
+    def test_tiered_transcription_sends_uncertain_segment_to_whisper(self):
+        self._tiered_recognizer()
+        audio_buffer = BytesIO(np.zeros(16000 * 2, dtype=np.int16).tobytes())
+        audio_buffer.fast_words = [{"word": "weather", "conf": 1.0, "start": 0.0, "end": 0.4},
+                                   {"word": "in", "conf": 1.0, "start": 0.45, "end": 0.55},
+                                   {"word": "key", "conf": 0.2, "start": 0.7, "end": 1.0},
+                                   {"word": "today", "conf": 1.0, "start": 1.3, "end": 1.7}]
+        self.sr.whisper_model.transcribe.side_effect = lambda audio: time.sleep(0.05) or {"text": " Kyoto"}
+        self.assertEqual("weather in Kyoto today", self.sr.transcribe(audio_buffer))
+        sent = self.sr.whisper_model.transcribe.call_args[0][0]
+        self.assertAlmostEqual(len(sent) / 16000.0, 0.6, places=2)
+        self.assertEqual(self.sr.tier_stats.turns["segments"], 1)
+        self.assertGreaterEqual(self.sr.tier_stats.whisper_time["segments"], 0.05)
+        self.assertLess(self.sr.tier_stats.whisper_time["segments"], 0.5)
+
+    def test_next_turn_does_not_reuse_the_previous_hypothesis(self):
+        class PendingVosk:
+            """
+            Keeps its hypothesis across chunks until FinalResult, like vosk.
+            """
+            def __init__(self, words):
+                self.words = iter(words)
+                self.pending = []
+
+            def AcceptWaveform(self, data):
+                self.pending.append(next(self.words))
+                return False
+
+            def PartialResult(self):
+                return json.dumps({"partial": " ".join(self.pending)})
+
+            def FinalResult(self):
+                text, self.pending = " ".join(self.pending), []
+                return json.dumps({"text": text})
+
+        self.sr.recognizer = PendingVosk(["what", "time", "porcupine", "hello", "there", "porcupine"])
+        self.sr.end_session_flag = False
+        with patch.object(self.sr, '_read_audio_data', return_value=b"\x01\x00"):
+            first = self.sr.listen_until_stop_phrase()
+            second = self.sr.listen_until_stop_phrase()
+        self.assertEqual("what time porcupine", first.fast_transcript)
+        self.assertEqual("hello there porcupine", second.fast_transcript)
+        self.assertEqual(b"\x01\x00" * 3, second.getvalue())
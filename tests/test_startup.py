@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from vocalai.startup import StartupOrchestrator
+
+
+class TestStartupOrchestrator(unittest.TestCase):
+    def test_components_load_in_parallel(self):
+        orchestrator = StartupOrchestrator(max_workers=3)
+        for name in ("a", "b", "c"):
+            orchestrator.add(name, lambda name=name: time.sleep(0.2) or name)
+        start = time.monotonic()
+        results = orchestrator.run()
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual({"a": "a", "b": "b", "c": "c"}, results)
+        report = orchestrator.report()
+        self.assertGreaterEqual(report["serial_seconds"], 0.6)
+        self.assertLess(report["wall_seconds"], report["serial_seconds"])
+
+    def test_phases_are_timed_and_warmup_gets_loaded_model(self):
+        warmed = []
+        orchestrator = StartupOrchestrator()
+        orchestrator.add("model", lambda: time.sleep(0.05) or "loaded",
+                         lambda model: time.sleep(0.05) or warmed.append(model), imports=("json",))
+        orchestrator.run()
+        self.assertEqual(["loaded"], warmed)
+        timing = orchestrator.report()["components"]["model"]
+        self.assertGreaterEqual(timing["load"], 0.05)
+        self.assertGreaterEqual(timing["warmup"], 0.05)
+        self.assertIsNone(timing["error"])
+
+    def test_failure_is_reported_and_raised_after_all_components(self):
+        finished = threading.Event()
+
+        def fail():
+            raise RuntimeError("no model")
+
+        orchestrator = StartupOrchestrator()
+        orchestrator.add("broken", fail)
+        orchestrator.add("slow", lambda: time.sleep(0.1) or finished.set())
+        with self.assertRaises(RuntimeError):
+            orchestrator.run()
+        self.assertTrue(finished.is_set())
+        self.assertEqual("no model", orchestrator.report()["components"]["broken"]["error"])
+
+    def test_write_report_appends_history(self):
+        orchestrator = StartupOrchestrator()
+        orchestrator.add("a", lambda: None)
+        orchestrator.run()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "reports", "startup.jsonl")
+            orchestrator.write_report(path)
+            orchestrator.write_report(path)
+            with open(path) as file:
+                lines = [json.loads(line) for line in file]
+        self.assertEqual(2, len(lines))
+        self.assertIn("a", lines[0]["components"])
@@ -0,0 +1,39 @@
+import unittest
+from vocalai.text_segmenter import SentenceSegmenter, segment_sentences
+
+
+class TestSentenceSegmenter(unittest.TestCase):
+    def test_emits_sentence_once_boundary_is_complete(self):
+        segmenter = SentenceSegmenter()
+        self.assertEqual([], segmenter.feed("Hello there, friend."))
+        self.assertEqual(["Hello there, friend."], segmenter.feed(" How"))
+        self.assertEqual(["How are you?"], segmenter.feed(" are you?") + segmenter.flush())
+
+    def test_does_not_split_abbreviations_or_decimals(self):
+        text = "Dr. Smith paid 3.5 dollars for it. That is cheap."
+        self.assertEqual(["Dr. Smith paid 3.5 dollars for it.", "That is cheap."],
+                         list(segment_sentences(list(text))))
+
+    def test_ends_sentences_on_words_that_look_like_abbreviations(self):
+        self.assertEqual(["The answer is no.", "Next question, please."],
+                         list(segment_sentences(list("The answer is no. Next question, please."))))
+        self.assertEqual(["Is it really no?", "I thought it was yes."],
+                         list(segment_sentences(list("Is it really no? I thought it was yes."))))
+        self.assertEqual(["Take plan A.", "Then call me back."],
+                         list(segment_sentences(list("Take plan A. Then call me back."))))
+
+    def test_does_not_split_initials(self):
+        text = "J. R. R. Tolkien wrote it. That was long ago."
+        self.assertEqual(["J. R. R. Tolkien wrote it.", "That was long ago."],
+                         list(segment_sentences(list(text), min_chars=1)))
+
+    def test_merges_short_fragments(self):
+        text = "Yes. That is absolutely right. "
+        self.assertEqual(["Yes. That is absolutely right."], list(segment_sentences([text])))
+
+    def test_newline_ends_chunk(self):
+        self.assertEqual(["Steps:", "first do this"], list(segment_sentences(["Steps:\nfirst do this"])))
+
+    def test_flush_empty(self):
+        segmenter = SentenceSegmenter()
+        self.assertEqual([], segmenter.flush())
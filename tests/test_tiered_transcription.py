@@ -0,0 +1,66 @@
+import unittest
+from vocalai.tiered_transcription import TierDecision, TieredTranscriptionPolicy, TierStats
+
+
+def words(*specs):
+    """
+    (word, confidence) pairs, spoken back to back half a second each.
+    """
+    return [{"word": word, "conf": conf, "start": i * 0.5, "end": i * 0.5 + 0.4}
+            for i, (word, conf) in enumerate(specs)]
+
+
+class TestTieredTranscriptionPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = TieredTranscriptionPolicy(min_mean_confidence=0.9, min_word_confidence=0.6,
+                                                max_low_fraction=0.3, max_segments=1, padding_seconds=0.05)
+
+    def test_confident_utterance_uses_vosk(self):
+        decision = self.policy.decide(words(("what", 1.0), ("time", 0.95), ("is", 0.9), ("it", 1.0)), 2.0)
+        self.assertEqual(decision.tier, "vosk")
+        self.assertEqual(decision.assemble(), "what time is it")
+        self.assertEqual(decision.whisper_seconds, 0.0)
+
+    def test_one_uncertain_word_sends_its_segment_to_whisper(self):
+        decision = self.policy.decide(words(("weather", 1.0), ("in", 1.0), ("key", 0.3), ("today", 1.0)), 2.0)
+        self.assertEqual(decision.tier, "segments")
+        self.assertEqual(decision.spans, [(0.95, 1.45)])
+        self.assertEqual(decision.assemble([" Kyoto"]), "weather in Kyoto today")
+
+    def test_adjacent_uncertain_words_share_a_segment(self):
+        policy = TieredTranscriptionPolicy(min_word_confidence=0.6, max_low_fraction=0.5, padding_seconds=0.1)
+        decision = policy.decide(words(("play", 1.0), ("sigur", 0.4), ("ross", 0.5), ("now", 1.0)), 2.0)
+        self.assertEqual(decision.tier, "segments")
+        self.assertEqual(len(decision.spans), 1)
+        self.assertEqual(decision.assemble(["Sigur Rós"]), "play Sigur Rós now")
+
+    def test_uncertain_utterance_goes_to_whisper_whole(self):
+        mostly_unsure = words(("uh", 0.3), ("the", 0.5), ("thing", 1.0))
+        self.assertEqual(self.policy.decide(mostly_unsure, 1.5).tier, "whisper")
+        scattered = words(("a", 0.3), ("b", 1.0), ("c", 1.0), ("d", 1.0), ("e", 1.0), ("f", 1.0), ("g", 0.3),
+                          ("h", 1.0))
+        self.assertEqual(self.policy.decide(scattered, 4.0).tier, "whisper")
+        middling = words(("what", 0.7), ("time", 0.8), ("is", 0.75))
+        self.assertEqual(self.policy.decide(middling, 1.5).tier, "whisper")
+        self.assertEqual(self.policy.decide([], 1.0).tier, "whisper")
+
+
+class TestTierStats(unittest.TestCase):
+
+    def test_shares_and_whisper_time_saved(self):
+        stats = TierStats()
+        self.assertIsNone(stats.as_dict()["whisper_time_saved"])
+        stats.record(TierDecision("whisper", words(("a", 0.3))), whisper_time=2.0, calls=1)
+        stats.record(TierDecision("vosk", words(("a", 1.0))))
+        stats.record(TierDecision("vosk", words(("a", 1.0))))
+        stats.record(TierDecision("segments", words(("a", 0.3)), [(0.0, 0.4)]), whisper_time=1.5, calls=1)
+        report = stats.as_dict()
+        self.assertEqual(report["turns"], {"vosk": 2, "segments": 1, "whisper": 1})
+        self.assertEqual(report["share"]["vosk"], 0.5)
+        self.assertEqual(report["whisper_calls"], 2)
+        self.assertAlmostEqual(report["whisper_time_saved"], 2.0 * 3 - 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
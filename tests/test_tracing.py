@@ -0,0 +1,169 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+from vocalai.pipeline import Pipeline
+from vocalai.tracing import (BackgroundExporter, JsonlExporter, PrometheusExporter, Tracer, annotate,
+                             current_span, mark)
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def close(self):
+        pass
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.exporter = ListExporter()
+        self.tracer = Tracer([self.exporter])
+
+    def test_nested_spans_share_trace(self):
+        trace = self.tracer.start_trace()
+        with self.tracer.span("llm", parent=trace) as outer:
+            self.assertIs(outer, current_span())
+            with self.tracer.span("llm_request", tokens=3) as inner:
+                annotate(time_to_first_token=0.1)
+            self.assertIs(outer, current_span())
+        self.assertIsNone(current_span())
+
+        self.assertEqual(["llm_request", "llm"], [span.name for span in self.exporter.spans])
+        self.assertEqual(outer.span_id, inner.parent_id)
+        self.assertIsNone(outer.parent_id)
+        self.assertEqual(trace.trace_id, inner.trace.trace_id)
+        self.assertEqual({"tokens": 3, "time_to_first_token": 0.1}, inner.attributes)
+
+    def test_exception_is_recorded(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.span("whisper"):
+                raise ValueError("boom")
+        self.assertIn("boom", self.exporter.spans[0].error)
+
+    def test_response_span_from_eom_to_first_playback(self):
+        trace = self.tracer.start_trace()
+        with self.tracer.span("capture", parent=trace):
+            mark("eom", trace.start + 1.0)
+        self.tracer.record_span("playback", trace.start + 1.5, trace.start + 2.0, parent=trace)
+        self.tracer.record_span("playback", trace.start + 2.0, trace.start + 2.5, parent=trace)
+
+        responses = [span for span in self.exporter.spans if span.name == "response"]
+        self.assertEqual(1, len(responses))
+        self.assertAlmostEqual(0.5, responses[0].duration)
+
+    def test_pipeline_records_a_span_per_stage_call(self):
+        pipeline = Pipeline(poll_interval=0.01, tracer=self.tracer)
+        produced = []
+
+        def source():
+            if produced:
+                time.sleep(0.01)
+                return None
+            produced.append(1)
+            return "question"
+
+        def answer(prompt):
+            for sentence in ("One.", "Two."):
+                yield sentence
+
+        pipeline.add_stage("capture", source)
+        pipeline.add_stage("llm", answer)
+        pipeline.add_stage("tts", lambda sentence: annotate(chars=len(sentence)))
+        pipeline.start()
+        deadline = time.monotonic() + 2
+        while len([s for s in self.exporter.spans if s.name == "tts"]) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        pipeline.stop()
+        pipeline.join()
+
+        by_name = {}
+        for span in self.exporter.spans:
+            by_name.setdefault(span.name, []).append(span)
+        self.assertEqual(1, len(by_name["llm"]))
+        self.assertEqual(2, len(by_name["tts"]))
+        turn = by_name["llm"][0].trace.trace_id
+        self.assertEqual([turn, turn], [span.trace.trace_id for span in by_name["tts"]])
+        self.assertEqual(4, by_name["tts"][0].attributes["chars"])
+
+
+class TestExporters(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_jsonl_export(self):
+        path = os.path.join(self.temp_dir.name, "traces.jsonl")
+        tracer = Tracer([JsonlExporter(path)])
+        with tracer.span("whisper", audio_seconds=2.5):
+            pass
+        tracer.close()
+
+        with open(path) as trace_file:
+            records = [json.loads(line) for line in trace_file]
+        self.assertEqual(1, len(records))
+        self.assertEqual("whisper", records[0]["name"])
+        self.assertEqual({"audio_seconds": 2.5}, records[0]["attributes"])
+        self.assertGreaterEqual(records[0]["duration"], 0)
+
+    def test_background_exporter_keeps_io_off_the_caller(self):
+        exporting, release = threading.Event(), threading.Event()
+
+        class SlowExporter(ListExporter):
+            def export(self, span):
+                exporting.set()
+                release.wait(timeout=2)
+                super().export(span)
+
+        slow = SlowExporter()
+        exporter = BackgroundExporter(slow, max_queue=2)
+        tracer = Tracer([exporter])
+        start = time.monotonic()
+        tracer.record_span("tts", 0.0, 0.1)
+        self.assertTrue(exporting.wait(timeout=1))
+        for _ in range(4):
+            tracer.record_span("tts", 0.0, 0.1)
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual([], slow.spans)
+        release.set()
+        tracer.close()
+        # one span was being exported, two were queued and two were dropped
+        self.assertEqual(3, len(slow.spans))
+        self.assertEqual(2, exporter.dropped)
+
+    def test_background_jsonl_export_is_complete_after_close(self):
+        path = os.path.join(self.temp_dir.name, "traces.jsonl")
+        tracer = Tracer([BackgroundExporter(JsonlExporter(path))])
+        for _ in range(50):
+            tracer.record_span("play", 0.0, 0.01)
+        tracer.close()
+        with open(path) as trace_file:
+            self.assertEqual(50, len(trace_file.readlines()))
+
+    def test_prometheus_histogram_file_and_http(self):
+        path = os.path.join(self.temp_dir.name, "metrics.prom")
+        exporter = PrometheusExporter(path=path, port=0, buckets=(0.1, 1.0), write_interval=0)
+        tracer = Tracer([exporter])
+        tracer.record_span("tts", 0.0, 0.05, chars=12)
+        tracer.record_span("tts", 0.0, 0.5, chars=30)
+        try:
+            with urllib.request.urlopen(exporter.url) as response:
+                served = response.read().decode("utf-8")
+        finally:
+            tracer.close()
+
+        with open(path) as metrics_file:
+            written = metrics_file.read()
+        for text in (served, written):
+            self.assertIn('vocalai_span_seconds_bucket{span="tts",le="0.1"} 1', text)
+            self.assertIn('vocalai_span_seconds_bucket{span="tts",le="1.0"} 2', text)
+            self.assertIn('vocalai_span_seconds_count{span="tts"} 2', text)
+            self.assertIn('vocalai_span_attribute_total{span="tts",attribute="chars"} 42', text)
@@ -1,15 +1,15 @@
 import unittest
 import numpy as np
 import torch
-import wave
 from unittest.mock import patch, MagicMock
 from vocalai.tts_handler import TTSHandler
 
 
 
 class MockConfig:
-    def __init__(self, tts_model_path):
+    def __init__(self, tts_model_path, **kwargs):
         self.tts_model_path = tts_model_path
+        self.__dict__.update(kwargs)
 
 class TestTTSHandler(unittest.TestCase):
     def setUp(self):
@@ -17,12 +17,55 @@ class TestTTSHandler(unittest.TestCase):
 
     @patch('torch.cuda.is_available')
     def test_init_with_no_cuda(self, mock_cuda_avail):
-        """Test initialization raises when no CUDA is available."""
+        """Test initialization raises when CUDA is requested but not available."""
         mock_cuda_avail.return_value = False
+        self.config.tts_device = "cuda"
         with self.assertRaises(RuntimeError) as context:
             tts_handler = TTSHandler(self.config)
         self.assertIn("TTS requires a GPU", str(context.exception))
 
+    @patch('torch.set_num_threads')
+    @patch('torch.cuda.is_available', return_value=False)
+    @patch('TTS.api.TTS')
+    def test_init_falls_back_to_cpu(self, mock_tts_class, mock_cuda_avail, mock_set_threads):
+        """Test auto device selection uses the CPU and its thread setting without CUDA."""
+        config = MockConfig("tts_models/en/jenny/jenny", tts_threads=3)
+        tts_handler = TTSHandler(config)
+
+        self.assertEqual("cpu", tts_handler.device)
+        mock_tts_class.return_value.to.assert_called_once_with("cpu")
+        mock_set_threads.assert_called_once_with(3)
+        self.assertFalse(tts_handler.quantized)
+
+    @patch('torch.cuda.is_available', return_value=False)
+    @patch('TTS.api.TTS')
+    def test_cpu_quantization(self, mock_tts_class, mock_cuda_avail):
+        """Test tts_quantize swaps the model's Linear layers for int8 ones."""
+        model = torch.nn.Sequential(torch.nn.Linear(4, 4))
+        mock_model = mock_tts_class.return_value.to.return_value
+        mock_model.synthesizer.tts_model = model
+
+        config = MockConfig("tts_models/en/jenny/jenny", tts_quantize=True)
+        tts_handler = TTSHandler(config)
+
+        self.assertTrue(tts_handler.quantized)
+        self.assertIsNot(model, mock_model.synthesizer.tts_model)
+        self.assertIn("int8", tts_handler.model_id)
+
+    @patch('torch.cuda.is_available', return_value=False)
+    @patch('TTS.api.TTS')
+    def test_get_audio_records_rtf(self, mock_tts_class, mock_cuda_avail):
+        """Test synthesis records the real-time factor."""
+        mock_model = mock_tts_class.return_value.to.return_value
+        mock_model.tts.return_value = np.zeros(4800, dtype=np.float32)
+        mock_model.synthesizer.output_sample_rate = 48000
+
+        tts_handler = TTSHandler(MockConfig("tts_models/en/jenny/jenny"))
+        tts_handler.get_audio("First sentence. Second one.", use_cache=False)
+
+        self.assertEqual(["First sentence. Second one."], [call.kwargs["text"] for call in mock_model.tts.call_args_list])
+        self.assertIsNotNone(tts_handler.last_rtf)
+
     @patch('torch.cuda.is_available', return_value=True)
     @patch('TTS.api.TTS')
     def test_init_successful(self, mock_tts_class, mock_cuda_avail):
@@ -41,21 +84,20 @@ class TestTTSHandler(unittest.TestCase):
     @patch('torch.cuda.is_available')
     @patch('TTS.api.TTS')
     def test_get_audio(self, mock_tts, mock_cuda_avail):
-        """Test get_audio returns a BytesIO object with correct audio data."""
+        """Test get_audio returns raw PCM at the model's output sample rate."""
         mock_cuda_avail.return_value = True
-        mock_tts_instance = mock_tts.return_value 
-        mock_tts_instance.to.return_value.tts.return_value = np.array([0.1, -0.1, 0.2, -0.2], dtype=np.float32)
+        mock_model = mock_tts.return_value.to.return_value
+        mock_model.tts.return_value = [0.1, -0.1, 0.2, -0.2]
+        mock_model.synthesizer.output_sample_rate = 22050
 
         tts_handler = TTSHandler(self.config)
-        audio_buffer = tts_handler.get_audio("Hello world")
-        # Check the contents of audio_buffer
-        with wave.open(audio_buffer, 'rb') as wav_file:
-            params = wav_file.getparams()
-            frames = wav_file.readframes(params.nframes)
-            self.assertEqual(params.nchannels, 1)
-            self.assertEqual(params.sampwidth, 2)
-            self.assertEqual(params.framerate, 48000)
-            self.assertTrue(len(frames) > 0)
+        pcm = tts_handler.get_audio("Hello world")
+
+        self.assertEqual(1, pcm.channels)
+        self.assertEqual(2, pcm.sample_width)
+        self.assertEqual(22050, pcm.sample_rate)
+        samples = np.frombuffer(pcm.data, dtype=np.int16)
+        np.testing.assert_array_equal(np.int16(np.array([0.1, -0.1, 0.2, -0.2], dtype=np.float32) * 32767), samples)
 
     @patch('torch.cuda.is_available')
     @patch('TTS.api.TTS')
@@ -67,3 +109,21 @@ class TestTTSHandler(unittest.TestCase):
             self.config = MockConfig(tts_model_path="invalid/path/for/testing")
             tts_handler = TTSHandler(self.config)
         self.assertIn("failed to load TTS model: Loading error", str(context.exception))
+
+    @patch('torch.cuda.is_available', return_value=True)
+    @patch('TTS.api.TTS')
+    def test_get_audio_cache_hit_skips_inference(self, mock_tts, mock_cuda_avail):
+        """Test repeated text is served from the cache without running the model."""
+        mock_model = mock_tts.return_value.to.return_value
+        mock_model.tts.return_value = np.array([0.1, -0.1, 0.2, -0.2], dtype=np.float32)
+
+        tts_handler = TTSHandler(self.config)
+        first = bytes(tts_handler.get_audio("Hello world").data)
+        second = bytes(tts_handler.get_audio("Hello   world").data)
+
+        self.assertEqual(first, second)
+        mock_model.tts.assert_called_once()
+        self.assertEqual(1, tts_handler.cache.stats.memory_hits)
+
+        tts_handler.get_audio("Hello world", use_cache=False)
+        self.assertEqual(2, mock_model.tts.call_count)
@@ -0,0 +1,146 @@
+import unittest
+import numpy as np
+from vocalai.util import load_wav
+from vocalai.vad import PauseEndpointer, VoiceActivityDetector, frame_levels_db, level_db, speech_regions, trim_silence
+
+RATE = 16000
+CHUNK = 1024
+STOP_WAV = "tests/test_data/591282__awchacon__stop.wav"
+PHRASE_WAV = "tests/test_data/pcm_phrase.wav"
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype=np.int16)
+
+
+def noise(seconds, level=30, seed=0):
+    return np.random.default_rng(seed).integers(-level, level, int(seconds * RATE)).astype(np.int16)
+
+
+def feed_until_endpoint(endpointer, samples):
+    """Returns the time in seconds at which the endpointer fired, or None."""
+    data = samples.tobytes()
+    for offset in range(0, len(data), CHUNK * 2):
+        if endpointer.feed(data[offset:offset + CHUNK * 2]):
+            return (offset // 2 + CHUNK) / RATE
+    return None
+
+
+class TestLevels(unittest.TestCase):
+    def test_level_db(self):
+        self.assertAlmostEqual(0.0, level_db(np.full(10, -32768, dtype=np.int16)), places=3)
+        self.assertAlmostEqual(-20.0, level_db(np.full(10, 3277, dtype=np.int16)), places=1)
+        self.assertEqual(-120.0, level_db(np.zeros(10, dtype=np.int16)))
+
+    def test_frame_levels_vectorized(self):
+        samples = np.concatenate((np.zeros(320, dtype=np.int16), np.full(320, 3277, dtype=np.int16), np.ones(100, dtype=np.int16)))
+        levels = frame_levels_db(samples, 320)
+        self.assertEqual(2, len(levels))
+        self.assertEqual(-120.0, levels[0])
+        self.assertAlmostEqual(level_db(samples[320:640]), levels[1], places=4)
+
+
+class TestVoiceActivityDetector(unittest.TestCase):
+    def test_hysteresis_ignores_levels_between_thresholds(self):
+        vad = VoiceActivityDetector(rate=RATE, threshold_db=-40, hysteresis_db=6)
+        # -43 dBFS: louder than the end threshold, quieter than the start one
+        murmur = np.full(RATE, 232, dtype=np.int16)
+        self.assertFalse(vad.process(murmur.tobytes()).any())
+
+    def test_hangover_bridges_short_gaps(self):
+        vad = VoiceActivityDetector(rate=RATE, threshold_db=-40, hangover_seconds=0.2)
+        speech = np.full(int(0.3 * RATE), 3000, dtype=np.int16)
+        decisions = vad.process(np.concatenate((speech, silence(0.1), speech, silence(0.5))).tobytes())
+        speech_frames = np.flatnonzero(decisions)
+        # continuous from onset through the 100 ms gap, released after the hangover
+        self.assertTrue(np.all(np.diff(speech_frames) == 1))
+        self.assertFalse(decisions[-1])
+
+    def test_frames_are_aligned_across_chunks(self):
+        samples = np.concatenate((silence(0.5), np.full(RATE, 3000, dtype=np.int16), silence(0.5)))
+        whole = VoiceActivityDetector(rate=RATE).process(samples.tobytes())
+        vad = VoiceActivityDetector(rate=RATE)
+        data = samples.tobytes()
+        chunked = np.concatenate([vad.process(data[i:i + 1000]) for i in range(0, len(data), 1000)])
+        np.testing.assert_array_equal(whole, chunked)
+
+
+class TestPauseEndpointer(unittest.TestCase):
+    def _endpointer(self, pause_seconds=1.5, threshold_db=-40):
+        return PauseEndpointer(VoiceActivityDetector(rate=RATE, threshold_db=threshold_db), pause_seconds=pause_seconds)
+
+    def test_silence_and_noise_never_end_the_turn(self):
+        self.assertIsNone(feed_until_endpoint(self._endpointer(), np.concatenate((silence(2), noise(3)))))
+
+    def test_stop_fixture_ends_after_pause(self):
+        stop = load_wav(STOP_WAV, RATE)
+        samples = np.concatenate((noise(0.5), stop, noise(3.0, seed=1)))
+        speech_end = 0.5 + len(stop) / RATE
+        endpoint = feed_until_endpoint(self._endpointer(1.5), samples)
+        self.assertIsNotNone(endpoint)
+        self.assertGreater(endpoint, speech_end + 1.0)
+        self.assertLess(endpoint, speech_end + 2.2)
+
+    def test_phrase_fixture_is_not_cut_at_short_pauses(self):
+        # this recording is quiet, its speech averages around -35 dBFS, and
+        # its longest pause between words lasts about 1.6s
+        phrase = load_wav(PHRASE_WAV, RATE)
+        samples = np.concatenate((phrase, noise(3.0)))
+        endpoint = feed_until_endpoint(self._endpointer(1.7, threshold_db=-50), samples)
+        self.assertIsNotNone(endpoint)
+        self.assertGreater(endpoint, len(phrase) / RATE)
+
+    def test_pause_includes_the_vad_hangover(self):
+        endpointer = self._endpointer(pause_seconds=0.5)
+        frame = endpointer.vad.frame_samples
+        samples = np.concatenate((np.full(frame * 10, 3000, dtype=np.int16), silence(2)))
+        fired = [endpointer.feed(samples[offset:offset + frame].tobytes())
+                 for offset in range(0, len(samples), frame)]
+        # the 25th quiet frame after the speech, not 25 frames after the hangover
+        self.assertEqual(10 + 25 - 1, fired.index(True))
+
+    def test_from_config(self):
+        class Config:
+            silence_threshold = -35
+            eom_pause_duration = 0.5
+        endpointer = PauseEndpointer.from_config(Config(), rate=RATE)
+        self.assertEqual(-35, endpointer.vad.threshold_db)
+        self.assertEqual(25, endpointer.pause_frames)
+
+
+class TestTrimSilence(unittest.TestCase):
+    def _speech(self, seconds):
+        return np.full(int(seconds * RATE), 3000, dtype=np.int16)
+
+    def test_speech_regions_padded_and_merged(self):
+        samples = np.concatenate((silence(1), self._speech(0.5), silence(0.3), self._speech(0.5),
+                                  silence(2), self._speech(1), silence(1)))
+        regions = speech_regions(samples, RATE, threshold_db=-40, padding_seconds=0.2, max_pause_seconds=0.5)
+        self.assertEqual([(int(0.8 * RATE), int(2.5 * RATE)), (int(4.1 * RATE), int(5.5 * RATE))], regions)
+
+    def test_trim_reports_removed_seconds(self):
+        samples = np.concatenate((silence(1), self._speech(1), silence(3), self._speech(1), silence(1)))
+        trimmed, removed = trim_silence(samples, RATE, threshold_db=-40, padding_seconds=0.1, max_pause_seconds=0.5)
+        self.assertAlmostEqual(2.4, len(trimmed) / RATE, places=2)
+        self.assertAlmostEqual(len(samples) / RATE - 2.4, removed, places=2)
+
+    def test_trim_float_audio(self):
+        samples = np.concatenate((silence(1), self._speech(1), silence(1))).astype(np.float32) / 32768.0
+        trimmed, removed = trim_silence(samples, RATE, threshold_db=-40, padding_seconds=0, full_scale=1.0)
+        self.assertEqual(np.float32, trimmed.dtype)
+        self.assertAlmostEqual(2.0, removed, places=2)
+
+    def test_all_silence(self):
+        trimmed, removed = trim_silence(silence(2), RATE)
+        self.assertEqual(0, len(trimmed))
+        self.assertEqual(2.0, removed)
+
+    def test_phrase_fixture_keeps_all_speech(self):
+        phrase = load_wav(PHRASE_WAV, RATE)
+        samples = np.concatenate((silence(2), phrase, silence(2)))
+        trimmed, removed = trim_silence(samples, RATE, threshold_db=-50)
+        self.assertGreater(removed, 4.0)
+        # every frame loud enough to be speech survives the trim
+        levels = frame_levels_db(trimmed, 320)
+        original_levels = frame_levels_db(samples, 320)
+        self.assertEqual((original_levels >= -50).sum(), (levels >= -50).sum())
@@ -0,0 +1,160 @@
+import logging
+import os
+import tempfile
+import threading
+import numpy as np
+
+
+class AudioBuffer:
+    """
+    Captured 16-bit mono audio kept in preallocated NumPy blocks instead of a
+    growing BytesIO, so appending never copies what was already recorded.
+
+    Parameters:
+        rate (int): Sample rate, used to turn durations into sample counts.
+        block_seconds (float): Size of each preallocated block.
+        max_seconds (float): Most audio kept in memory, or None for no limit.
+        overflow (str): What happens past max_seconds. "ring" overwrites the
+            oldest audio, "spill" moves the oldest blocks to a temporary file
+            so nothing is lost while memory stays bounded.
+    """
+    def __init__(self, rate=16000, block_seconds=10.0, max_seconds=None, overflow="ring", spill_dir=None):
+        if overflow not in ("ring", "spill"):
+            raise ValueError(f"Unknown overflow mode: {overflow}")
+        self.logger = logging.getLogger(__name__)
+        self.rate = rate
+        self.block_samples = max(1, int(block_seconds * rate))
+        self.max_blocks = None if max_seconds is None else max(1, -(-int(max_seconds * rate) // self.block_samples))
+        self.overflow = overflow
+        self.spill_dir = spill_dir
+        self.dropped_samples = 0
+        self._blocks = []
+        self._head = 0  # offset of the first valid sample in _blocks[0]
+        self._tail = 0  # samples used in _blocks[-1]
+        self._spill_file = None
+        self._spilled_samples = 0
+        self._scratch = np.empty(0, dtype=np.float32)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, rate=16000):
+        return cls(rate=rate,
+                   max_seconds=getattr(config, "max_recording_seconds", None),
+                   overflow=getattr(config, "recording_overflow", "ring"))
+
+    def __len__(self):
+        with self._lock:
+            return self._length()
+
+    @property
+    def duration(self):
+        return len(self) / float(self.rate)
+
+    def write(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        with self._lock:
+            while len(samples):
+                if not self._blocks or self._tail == self.block_samples:
+                    self._add_block()
+                take = min(len(samples), self.block_samples - self._tail)
+                self._blocks[-1][self._tail:self._tail + take] = samples[:take]
+                self._tail += take
+                samples = samples[take:]
+        return len(data)
+
+    def samples(self, start=0):
+        """
+        Returns a contiguous int16 copy of the audio from sample start on.
+        """
+        with self._lock:
+            out = np.empty(max(0, self._length() - start), dtype=np.int16)
+            self._copy_into(out, start, lambda src, dst: np.copyto(dst, src))
+            return out
+
+    def as_float32(self, start=0, out=None):
+        """
+        Converts the audio from sample start on to float32 in [-1, 1) with
+        one vectorized pass per block, writing into a scratch array that is
+        reused across calls. The result is only valid until the next call.
+        """
+        scale = np.float32(1.0 / 32768.0)
+        with self._lock:
+            count = max(0, self._length() - start)
+            if out is None:
+                if len(self._scratch) < count:
+                    self._scratch = np.empty(count, dtype=np.float32)
+                out = self._scratch
+            out = out[:count]
+            self._copy_into(out, start, lambda src, dst: np.multiply(src, scale, out=dst, casting="unsafe"))
+            return out
+
+    def getvalue(self):
+        return self.samples().tobytes()
+
+    def seek(self, position):
+        # BytesIO compatibility; reads always start from the beginning
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._blocks = []
+            self._head = self._tail = 0
+            self._close_spill()
+
+    def close(self):
+        self.clear()
+
+    def _length(self):
+        if not self._blocks:
+            return self._spilled_samples
+        return self._spilled_samples + (len(self._blocks) - 1) * self.block_samples - self._head + self._tail
+
+    def _add_block(self):
+        if self.max_blocks is not None and len(self._blocks) >= self.max_blocks:
+            oldest = self._blocks.pop(0)
+            if self.overflow == "spill":
+                self._spill(oldest[self._head:])
+            else:
+                self.dropped_samples += self.block_samples - self._head
+            self._head = 0
+            self._blocks.append(oldest)  # recycle the block, no new allocation
+        else:
+            self._blocks.append(np.empty(self.block_samples, dtype=np.int16))
+        self._tail = 0
+
+    def _spill(self, samples):
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(dir=self.spill_dir)
+            self.logger.debug("Recording exceeded its memory budget, spilling to disk")
+        self._spill_file.seek(0, os.SEEK_END)
+        self._spill_file.write(samples.tobytes())
+        self._spilled_samples += len(samples)
+
+    def _close_spill(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        self._spilled_samples = 0
+
+    def _copy_into(self, out, start, convert):
+        position = 0  # write position in out
+        skip = start
+        if self._spilled_samples:
+            if skip < self._spilled_samples:
+                self._spill_file.seek(skip * 2)
+                spilled = np.fromfile(self._spill_file, dtype=np.int16, count=self._spilled_samples - skip)
+                convert(spilled, out[:len(spilled)])
+                position = len(spilled)
+                skip = 0
+            else:
+                skip -= self._spilled_samples
+        for index, block in enumerate(self._blocks):
+            begin = self._head if index == 0 else 0
+            end = self._tail if index == len(self._blocks) - 1 else self.block_samples
+            if skip >= end - begin:
+                skip -= end - begin
+                continue
+            begin += skip
+            skip = 0
+            convert(block[begin:end], out[position:position + end - begin])
+            position += end - begin
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """
+    Collapses whitespace and unicode variants. Case and punctuation are kept
+    because they change how the sentence is spoken.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(text, model_path, audio_format):
+    digest = hashlib.sha256()
+    for part in (normalize_text(text), model_path, audio_format):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CacheStats:
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def as_dict(self):
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class AudioCache:
+    """
+    Content-addressed cache of synthesized audio bytes, with a byte-bounded
+    in-memory LRU in front of an optional size-bounded directory on disk.
+
+    Parameters:
+        memory_bytes (int): Budget for the in-memory tier.
+        cache_dir (str): Directory for the disk tier, or None to disable it.
+        disk_bytes (int): Budget for the disk tier; least recently used files
+            are deleted first.
+    """
+    def __init__(self, memory_bytes=32 * 1024 * 1024, cache_dir=None, disk_bytes=256 * 1024 * 1024):
+        self.logger = logging.getLogger(__name__)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.cache_dir = os.path.expanduser(cache_dir) if cache_dir else None
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key -> size, least recently used first
+        self._disk_size = 0
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._load_disk_index()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(memory_bytes=getattr(config, "tts_cache_memory_bytes", 32 * 1024 * 1024),
+                   cache_dir=getattr(config, "tts_cache_dir", None),
+                   disk_bytes=getattr(config, "tts_cache_disk_bytes", 256 * 1024 * 1024))
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return self._memory[key]
+
+            data = self._read_disk(key)
+            if data is None:
+                self.stats.misses += 1
+                return None
+            self.stats.disk_hits += 1
+            self._put_memory(key, data)
+            return data
+
+    def put(self, key, data):
+        data = bytes(data)
+        with self._lock:
+            self._put_memory(key, data)
+            self._write_disk(key, data)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            for key in list(self._disk):
+                self._remove_disk(key)
+
+    def _put_memory(self, key, data):
+        if len(data) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_size -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.stats.memory_evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".audio")
+
+    def _load_disk_index(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".audio"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            entries.append((stat.st_mtime, name[:-len(".audio")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+        self.logger.debug("Loaded %d cached audio files (%d bytes) from %s", len(self._disk), self._disk_size, self.cache_dir)
+
+    def _read_disk(self, key):
+        if not self.cache_dir or key not in self._disk:
+            return None
+        try:
+            with open(self._path(key), "rb") as file:
+                data = file.read()
+            os.utime(self._path(key))
+        except OSError as e:
+            self.logger.warning(f"Dropping unreadable audio cache entry {key}: {str(e)}")
+            self._remove_disk(key)
+            return None
+        self._disk.move_to_end(key)
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.cache_dir or key in self._disk or len(data) > self.disk_bytes:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            self.logger.warning(f"Failed to write audio cache entry: {str(e)}")
+            return
+        self._disk[key] = len(data)
+        self._disk_size += len(data)
+        while self._disk_size > self.disk_bytes:
+            oldest = next(iter(self._disk))
+            self._remove_disk(oldest)
+            self.stats.disk_evictions += 1
+
+    def _remove_disk(self, key):
+        self._disk_size -= self._disk.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
@@ -1,31 +1,108 @@
 import logging
+import queue
 import threading
+import time
 import simpleaudio as sa
 from vocalai.event_manager import EventManager
+from vocalai.pcm import PCMBuffer
+from vocalai.tracing import current_span, get_tracer
+from vocalai.util import restore_output, suppress_output
 
 
-class AudioPlayer:
-    _lock = threading.Lock()
+class _PyAudioStream:
+    def __init__(self, p, pcm):
+        self.rate = pcm.sample_rate
+        self.stream = p.open(format=p.get_format_from_width(pcm.sample_width), channels=pcm.channels,
+                             rate=pcm.sample_rate, output=True)
+        self.buffer_frames = self.stream.get_write_available()
+
+    def write(self, pcm):
+        self.stream.write(bytes(pcm.data))
+
+    def pending(self):
+        return max(0, self.buffer_frames - self.stream.get_write_available()) / float(self.rate)
+
+    def stop(self):
+        # closing an active stream discards what the device has not played
+        self.close()
 
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+class PyAudioBackend:
+    """
+    Playback backend writing to one PyAudio output stream, so consecutive
+    buffers play without a gap between them.
+
+    Any object with an open_stream(pcm) method can be used instead, e.g. a
+    fake backend in tests. It returns a stream for pcm's format with
+    write(pcm), blocking while the output is too far ahead, pending(), the
+    seconds written but not yet played, stop(), discarding those, and
+    close().
+    """
     def __init__(self):
+        self.p = None
+
+    def open_stream(self, pcm):
+        if self.p is None:
+            import pyaudio
+            old_stdout, old_stderr, devnull = suppress_output()
+            try:
+                self.p = pyaudio.PyAudio()
+            finally:
+                restore_output(old_stdout, old_stderr, devnull)
+        return _PyAudioStream(self.p, pcm)
+
+    def close(self):
+        if self.p is not None:
+            self.p.terminate()
+            self.p = None
+
+
+class AudioPlayer:
+    def __init__(self, backend=None, max_pending=8, event_manager=None, chunk_seconds=0.05):
         self.logger = logging.getLogger(__name__)
         self.audio_thread = None
-        self.event_manager = EventManager.get_instance()
-        self.event_manager.subscribe("stop_audio", self.stop)
+        self.event_manager = event_manager or EventManager.get_instance()
+        self.event_manager.subscribe("stop_audio", self.stop, synchronous=True)
         self.play_obj = None
+        self.backend = backend or PyAudioBackend()
+        self._lock = threading.Lock()
+
+        # Queued playback: enqueue() -> _pending -> prefetch thread converts
+        # to PCM -> _ready -> playback thread writes buffers to one stream,
+        # chunk_seconds at a time so a flush cuts in within a chunk.
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._ready = queue.Queue(maxsize=1)
+        self.chunk_seconds = chunk_seconds
+        self._generation = 0
+        self._outstanding = 0
+        self._queue_playing = False  # guarded by _idle
+        self._stream = None
+        self._idle = threading.Condition()
+        self._shutdown = threading.Event()
+        self._prefetch_thread = None
+        self._playback_thread = None
         self.logger.debug("AudioPlayer initialized and subscribed to stop_audio")
 
     def _play_audio(self, audio_file):
-        with self.__class__._lock:
+        with self._lock:
             if self.play_obj and self.play_obj.is_playing():
                 self.logger.debug("An audio is already playing. Stopping it first.")
                 self.stop()
 
-            self.logger.debug(f"Starting to play audio file: {audio_file}")
+            self.logger.debug("Starting to play audio file: %s", audio_file)
             self.event_manager.publish("audio_started", None)
             try:
-                wave_obj = sa.WaveObject.from_wave_file(audio_file)
-                self.play_obj = wave_obj.play()
+                if isinstance(audio_file, PCMBuffer):
+                    self.play_obj = sa.play_buffer(audio_file.data, audio_file.channels, audio_file.sample_width,
+                                                   audio_file.sample_rate)
+                else:
+                    wave_obj = sa.WaveObject.from_wave_file(audio_file)
+                    self.play_obj = wave_obj.play()
                 self.play_obj.wait_done()
             except Exception as e:
                 self.logger.error(f"failed to play audio: {str(e)}")
@@ -39,26 +116,192 @@ class AudioPlayer:
             self.stop()
         self.audio_thread = threading.Thread(target=self._play_audio, args=(audio_file,))
         self.audio_thread.start()
-        self.logger.debug(f"New audio process started for: {audio_file}")
+        self.logger.debug("New audio process started for: %s", audio_file)
+
 
+    def enqueue(self, audio):
+        """
+        Queues audio to play after everything already queued, without gaps.
+
+        Parameters:
+            audio: A PCMBuffer, or a WAV file path or file-like object.
+        """
+        self._start_queue_threads()
+        with self._idle:
+            self._outstanding += 1
+            generation = self._generation
+        # playback is recorded in the trace of whoever queued the audio
+        self._pending.put((generation, audio, current_span()))
+
+    def flush(self, data=None):
+        """
+        Drops everything queued. The playback thread stops the buffer it is
+        writing within one chunk and discards what the output still holds.
+        """
+        with self._idle:
+            self._generation += 1
+            dropped = self._drain(self._pending) + self._drain(self._ready)
+        self._finish_item(dropped)
+        self.logger.debug("Playback queue flushed")
+
+    def wait_done(self, timeout=None):
+        if self.audio_thread and self.audio_thread.is_alive():
+            self.audio_thread.join(timeout)
+        with self._idle:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout)
+
+    def _start_queue_threads(self):
+        # not _lock, which _play_audio holds for as long as it plays
+        with self._idle:
+            if self._playback_thread and self._playback_thread.is_alive():
+                return
+            self._shutdown.clear()
+            self._prefetch_thread = threading.Thread(target=self._prefetch_loop, name="audio-prefetch", daemon=True)
+            self._playback_thread = threading.Thread(target=self._playback_loop, name="audio-playback", daemon=True)
+            self._prefetch_thread.start()
+            self._playback_thread.start()
+
+    def _prefetch_loop(self):
+        while not self._shutdown.is_set():
+            try:
+                generation, audio, span = self._pending.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                pcm = audio if isinstance(audio, PCMBuffer) else PCMBuffer.from_wave(audio)
+            except Exception as e:
+                self.logger.error(f"failed to convert audio: {str(e)}")
+                self._finish_item()
+                continue
+            while not self._shutdown.is_set():
+                if generation != self._generation:
+                    self._finish_item()
+                    break
+                try:
+                    self._ready.put((generation, pcm, span), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def _playback_loop(self):
+        try:
+            while not self._shutdown.is_set():
+                try:
+                    generation, pcm, span = self._ready.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if generation != self._generation:
+                    self._finish_item()
+                    continue
+                with self._idle:
+                    started, self._queue_playing = not self._queue_playing, True
+                if started:
+                    self.event_manager.publish("audio_started", None)
+                start = time.monotonic()
+                try:
+                    self._write(generation, pcm)
+                except Exception as e:
+                    self.logger.error(f"failed to play audio: {str(e)}")
+                    self._close_stream()
+                finally:
+                    if span is not None:
+                        get_tracer().record_span("playback", start, time.monotonic(), parent=span,
+                                                 audio_seconds=pcm.duration)
+                    self._finish_item()
+        finally:
+            self._close_stream()
+
+    def _write(self, generation, pcm):
+        """
+        Writes pcm to the stream in chunks. After the last buffer queued it
+        waits for the output to play out, so audio_stopped means silence.
+        """
+        stream = self._stream_for(pcm)
+        frame_bytes = pcm.channels * pcm.sample_width
+        chunk = max(1, int(self.chunk_seconds * pcm.sample_rate)) * frame_bytes
+        data = memoryview(pcm.data).cast("B")
+        for offset in range(0, len(data), chunk):
+            if generation != self._generation:
+                break
+            stream.write(PCMBuffer(data[offset:offset + chunk], pcm.channels, pcm.sample_width, pcm.sample_rate))
+        with self._idle:
+            last = self._outstanding <= 1
+        while last and generation == self._generation and not self._shutdown.is_set():
+            pending = stream.pending()
+            if pending <= 0:
+                break
+            time.sleep(min(pending, self.chunk_seconds))
+        if generation != self._generation:
+            self._close_stream(stop=True)
+
+    def _stream_for(self, pcm):
+        stream_format = (pcm.channels, pcm.sample_width, pcm.sample_rate)
+        if self._stream is not None and self._stream[0] != stream_format:
+            self._close_stream()
+        if self._stream is None:
+            self._stream = (stream_format, self.backend.open_stream(pcm))
+        return self._stream[1]
+
+    def _close_stream(self, stop=False):
+        if self._stream is None:
+            return
+        _, stream = self._stream
+        self._stream = None
+        try:
+            if stop:
+                stream.stop()
+            stream.close()
+        except Exception as e:
+            self.logger.error(f"failed to close the audio stream: {str(e)}")
+
+    def _finish_item(self, count=1):
+        with self._idle:
+            self._outstanding = max(0, self._outstanding - count)
+            idle = self._outstanding == 0
+            if idle:
+                self._idle.notify_all()
+            stopped = idle and self._queue_playing
+            if stopped:
+                self._queue_playing = False
+        if stopped:
+            self.event_manager.publish("audio_stopped", None)
+            self.logger.debug("Playback queue drained and audio_stopped event published")
+
+    @staticmethod
+    def _drain(q):
+        dropped = 0
+        while True:
+            try:
+                q.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                return dropped
 
     def stop(self, data=None):
+        """
+        Stops all playback. audio_stopped is published once, by whichever
+        playback was running, when it has gone silent.
+        """
+        self.flush()
         if self.play_obj and self.play_obj.is_playing():
             self.logger.debug("Stopping audio playback")
             self.play_obj.stop()
         if self.audio_thread:
             self.audio_thread.join(timeout=1)
         self.audio_thread = None
-        self.event_manager.publish("audio_stopped", None)
         self.logger.debug("Audio process stopped and cleaned up")
 
     def is_playing(self):
-        playing = self.play_obj is not None and self.play_obj.is_playing()
-        self.logger.debug(f"Is audio playing? {'Yes' if playing else 'No'}")
+        playing = self._queue_playing or (self.play_obj is not None and self.play_obj.is_playing())
+        self.logger.debug("Is audio playing? %s", "Yes" if playing else "No")
         return playing
 
     def cleanup(self):
         self.logger.debug("Cleaning up AudioPlayer, stopping any playing audio")
         self.stop()
-        self.event_manager.publish("audio_stopped", None)
+        self._shutdown.set()
+        if self._playback_thread:
+            self._playback_thread.join(timeout=1)
+        if hasattr(self.backend, "close"):
+            self.backend.close()
 
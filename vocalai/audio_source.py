@@ -0,0 +1,365 @@
+import logging
+import queue
+import socket
+import sys
+import threading
+import time
+from vocalai.util import load_wav, suppress_output, restore_output
+
+
+class WavFileStream:
+    """
+    Stands in for a PyAudio input stream, reading a WAV file as 16-bit mono
+    chunks paced like a microphone. Once the file is exhausted it keeps
+    returning silence, as a real microphone would in a quiet room.
+
+    Parameters:
+        path (str): WAV file; converted to mono int16 at rate.
+        rate (int): Sample rate expected by the reader.
+        speed (float): Pacing relative to real time; 0 disables pacing.
+    """
+    def __init__(self, path, rate=16000, speed=1.0):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.rate = rate
+        self.speed = speed
+        self.data = load_wav(path, rate=rate).tobytes()
+        self._lock = threading.Lock()
+        self.rewind()
+
+    @property
+    def exhausted(self):
+        return self._position >= len(self.data)
+
+    @property
+    def duration(self):
+        return len(self.data) / 2 / float(self.rate)
+
+    def rewind(self):
+        with self._lock:
+            self._position = 0
+            self._next_time = None
+            self.exhausted_at = None
+
+    def read(self, frames, exception_on_overflow=True):
+        size = frames * 2
+        with self._lock:
+            chunk = self.data[self._position:self._position + size]
+            self._position += size
+            if self.exhausted and self.exhausted_at is None:
+                self.exhausted_at = time.monotonic()
+            next_time = self._next_time
+        if self.speed:
+            now = time.monotonic()
+            if next_time is None:
+                next_time = now
+            next_time += frames / float(self.rate) / self.speed
+            if next_time > now:
+                time.sleep(next_time - now)
+            self._next_time = next_time
+        return chunk + bytes(size - len(chunk))
+
+    def start_stream(self):
+        pass
+
+    def stop_stream(self):
+        pass
+
+    def is_active(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class AudioSource:
+    """
+    Captures 16-bit mono PCM continuously into a bounded queue, independently
+    of how fast the consumer reads. When the consumer falls behind by more
+    than max_queue_seconds the oldest audio is dropped and counted, so the
+    reader always gets recent audio.
+
+    Subclasses produce audio by calling _push() from their capture thread or
+    callback, and _end() when the input is finished. Also offers the subset
+    of the PyAudio stream interface SpeechRecognizer uses.
+
+    Parameters:
+        rate (int): Sample rate in Hz.
+        chunk (int): Frames per captured chunk.
+        max_queue_seconds (float): Audio buffered before dropping the oldest.
+    """
+    def __init__(self, rate=16000, chunk=1024, max_queue_seconds=10.0):
+        self.logger = logging.getLogger(__name__)
+        self.rate = rate
+        self.chunk = chunk
+        self._queue = queue.Queue(maxsize=max(1, int(max_queue_seconds * rate / chunk)))
+        self._remainder = b""
+        self._ended = threading.Event()
+        self._running = threading.Event()
+        self.captured_frames = 0
+        self.overflows = 0  # times the queue was full
+        self.dropped_frames = 0
+        self.device_overflows = 0  # overflows reported by the device itself
+        self._odd_byte = b""
+
+    def start(self):
+        self._running.set()
+        return self
+
+    def stop(self):
+        self._running.clear()
+
+    @property
+    def ended(self):
+        return self._ended.is_set() and self._queue.empty() and not self._remainder
+
+    def _push(self, data):
+        self.captured_frames += len(data) // 2
+        while True:
+            try:
+                self._queue.put_nowait(data)
+                return
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self.overflows += 1
+                self.dropped_frames += len(dropped) // 2
+
+    def _push_bytes(self, data):
+        # keep samples whole across reads that split one in half
+        data = self._odd_byte + data
+        self._odd_byte = data[len(data) - len(data) % 2:]
+        if len(data) > 1:
+            self._push(data[:len(data) - len(data) % 2])
+
+    def _end(self):
+        self._ended.set()
+        # wake up a reader blocked on an empty queue
+        try:
+            self._queue.put_nowait(b"")
+        except queue.Full:
+            pass
+
+    def read(self, frames, exception_on_overflow=True):
+        """
+        Blocks until frames frames are available and returns them. Returns a
+        shorter chunk, or None, once the input has ended.
+        """
+        size = frames * 2
+        data = self._remainder
+        while len(data) < size:
+            if self._ended.is_set() and self._queue.empty():
+                break
+            try:
+                data += self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        self._remainder = data[size:]
+        data = data[:size]
+        return data if data else None
+
+    def stats(self):
+        return {
+            "captured_frames": self.captured_frames,
+            "overflows": self.overflows,
+            "dropped_frames": self.dropped_frames,
+            "device_overflows": self.device_overflows,
+            "queued_chunks": self._queue.qsize(),
+        }
+
+    # PyAudio stream interface
+    def start_stream(self):
+        self.start()
+
+    def stop_stream(self):
+        self.stop()
+
+    def is_active(self):
+        return self._running.is_set()
+
+    def close(self):
+        self.stop()
+
+
+class PyAudioSource(AudioSource):
+    """
+    Microphone capture in PyAudio callback mode: PortAudio calls us on its own
+    thread for every chunk, whether or not anyone is reading.
+    """
+    def __init__(self, rate=16000, chunk=1024, max_queue_seconds=10.0, device_index=None):
+        import pyaudio  # optional: only needed for a real microphone
+        super().__init__(rate, chunk, max_queue_seconds)
+        self._pyaudio = pyaudio
+        old_stdout, old_stderr, devnull = suppress_output()
+        try:
+            self.p = pyaudio.PyAudio()
+        except Exception as e:
+            raise Exception(f"Failed to create pyaudio instance {str(e)}")
+        finally:
+            restore_output(old_stdout, old_stderr, devnull)
+        self.stream = self.p.open(format=pyaudio.paInt16,
+                                  channels=1, # mono
+                                  rate=rate,
+                                  input=True,
+                                  input_device_index=device_index,
+                                  frames_per_buffer=chunk,
+                                  stream_callback=self._callback,
+                                  start=False)
+
+    def _callback(self, in_data, frame_count, time_info, status_flags):
+        if status_flags & self._pyaudio.paInputOverflow:
+            self.device_overflows += 1
+        if self._running.is_set():
+            self._push(in_data)
+        return (None, self._pyaudio.paContinue)
+
+    def start(self):
+        super().start()
+        self.stream.start_stream()
+        return self
+
+    def stop(self):
+        super().stop()
+        if self.stream.is_active():
+            self.stream.stop_stream()
+
+    def close(self):
+        self.stop()
+        self.stream.close()
+        self.p.terminate()
+
+
+class _ReaderThreadSource(AudioSource):
+    """
+    Runs _capture() on a daemon thread; the input ends when it returns.
+    """
+    def __init__(self, rate=16000, chunk=1024, max_queue_seconds=10.0):
+        super().__init__(rate, chunk, max_queue_seconds)
+        self._thread = None
+
+    def start(self):
+        super().start()
+        self._thread = threading.Thread(target=self._run, name=f"audio-{type(self).__name__}", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self._capture()
+        except Exception as e:
+            if self._running.is_set():
+                self.logger.error("Audio capture failed: %s", e)
+        finally:
+            self._end()
+
+    def _capture(self):
+        raise NotImplementedError
+
+
+class PushSource(AudioSource):
+    """
+    Audio handed in by the caller, e.g. PCM frames received from a network
+    client. feed() never blocks.
+    """
+    def feed(self, data):
+        if self._running.is_set():
+            self._push_bytes(data)
+
+    def end(self):
+        self._end()
+
+
+class WavFileSource(_ReaderThreadSource):
+    """
+    Plays a WAV file into the queue at microphone pace, then silence.
+    """
+    def __init__(self, path, rate=16000, chunk=1024, max_queue_seconds=10.0, speed=1.0):
+        super().__init__(rate, chunk, max_queue_seconds)
+        self.wav = WavFileStream(path, rate=rate, speed=speed)
+
+    @property
+    def exhausted(self):
+        return self.wav.exhausted
+
+    def rewind(self):
+        self.wav.rewind()
+
+    def _capture(self):
+        while self._running.is_set():
+            self._push(self.wav.read(self.chunk))
+
+
+class PipeSource(_ReaderThreadSource):
+    """
+    Raw 16-bit mono PCM from a binary file object, stdin by default, e.g.
+    `arecord -f S16_LE -r 16000 -c 1 | python3 main.py`.
+    """
+    def __init__(self, pipe=None, rate=16000, chunk=1024, max_queue_seconds=10.0):
+        super().__init__(rate, chunk, max_queue_seconds)
+        self.pipe = pipe if pipe is not None else sys.stdin.buffer
+
+    def _capture(self):
+        read = getattr(self.pipe, "read1", self.pipe.read)
+        while self._running.is_set():
+            data = read(self.chunk * 2)
+            if not data:
+                return
+            self._push_bytes(data)
+
+
+class SocketSource(_ReaderThreadSource):
+    """
+    Listens on a TCP port and captures raw 16-bit mono PCM from the first
+    client that connects, until it disconnects.
+    """
+    def __init__(self, host="127.0.0.1", port=0, rate=16000, chunk=1024, max_queue_seconds=10.0):
+        super().__init__(rate, chunk, max_queue_seconds)
+        self._server = socket.create_server((host, port))
+        self._server.settimeout(0.5)
+        self._connection = None
+
+    @property
+    def address(self):
+        return self._server.getsockname()[:2]
+
+    def _capture(self):
+        while self._running.is_set() and self._connection is None:
+            try:
+                self._connection, peer = self._server.accept()
+            except socket.timeout:
+                continue
+            self.logger.info("Audio client connected from %s:%d", *peer[:2])
+        while self._running.is_set():
+            data = self._connection.recv(self.chunk * 2)
+            if not data:
+                self.logger.info("Audio client disconnected")
+                return
+            self._push_bytes(data)
+
+    def close(self):
+        self.stop()
+        if self._connection is not None:
+            self._connection.close()
+        self._server.close()
+
+
+def create_audio_source(config, rate=16000, chunk=1024):
+    """
+    Builds the source named by config.audio_source: "pyaudio" (default),
+    "wav:<path>", "pipe" (stdin) or "tcp:<host>:<port>".
+    """
+    spec = getattr(config, "audio_source", "pyaudio") or "pyaudio"
+    max_queue_seconds = getattr(config, "audio_queue_seconds", 10.0)
+    kind, _, argument = spec.partition(":")
+    if kind == "pyaudio":
+        return PyAudioSource(rate, chunk, max_queue_seconds, device_index=getattr(config, "audio_device_index", None))
+    if kind == "wav":
+        return WavFileSource(argument, rate, chunk, max_queue_seconds)
+    if kind == "pipe":
+        return PipeSource(None, rate, chunk, max_queue_seconds)
+    if kind == "tcp":
+        host, _, port = argument.rpartition(":")
+        return SocketSource(host or "127.0.0.1", int(port), rate, chunk, max_queue_seconds)
+    raise ValueError(f"Unknown audio_source: {spec}")
@@ -0,0 +1,180 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import torch
+import whisper
+from whisper.audio import N_SAMPLES
+from vocalai.tracing import get_tracer
+
+
+class BatchTranscriber:
+    """
+    Transcribes utterances from several callers with one whisper model by
+    decoding them together. The first pending request opens a window of
+    window_seconds; every request that arrives within it (up to max_batch)
+    is padded to whisper's 30 second input, stacked into one mel batch and
+    decoded in a single pass. Each caller gets its result through a Future.
+
+    Batched decoding is a single greedy pass without timestamps, so requests
+    with transcribe options (e.g. an initial prompt) or longer than 30
+    seconds go through model.transcribe on their own instead. All model
+    calls run on the scheduler thread, one at a time.
+
+    Drop-in for the model where only transcribe(audio) is used.
+
+    Parameters:
+        model: A loaded whisper model.
+        window_seconds (float): How long to wait for more requests once the
+            first one arrives. 0 batches only what is already queued.
+        max_batch (int): Requests decoded together at most.
+        max_tokens (int): Token limit per utterance, None for whisper's default.
+    """
+    def __init__(self, model, window_seconds=0.05, max_batch=8, max_tokens=None):
+        self.logger = logging.getLogger(__name__)
+        self.model = model
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.decoding_options = whisper.DecodingOptions(
+            language=None if model.is_multilingual else "en",
+            sample_len=max_tokens,
+            without_timestamps=True,
+            fp16=model.device.type == "cuda")
+        self._requests = queue.Queue()
+        self._stopped = threading.Event()
+        # orders submit against stop, so no request is queued after the drain
+        self._lock = threading.Lock()
+        self._thread = None
+        self.requests = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.queue_wait_time = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="whisper-batcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the scheduler once the batch in progress is done. Requests still
+        queued, and any submitted later, fail with a RuntimeError so no caller
+        waits forever.
+        """
+        with self._lock:
+            self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        abandoned = 0
+        while True:
+            try:
+                _, _, _, future = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("Whisper batch transcriber stopped"))
+                abandoned += 1
+        if abandoned:
+            self.logger.warning("Batch transcriber stopped with %d requests pending", abandoned)
+
+    def submit(self, audio, **options):
+        """
+        Queues float32 16 kHz audio and returns a Future resolving to a
+        whisper-style result dict with at least "text".
+        """
+        future = Future()
+        with self._lock:
+            if self._stopped.is_set():
+                future.set_exception(RuntimeError("Whisper batch transcriber stopped"))
+            else:
+                self._requests.put((time.monotonic(), audio, options, future))
+        return future
+
+    def transcribe(self, audio, **options):
+        return self.submit(audio, **options).result()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "mean_queue_wait": self.queue_wait_time / self.requests if self.requests else 0.0,
+        }
+
+    def _collect(self):
+        try:
+            first = self._requests.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        pending = [first]
+        deadline = time.monotonic() + self.window_seconds
+        while len(pending) < self.max_batch:
+            try:
+                pending.append(self._requests.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while not self._stopped.is_set():
+            pending = self._collect()
+            if not pending:
+                continue
+            started = time.monotonic()
+            self.requests += len(pending)
+            self.queue_wait_time += sum(started - queued_at for queued_at, _, _, _ in pending)
+            batch = []
+            for request in pending:
+                if self._batchable(request):
+                    batch.append(request)
+                else:
+                    self._run_single(request)
+            if batch:
+                self._run_batch(batch)
+
+    @staticmethod
+    def _batchable(request):
+        _, audio, options, _ = request
+        return not options and len(audio) <= N_SAMPLES
+
+    def _run_single(self, request):
+        _, audio, options, future = request
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self.model.transcribe(audio, **options))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _run_batch(self, batch):
+        futures = [future for _, _, _, future in batch]
+        live = [future.set_running_or_notify_cancel() for future in futures]
+        batch = [request for request, running in zip(batch, live) if running]
+        if not batch:
+            return
+        try:
+            with get_tracer().span("whisper_batch", batch_size=len(batch)):
+                texts = self.decode_batch([audio for _, audio, _, _ in batch])
+        except Exception as e:
+            self.logger.error("Batched transcription of %d requests failed: %s", len(batch), e)
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.batched_requests += len(batch)
+        for (_, _, _, future), text in zip(batch, texts):
+            future.set_result({"text": text})
+
+    def decode_batch(self, audios):
+        """
+        Decodes up to 30 seconds of audio per item in one pass. Returns the
+        texts in order.
+        """
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.as_tensor(audio, dtype=torch.float32)),
+                                        n_mels=self.model.dims.n_mels)
+            for audio in audios
+        ]).to(self.model.device)
+        results = whisper.decode(self.model, mels, self.decoding_options)
+        return [result.text for result in results]
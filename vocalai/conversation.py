@@ -0,0 +1,124 @@
+import logging
+
+SUMMARY_INSTRUCTIONS = ("Summarize the following conversation in a few sentences, keeping any facts, "
+                        "names and requests the assistant may need later:\n")
+
+
+def estimate_tokens(text):
+    """
+    Rough token count for budgeting, about four characters per token for
+    English. Only used to decide when to fall back; Ollama does the real count.
+    """
+    return len(text) // 4 + 1
+
+
+class Conversation:
+    """
+    State of one conversation with the LLM.
+
+    While it fits, the context array Ollama returns with every answer is sent
+    back with the next prompt, so the model continues from its cached state
+    and only the new prompt is prefilled. When the context would no longer fit
+    the model's window (or is missing, e.g. because an answer was cut short)
+    the prompt is rebuilt from the instructions and the most recent turns that
+    fit history_tokens. Older turns are dropped, or folded into a summary
+    when a summarizer is given.
+
+    Parameters:
+        context_tokens (int): The model's context window (Ollama's num_ctx).
+        history_tokens (int): Budget for past turns in a rebuilt prompt.
+        response_tokens (int): Room kept free for the answer.
+        summarizer (callable): Optional; takes a prompt and returns the
+            model's answer, used to summarize turns that no longer fit.
+    """
+    def __init__(self, context_tokens=2048, history_tokens=1024, response_tokens=256, summarizer=None):
+        self.logger = logging.getLogger(__name__)
+        self.context_tokens = context_tokens
+        self.history_tokens = history_tokens
+        self.response_tokens = response_tokens
+        self.summarizer = summarizer
+        self.context = None
+        self.turns = []  # (prompt, answer)
+        self.summary = ""
+        self._summarized = 0  # turns already folded into the summary
+        self.prompt_eval_counts = []
+        self.rebuilds = 0
+
+    @classmethod
+    def from_config(cls, config, summarizer=None):
+        overflow = getattr(config, "llm_history_overflow", "truncate")
+        return cls(context_tokens=getattr(config, "llm_context_tokens", 2048),
+                   history_tokens=getattr(config, "llm_history_tokens", 1024),
+                   summarizer=summarizer if overflow == "summarize" else None)
+
+    def request(self, instructions, prompt, provisional=False):
+        """
+        Returns the "prompt" (and "context", when reused) fields for the next
+        request. A provisional request, e.g. a speculative one that may be
+        thrown away, changes no state: it is not counted as a rebuild and
+        turns that no longer fit are left out without being summarized.
+        """
+        if self.context is not None:
+            if len(self.context) + estimate_tokens(prompt) + self.response_tokens <= self.context_tokens:
+                return {"prompt": prompt, "context": self.context}
+            if not provisional:
+                self.logger.info("Conversation context of %d tokens is full, rebuilding from history",
+                                 len(self.context))
+        if self.turns and not provisional:
+            self.rebuilds += 1
+        return {"prompt": self._rebuild(instructions, prompt, summarize=not provisional)}
+
+    def record(self, prompt, answer, final_chunk=None):
+        """
+        Adds a finished turn. final_chunk is Ollama's closing NDJSON object,
+        or None when the answer was interrupted.
+        """
+        self.turns.append((prompt, answer))
+        final_chunk = final_chunk or {}
+        self.context = final_chunk.get("context")
+        if "prompt_eval_count" in final_chunk:
+            self.prompt_eval_counts.append(final_chunk["prompt_eval_count"])
+            self.logger.debug("Prompt eval: %d tokens, context now %d tokens",
+                              final_chunk["prompt_eval_count"], len(self.context or ()))
+
+    def reset(self):
+        self.context = None
+        self.turns = []
+        self.summary = ""
+        self._summarized = 0
+
+    @staticmethod
+    def _format_turn(prompt, answer):
+        return f"User: {prompt.strip()}\nAssistant: {answer.strip()}\n"
+
+    def _rebuild(self, instructions, prompt, summarize=True):
+        kept = []
+        budget = self.history_tokens
+        for turn in reversed(self.turns[self._summarized:]):
+            cost = estimate_tokens(self._format_turn(*turn))
+            if cost > budget:
+                break
+            kept.insert(0, turn)
+            budget -= cost
+        dropped = self.turns[self._summarized:len(self.turns) - len(kept)]
+        if dropped and summarize and self.summarizer is not None:
+            self._summarize(dropped)
+        if not kept and not self.summary:
+            return instructions + prompt
+        parts = [instructions]
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation: {self.summary}\n")
+        if kept:
+            parts.append("Conversation so far:\n" + "".join(self._format_turn(*turn) for turn in kept))
+        parts.append(prompt)
+        return "".join(parts)
+
+    def _summarize(self, turns):
+        text = "".join(self._format_turn(*turn) for turn in turns)
+        if self.summary:
+            text = f"Earlier summary: {self.summary}\n{text}"
+        try:
+            self.summary = self.summarizer(SUMMARY_INSTRUCTIONS + text).strip()
+        except Exception as e:
+            self.logger.warning("Summarizing %d turns failed, dropping them: %s", len(turns), e)
+        self._summarized += len(turns)
@@ -1,6 +1,17 @@
+import itertools
 import logging
+import queue
 import threading
 
+# Lower numbers are dispatched first. Barge-in and shutdown must not wait
+# behind routine playback notifications.
+DEFAULT_PRIORITIES = {
+    "stop_audio": 0,
+    "end_session": 0,
+}
+NORMAL_PRIORITY = 1
+
+
 class EventManager:
     _lock = threading.Lock()
     _instance = None
@@ -17,63 +28,188 @@ class EventManager:
     @classmethod
     def reset_instance(cls):
         if cls._instance:
+            cls._instance.stop_dispatcher(drain=False)
             cls._instance = None
 
+    @classmethod
+    def create_local(cls):
+        """
+        Creates an instance that is not the process-wide singleton, e.g. for
+        one client session of the server, whose events must not reach others.
+        """
+        event_manager = cls.__new__(cls)
+        event_manager._setup()
+        return event_manager
+
     def __init__(self):
         """ Virtually private constructor. """
         if EventManager._instance is not None:
             raise Exception("This class is a singleton")
         else:
             EventManager._instance = self
-            self.listeners = {}
-            self.logger = logging.getLogger(__name__)
-            self.logger.debug("EventManager instance created with empty listeners dictionary")
+            self._setup()
 
-    def subscribe(self, event_type, listener):
+    def _setup(self):
+        # Both dicts are replaced, never mutated, whenever a listener is
+        # added or removed, so publishers can iterate them without a lock.
+        self.listeners = {}
+        self._synchronous = {}
+        self.priorities = dict(DEFAULT_PRIORITIES)
+        self._subscribe_lock = threading.Lock()
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        self.logger = logging.getLogger(__name__)
+        self.logger.debug("EventManager instance created with empty listeners dictionary")
+
+    def subscribe(self, event_type, listener, synchronous=False, first=False):
         """
         Subscribes a listener to a specific type of event.
-        
+
         Parameters:
             event_type (str): The type of event to listen for.
             listener (callable): The callback function to invoke when the event occurs.
+            synchronous (bool): Always call the listener on the publisher's
+                thread, even while the async dispatcher is running. Meant for
+                short, latency-critical handlers.
+            first (bool): Call the listener before the ones already
+                subscribed, e.g. to discard queued work before another
+                listener reacts to what is left.
         """
-        if event_type not in self.listeners:
-            self.listeners[event_type] = []
-            self.logger.debug(f"New event type added: {event_type}")
-        self.listeners[event_type].append(listener)
-        self.logger.debug(f"Listener subscribed to {event_type}")
+        def add(current):
+            return (listener,) + current if first else current + (listener,)
+
+        with self._subscribe_lock:
+            listeners = dict(self.listeners)
+            if event_type not in listeners:
+                self.logger.debug("New event type added: %s", event_type)
+            listeners[event_type] = add(listeners.get(event_type, ()))
+            if synchronous:
+                synchronous_listeners = dict(self._synchronous)
+                synchronous_listeners[event_type] = add(synchronous_listeners.get(event_type, ()))
+                self._synchronous = synchronous_listeners
+            self.listeners = listeners
+        self.logger.debug("Listener subscribed to %s", event_type)
 
-    def publish(self, event_type, data):
+    def publish(self, event_type, data, priority=None):
         """
-        Publishes an event to all registered listeners.
+        Publishes an event to all registered listeners. Without a running
+        dispatcher every listener is called before this returns; with one,
+        only synchronous listeners are, and the rest are queued.
 
         Parameters:
             event_type (str): The type of event to publish.
             data (any): The data to pass to the listeners.
+            priority (int): Overrides the event type's dispatch lane.
+        """
+        listeners = self.listeners.get(event_type)
+        if not listeners:
+            return
+        if self._dispatcher is None:
+            self._deliver(event_type, data, listeners)
+        else:
+            synchronous = self._synchronous.get(event_type, ())
+            if synchronous:
+                self._deliver(event_type, data, synchronous)
+            if len(synchronous) < len(listeners):
+                if priority is None:
+                    priority = self.priorities.get(event_type, NORMAL_PRIORITY)
+                self._queue.put((priority, next(self._sequence), event_type, data))
+        self.logger.debug("Event published: %s with data: %s", event_type, data)
+
+    def _deliver(self, event_type, data, listeners, skip=()):
+        for listener in listeners:
+            if listener in skip:
+                continue
+            try:
+                if data is not None:
+                    listener(data)
+                else:
+                    listener()
+            except Exception as e:
+                self.logger.error("Error handling event '%s': %s", event_type, e)
+
+    def start_dispatcher(self):
+        """
+        Switches to asynchronous delivery on a worker thread.
+        """
+        with self._subscribe_lock:
+            if self._dispatcher is not None:
+                return
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="event-dispatch", daemon=True)
+            self._dispatcher.start()
+        self.logger.debug("Event dispatcher started")
+
+    def stop_dispatcher(self, drain=True, timeout=1.0):
+        """
+        Returns to synchronous delivery. With drain, events already queued
+        are delivered first.
+        """
+        dispatcher = self._dispatcher
+        if dispatcher is None:
+            return
+        on_dispatcher = dispatcher is threading.current_thread()
+        if drain and not on_dispatcher:
+            self.wait_idle(timeout)
+        self._dispatcher = None
+        self._queue.put((-1, next(self._sequence), None, None))
+        if not on_dispatcher:
+            dispatcher.join(timeout)
+        self.logger.debug("Event dispatcher stopped")
+
+    def wait_idle(self, timeout=None):
+        """
+        Blocks until every queued event has been delivered. Returns False on
+        timeout.
         """
-        if event_type in self.listeners:
-            for listener in self.listeners[event_type]:
-                try:
-                    if data is not None:
-                        listener(data)
-                    else:
-                        listener()
-                except Exception as e:
-                    self.logger.error(f"Error handling event '{event_type}': {str(e)}")
-            self.logger.debug(f"Event published: {event_type} with data: {data}")
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: self._queue.unfinished_tasks == 0, timeout)
+
+    def _dispatch_loop(self):
+        while True:
+            _, _, event_type, data = self._queue.get()
+            try:
+                if event_type is None:
+                    self._discard_pending()
+                    return
+                listeners = self.listeners.get(event_type, ())
+                self._deliver(event_type, data, listeners, skip=self._synchronous.get(event_type, ()))
+            finally:
+                self._queue.task_done()
+
+    def _discard_pending(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._queue.task_done()
 
     def unsubscribe(self, event_type, listener):
         """
         Unsubscribes a listener from a specific type of event.
-        
+
         Parameters:
             event_type (str): The type of event to unsubscribe from.
             listener (callable): The callback function to remove.
         """
-        if event_type in self.listeners:
-            self.listeners[event_type].remove(listener)
-            self.logger.debug(f"Listener unsubscribed from {event_type}")
-            if not self.listeners[event_type]:  # Remove the event type if no listeners are left
-                del self.listeners[event_type]
-                self.logger.debug(f"No more listeners for {event_type}, event type removed")
-
+        with self._subscribe_lock:
+            if event_type not in self.listeners:
+                return
+            listeners = dict(self.listeners)
+            remaining = list(listeners[event_type])
+            remaining.remove(listener)
+            if remaining:
+                listeners[event_type] = tuple(remaining)
+            else:  # Remove the event type if no listeners are left
+                del listeners[event_type]
+            synchronous = list(self._synchronous.get(event_type, ()))
+            if listener in synchronous:
+                synchronous.remove(listener)
+                synchronous_listeners = dict(self._synchronous)
+                synchronous_listeners[event_type] = tuple(synchronous)
+                self._synchronous = synchronous_listeners
+            self.listeners = listeners
+        self.logger.debug("Listener unsubscribed from %s", event_type)
+        if event_type not in listeners:
+            self.logger.debug("No more listeners for %s, event type removed", event_type)
@@ -0,0 +1,153 @@
+import logging
+import threading
+import time
+from vocalai.audio_buffer import AudioBuffer
+
+
+def _normalize(text):
+    return " ".join(text.lower().split())
+
+
+class IncrementalTranscriber:
+    """
+    Transcribes a growing recording in the background so that, once the user
+    stops talking, only the not yet committed tail is left to decode.
+
+    Each pass transcribes the audio after the last committed point. A segment
+    is committed once two consecutive passes agree on it (stable prefix) and
+    it ends at least overlap_seconds before the end of the audio seen so far,
+    so a word cut off at the edge of the window is never committed. The next
+    pass starts where the last committed segment ended.
+
+    Parameters:
+        model: A loaded whisper model.
+        rate (int): Sample rate of the fed int16 audio.
+        step_seconds (float): New audio needed before another pass is run.
+        overlap_seconds (float): Audio at the end of a pass that is never
+            committed.
+        max_window_seconds (float): When the uncommitted audio reaches this,
+            all but the last segment are committed without waiting for
+            agreement, keeping each pass inside whisper's 30 second window.
+    """
+    def __init__(self, model, rate=16000, step_seconds=2.0, overlap_seconds=1.0,
+                 max_window_seconds=24.0, **transcribe_options):
+        self.logger = logging.getLogger(__name__)
+        self.model = model
+        self.rate = rate
+        self.step_samples = int(step_seconds * rate)
+        self.overlap_samples = int(overlap_seconds * rate)
+        self.max_window_samples = int(max_window_seconds * rate)
+        self.transcribe_options = transcribe_options
+
+        self.committed_segments = []
+        self.committed_sample = 0
+        self.passes = 0
+        self.post_eom_latency = None
+
+        self._audio = AudioBuffer(rate=rate)
+        self._model_lock = threading.Lock()
+        self._new_audio = threading.Condition()
+        self._previous_hypothesis = []
+        self._last_pass_end = 0
+        self._finished = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="incremental-whisper", daemon=True)
+        self._thread.start()
+        return self
+
+    def feed(self, data):
+        self._audio.write(data)
+        with self._new_audio:
+            self._new_audio.notify()
+
+    def finish(self):
+        """
+        Stops background passes, decodes the remaining tail and returns the
+        full transcript. The time this takes is the post-EOM latency.
+        """
+        start = time.monotonic()
+        with self._new_audio:
+            self._finished = True
+            self._new_audio.notify()
+        if self._thread:
+            self._thread.join()
+
+        tail_text = ""
+        if len(self._audio) > self.committed_sample:
+            tail_text = "".join(s["text"] for s in self._transcribe(self.committed_sample)["segments"])
+        text = ("".join(s["text"] for s in self.committed_segments) + tail_text).strip()
+
+        self.post_eom_latency = time.monotonic() - start
+        self.logger.info("Incremental transcription finished: %d passes, %.2fs of %.2fs committed before EOM, %.3fs post-EOM",
+                         self.passes, self.committed_sample / self.rate, self._audio.duration,
+                         self.post_eom_latency)
+        return text
+
+    def step(self):
+        """
+        Runs a pass if step_seconds of new audio arrived since the last one,
+        and returns whether it did. The thread started by start() calls it
+        whenever audio is fed; without start() the caller drives the passes.
+        """
+        if self._available() - self._last_pass_end < self.step_samples:
+            return False
+        self._pass()
+        return True
+
+    def _available(self):
+        return len(self._audio)
+
+    def _run(self):
+        while True:
+            with self._new_audio:
+                self._new_audio.wait_for(
+                    lambda: self._finished or self._available() - self._last_pass_end >= self.step_samples)
+                if self._finished:
+                    return
+            self.step()
+
+    def _pass(self):
+        self._last_pass_end = len(self._audio)
+        window_samples = self._last_pass_end - self.committed_sample
+        if window_samples <= self.overlap_samples:
+            return
+
+        segments = self._transcribe(self.committed_sample, window_samples)["segments"]
+        self.passes += 1
+        commit_limit = (window_samples - self.overlap_samples) / self.rate
+        force = window_samples >= self.max_window_samples
+
+        stable = 0
+        for index, segment in enumerate(segments):
+            if segment["end"] > commit_limit:
+                break
+            agreed = (index < len(self._previous_hypothesis)
+                      and _normalize(self._previous_hypothesis[index]["text"]) == _normalize(segment["text"]))
+            if not agreed and not (force and index < len(segments) - 1):
+                break
+            stable = index + 1
+
+        if stable:
+            self.committed_segments.extend(segments[:stable])
+            self.committed_sample += int(segments[stable - 1]["end"] * self.rate)
+            self._previous_hypothesis = []
+            self.logger.debug("Committed %d segments up to %.2fs", stable, self.committed_sample / self.rate)
+        elif not segments and force:
+            # nothing but silence, skip ahead instead of growing the window
+            self.committed_sample += window_samples - self.overlap_samples
+            self._previous_hypothesis = []
+        else:
+            self._previous_hypothesis = segments
+
+    def _transcribe(self, start, count=None):
+        options = dict(self.transcribe_options)
+        prompt = "".join(s["text"] for s in self.committed_segments[-3:]).strip()
+        if prompt:
+            options.setdefault("initial_prompt", prompt)
+        with self._model_lock:
+            audio = self._audio.as_float32(start)
+            if count is not None:
+                audio = audio[:count]
+            return self.model.transcribe(audio, **options)
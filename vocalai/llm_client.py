@@ -0,0 +1,313 @@
+import aiohttp
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Gateway errors and throttling mean the request was not processed, so it is
+# safe to send it again. Failures mid-stream are never retried because tokens
+# have already been handed to the caller.
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class LLMRequestError(Exception):
+    def __init__(self, status_code, text):
+        super().__init__(f"LLM query failed: {status_code} {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class ClientMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.connections_opened = 0
+
+    def add(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def connections_reused(self):
+        return max(0, self.requests - self.connections_opened)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+        }
+
+
+class _ClientSettings:
+    def __init__(self, url, connect_timeout=3.0, read_timeout=60.0, max_retries=2,
+                 retry_backoff=0.5, pool_size=4):
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.pool_size = pool_size
+        self.metrics = ClientMetrics()
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        return cls(config.llm_url,
+                   connect_timeout=getattr(config, "llm_connect_timeout", 3.0),
+                   read_timeout=getattr(config, "llm_read_timeout", 60.0),
+                   max_retries=getattr(config, "llm_max_retries", 2),
+                   retry_backoff=getattr(config, "llm_retry_backoff", 0.5),
+                   pool_size=getattr(config, "llm_pool_size", 4),
+                   **kwargs)
+
+    def backoff(self, attempt):
+        return self.retry_backoff * (2 ** attempt)
+
+    @staticmethod
+    def parse_line(line, logger):
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            logger.error("Error decoding JSON: %s", line)
+            return None
+
+
+# the ResponseStream whose request the current thread is sending, if any
+_sending = threading.local()
+
+
+class _TrackedConnectionMixin:
+    """
+    Hands the connection to the ResponseStream being sent on this thread,
+    so that stream can abort it from another thread.
+    """
+    def request(self, *args, **kwargs):
+        super().request(*args, **kwargs)
+        stream = getattr(_sending, "stream", None)
+        if stream is not None:
+            stream._attach(self)
+
+
+class _TrackedHTTPConnection(_TrackedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TrackedHTTPSConnection(_TrackedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TrackedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TrackedHTTPConnection
+
+
+class _TrackedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TrackedHTTPSConnection
+
+
+class ResponseStream:
+    """
+    A streaming request that one thread reads and another may cancel, e.g.
+    a speculative answer. close() shuts the connection down at once, whether
+    Ollama is still evaluating the prompt or already streaming, so Ollama
+    stops generating and frees its slot. A cancelled stream just ends.
+    """
+    def __init__(self, client, payload):
+        self._client = client
+        self._payload = payload
+        self._lock = threading.Lock()
+        self._connection = None
+        self.cancelled = False
+
+    def __iter__(self):
+        _sending.stream = self
+        try:
+            response = self._client._post(self._payload, stream=self)
+        except (requests.exceptions.RequestException, OSError):
+            if self.cancelled:
+                return
+            raise
+        finally:
+            _sending.stream = None
+        try:
+            yield from self._client._read(response)
+        except (requests.exceptions.RequestException, OSError):
+            if not self.cancelled:
+                raise
+        finally:
+            with self._lock:
+                # the connection may go back to the pool and serve someone else
+                self._connection = None
+
+    def _attach(self, connection):
+        with self._lock:
+            self._connection = connection
+            if self.cancelled:
+                self._abort()
+
+    def _abort(self):
+        sock = getattr(self._connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        with self._lock:
+            self.cancelled = True
+            self._abort()
+
+
+class LLMClient(_ClientSettings):
+    """
+    Synchronous Ollama client on a keep-alive requests.Session connection pool.
+    """
+    def __init__(self, url, **kwargs):
+        super().__init__(url, **kwargs)
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self._adapter.poolmanager.pool_classes_by_scheme = {"http": _TrackedHTTPConnectionPool,
+                                                            "https": _TrackedHTTPSConnectionPool}
+
+    def stream(self, payload):
+        """
+        Posts payload and yields each decoded NDJSON object as it arrives.
+        """
+        yield from self._read(self._post(payload))
+
+    def open_stream(self, payload):
+        """
+        Like stream(), but returns a ResponseStream that another thread can
+        cancel with close().
+        """
+        return ResponseStream(self, payload)
+
+    def _read(self, response):
+        try:
+            for line in response.iter_lines():
+                json_obj = self.parse_line(line, self.logger)
+                if json_obj is not None:
+                    # keep reading past "done" so the body is fully consumed
+                    # and the connection goes back to the pool
+                    yield json_obj
+        finally:
+            response.close()
+            self._update_connection_count()
+
+    def _post(self, payload, stream=None):
+        attempt = 0
+        while True:
+            self.metrics.add(requests=1)
+            try:
+                response = self.session.post(self.url, json=payload, stream=True,
+                                             timeout=(self.connect_timeout, self.read_timeout))
+            except requests.exceptions.ConnectionError as e:
+                # also covers ConnectTimeout
+                self._update_connection_count()
+                if attempt >= self.max_retries or (stream is not None and stream.cancelled):
+                    self.metrics.add(failures=1)
+                    raise
+                self.logger.warning("LLM connection failed (%s), retrying", e)
+            else:
+                if response.status_code == 200:
+                    return response
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    self.metrics.add(failures=1)
+                    text = response.text
+                    response.close()
+                    raise LLMRequestError(response.status_code, text)
+                self.logger.warning("LLM returned %d, retrying", response.status_code)
+                response.close()
+            self.metrics.add(retries=1)
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    def _update_connection_count(self):
+        pools = self._adapter.poolmanager.pools
+        opened = sum(pools[key].num_connections for key in pools.keys() if key in pools)
+        with self.metrics._lock:
+            self.metrics.connections_opened = opened
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncLLMClient(_ClientSettings):
+    """
+    asyncio Ollama client on a shared aiohttp connection pool. The session is
+    created lazily on first use so it binds to the running event loop.
+    """
+    def __init__(self, url, **kwargs):
+        super().__init__(url, **kwargs)
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_created)
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            timeout = aiohttp.ClientTimeout(connect=self.connect_timeout, sock_read=self.read_timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                                  trace_configs=[trace_config])
+        return self._session
+
+    async def _on_connection_created(self, session, context, params):
+        self.metrics.add(connections_opened=1)
+
+    async def stream(self, payload):
+        """
+        Posts payload and yields each decoded NDJSON object as it arrives.
+        """
+        response = await self._post(payload)
+        try:
+            async for line in response.content:
+                json_obj = self.parse_line(line.strip(), self.logger)
+                if json_obj is not None:
+                    yield json_obj
+        finally:
+            response.release()
+
+    async def _post(self, payload):
+        session = self._get_session()
+        attempt = 0
+        while True:
+            self.metrics.add(requests=1)
+            try:
+                response = await session.post(self.url, json=payload)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    self.metrics.add(failures=1)
+                    raise
+                self.logger.warning("LLM connection failed (%s), retrying", e)
+            else:
+                if response.status == 200:
+                    return response
+                text = await response.text()
+                response.release()
+                if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                    self.metrics.add(failures=1)
+                    raise LLMRequestError(response.status, text)
+                self.logger.warning("LLM returned %d, retrying", response.status)
+            self.metrics.add(retries=1)
+            await asyncio.sleep(self.backoff(attempt))
+            attempt += 1
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
@@ -1,40 +1,202 @@
-import json
 import logging
-import requests
+import re
+import threading
+import time
 import torch
 from io import StringIO
+from vocalai.conversation import Conversation
+from vocalai.llm_client import LLMClient
+from vocalai.response_cache import ResponseCache, normalize_prompt, response_cache_key
+from vocalai.speculation import Speculation, SpeculationStats, word_error_rate
+from vocalai.text_segmenter import segment_sentences
+from vocalai.tracing import get_tracer
 
 class LLMInteraction:
-    def __init__(self, config):
+    def __init__(self, config, client=None, cache=None):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.instructions = config.instructions
         self.llm_url = config.llm_url
         self.llm_model = config.llm_model
+        self.client = client or LLMClient.from_config(config)
         self.logger = logging.getLogger(__name__)
+        # one per session: reuses Ollama's context so earlier turns are not prefilled again
+        self.conversation = None
+        if getattr(config, "llm_conversation", True):
+            self.conversation = Conversation.from_config(config, summarizer=self._complete)
+        # may be shared between sessions. A cached answer ignores earlier
+        # turns, which in a conversation nearly every answer depends on, so
+        # the cache is only used for standalone prompts.
+        self.cache = None
+        if self.conversation is None:
+            self.cache = cache
+            if self.cache is None and getattr(config, "llm_cache", False):
+                self.cache = ResponseCache.from_config(config)
+        elif cache is not None or getattr(config, "llm_cache", False):
+            self.logger.info("LLM response cache disabled: it does not apply while llm_conversation is on")
+        self.speculative = getattr(config, "speculative_llm", False)
+        self.speculation_max_wer = getattr(config, "speculation_max_wer", 0.2)
+        self.speculation_stats = SpeculationStats()
+        self._speculation = None
+        self._speculation_lock = threading.Lock()
+        self._answering = threading.Event()
 
-    def query_llm(self, prompt):
-        parameters = {
-            "model": self.llm_model,
-            "prompt": self.instructions + prompt
-        }
+    def _parameters(self, prompt, provisional=False):
+        if self.conversation is None:
+            return {
+                "model": self.llm_model,
+                "prompt": self.instructions + prompt
+            }
+        return {"model": self.llm_model, **self.conversation.request(self.instructions, prompt, provisional)}
 
-        response = requests.post(self.llm_url, json=parameters)
+    def _cache_key(self, prompt):
+        """
+        The response cache key for prompt, or None without a cache.
+        """
+        if self.cache is None:
+            return None
+        return response_cache_key(self.llm_model, self.instructions, prompt)
 
-        if response.status_code == 200:
-            response_text = response.text.strip()
-            json_strings = response_text.split("\n")
-            cummulative_response = StringIO()
+    def _complete(self, prompt):
+        """
+        One-off request outside the conversation, e.g. for a summary.
+        """
+        return "".join(json_obj.get("response", "")
+                       for json_obj in self.client.stream({"model": self.llm_model, "prompt": prompt}))
 
-            for json_str in json_strings:
-                try:
-                    json_obj = json.loads(json_str)
-                    cummulative_response.write(json_obj["response"])
-                except requests.exceptions.JSONDecodeError:
-                    print("Error decoding JSON:", json_str)
+    def preload(self):
+        """
+        Asks Ollama to load the model into memory; an empty prompt loads it
+        without generating anything.
+        """
+        for _ in self.client.stream({"model": self.llm_model, "prompt": ""}):
+            pass
 
-            answer = cummulative_response.getvalue()
-            cummulative_response.close()
-            return answer
-        else:
-            raise Exception(f"LLM query failed: {response.status_code} {response.text}")
+    def speculate(self, prompt):
+        """
+        Starts answering a provisional prompt (e.g. vosk's transcript) in the
+        background. The next stream_llm call uses that answer if its prompt
+        is within speculation_max_wer of this one, and cancels it otherwise.
+        """
+        if not prompt.strip():
+            return
+        if self._answering.is_set():
+            # the previous answer is still streaming, so its context is not known yet
+            self.logger.debug("Not speculating while the previous answer is streaming")
+            return
+        key = self._cache_key(prompt)
+        if key is not None and self.cache.contains(key):
+            return
+        # built without side effects: no summary request on this thread, and
+        # nothing recorded for a speculation that may be discarded
+        parameters = self._parameters(prompt, provisional=True)
+        speculation = Speculation(prompt, self.client.open_stream(parameters), parameters)
+        with self._speculation_lock:
+            previous, self._speculation = self._speculation, speculation
+        if previous is not None:
+            previous.cancel()
 
+    def _claim_speculation(self, prompt, span):
+        with self._speculation_lock:
+            speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return None
+        head_start = time.monotonic() - speculation.started
+        error = word_error_rate(normalize_prompt(prompt), normalize_prompt(speculation.prompt))
+        stats = self.speculation_stats
+        if error <= self.speculation_max_wer and not speculation.cancelled:
+            stats.accepted += 1
+            stats.saved_seconds += head_start
+            if self.conversation is not None and self.conversation.turns and "context" not in speculation.payload:
+                self.conversation.rebuilds += 1
+            span.set(speculation="accepted", speculation_wer=error, speculation_saved=head_start)
+            self.logger.info("Speculative answer kept (WER %.2f, %.0f ms head start); %d kept, %d discarded, "
+                             "%.1fs saved", error, head_start * 1000, stats.accepted, stats.discarded,
+                             stats.saved_seconds)
+            return speculation
+        speculation.cancel()
+        stats.discarded += 1
+        stats.wasted_seconds += head_start
+        span.set(speculation="discarded", speculation_wer=error)
+        self.logger.info("Speculative answer discarded (WER %.2f: '%s' vs '%s'); %d kept, %d discarded",
+                         error, speculation.prompt, prompt, stats.accepted, stats.discarded)
+        return None
+
+    def query_llm(self, prompt, use_cache=True):
+        cummulative_response = StringIO()
+        for token in self.stream_llm(prompt, use_cache=use_cache):
+            cummulative_response.write(token)
+
+        answer = cummulative_response.getvalue()
+        cummulative_response.close()
+        return answer
+
+    def stream_llm(self, prompt, use_cache=True):
+        """
+        Yields response tokens as Ollama streams its NDJSON chunks. A cached
+        answer is replayed word by word through the same path.
+
+        Parameters:
+            prompt (str): The user prompt; instructions are prepended.
+            use_cache (bool): Look up and store the answer in the response cache.
+        """
+        # not made current: the generator may be suspended between tokens
+        span = get_tracer().start_span("llm_request", prompt_chars=len(prompt))
+        tokens = 0
+        answer = []
+        final_chunk = None
+        key = cached = None
+        if use_cache:
+            key = self._cache_key(prompt)
+        if key is not None:
+            cached = self.cache.get(key)
+        span.set(cached=cached is not None)
+        answered_prompt = prompt
+        self._answering.set()
+        try:
+            if cached is not None:
+                with self._speculation_lock:
+                    unused, self._speculation = self._speculation, None
+                if unused is not None:
+                    unused.cancel()
+                chunks = self._replay(cached)
+            else:
+                speculation = self._claim_speculation(prompt, span)
+                if speculation is not None:
+                    # the model answered the provisional prompt, so that is what the history keeps
+                    answered_prompt = speculation.prompt
+                    chunks = speculation.chunks()
+                else:
+                    chunks = self.client.stream(self._parameters(prompt))
+            for json_obj in chunks:
+                if json_obj.get("done"):
+                    final_chunk = json_obj
+                if json_obj.get("response"):
+                    if tokens == 0:
+                        span.set(time_to_first_token=time.monotonic() - span.start)
+                    tokens += 1
+                    answer.append(json_obj["response"])
+                    yield json_obj["response"]
+        finally:
+            span.set(tokens=tokens)
+            if final_chunk and "prompt_eval_count" in final_chunk:
+                span.set(prompt_eval_tokens=final_chunk["prompt_eval_count"])
+            # an interrupted answer is kept in the history, but without a context
+            if self.conversation is not None and (answer or final_chunk):
+                self.conversation.record(answered_prompt, "".join(answer), final_chunk)
+            # only complete answers are cached
+            if key is not None and cached is None and final_chunk and answer:
+                self.cache.put(key, prompt, "".join(answer))
+            self._answering.clear()
+            span.end()
+
+    @staticmethod
+    def _replay(answer):
+        for token in re.findall(r"\s*\S+|\s+$", answer):
+            yield {"response": token, "done": False}
+        yield {"response": "", "done": True}
+
+    def stream_sentences(self, prompt):
+        """
+        Yields speakable sentences while the model is still generating.
+        """
+        return segment_sentences(self.stream_llm(prompt))
@@ -1,21 +1,174 @@
 import logging
 import logging.handlers
+import queue
+import threading
+import time
 
-def setup_logging(level=logging.DEBUG):
+_listener = None
+
+# Loggers with call sites that run per audio chunk or per event
+RATE_LIMITED_LOGGERS = (
+    "vocalai.event_manager",
+    "vocalai.speech_recognition",
+    "vocalai.audio_player",
+    "vocalai.incremental_transcriber",
+)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a bounded queue without ever blocking the caller. When
+    the queue is full (the listener is stuck behind a slow handler) the record
+    is dropped and counted instead. Once there is room again a warning
+    reporting how many records were lost is queued after the next record, and
+    shutdown_logging() reports the total.
+
+    As in QueueHandler, the message is merged with its arguments on the
+    calling thread, so arguments changed after the call cannot alter it.
+    """
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._unreported = 0
+
+    def enqueue(self, record):
+        # Handler.handle holds the handler's lock, so the counters need no other
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+            return
+        if self._unreported:
+            try:
+                self.queue.put_nowait(_dropped_record(self._unreported, "log queue was full"))
+                self._unreported = 0
+            except queue.Full:
+                pass
+
+
+def _dropped_record(count, reason):
+    return logging.makeLogRecord({"name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                                  "msg": "%d log records dropped (%s)", "args": (count, reason)})
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `burst` DEBUG/INFO records per call site through every
+    `interval` seconds. The next record let through from a throttled call
+    site reports how many were suppressed. Warnings and errors always pass.
+
+    Parameters:
+        interval (float): Length of the window in seconds.
+        burst (int): Records allowed per call site per window.
+    """
+    def __init__(self, interval=1.0, burst=10):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._sites = {}  # (logger, file, line) -> [window start, count, suppressed]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        site = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or now - state[0] >= self.interval:
+                suppressed = state[2] if state else 0
+                self._sites[site] = [now, 1, 0]
+            elif state[1] < self.burst:
+                state[1] += 1
+                suppressed = 0
+            else:
+                state[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+def _level(level):
+    if isinstance(level, str):
+        return logging.getLevelName(level.upper())
+    return level
+
+
+def setup_logging(level=logging.DEBUG, queue_size=10000, rate_limit_interval=1.0, rate_limit_burst=10,
+                  syslog_address='/dev/log', rate_limited_loggers=RATE_LIMITED_LOGGERS):
+    """
+    Routes all logging through a bounded queue to a background listener that
+    writes to syslog and the console, so a slow syslog daemon cannot stall the
+    audio threads. Returns the root logger's queue handler.
+
+    Parameters:
+        level (int or str): Root log level, e.g. "INFO".
+        queue_size (int): Records buffered before new ones are dropped.
+        rate_limit_interval (float): See RateLimitFilter; 0 disables it.
+        rate_limit_burst (int): See RateLimitFilter.
+        syslog_address (str): Syslog socket, or None to skip syslog.
+        rate_limited_loggers (tuple): Names of the loggers RateLimitFilter is
+            applied to; everything else is logged in full.
+    """
+    global _listener
     # Root logger
     logger = logging.getLogger()
-    logger.setLevel(level)
+    logger.setLevel(_level(level))
+
+    queue_handlers = [h for h in logger.handlers if isinstance(h, DroppingQueueHandler)]
+    if queue_handlers:
+        return queue_handlers[0]
+    if logger.handlers:
+        return None
 
-    if not logger.handlers:
+    handlers = []
+    if syslog_address:
         # Syslog Handler
-        syslog_handler = logging.handlers.SysLogHandler(address='/dev/log')
+        syslog_handler = logging.handlers.SysLogHandler(address=syslog_address)
         syslog_formatter = logging.Formatter('%(name)s: [%(levelname)s] %(message)s')
         syslog_handler.setFormatter(syslog_formatter)
-        logger.addHandler(syslog_handler)
+        handlers.append(syslog_handler)
+
+    # Console Handler
+    console_handler = logging.StreamHandler()
+    console_formatter = logging.Formatter('%(asctime)s - %(name)s - [%(levelname)s] %(message)s')
+    console_handler.setFormatter(console_formatter)
+    handlers.append(console_handler)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    if rate_limit_interval:
+        rate_filter = RateLimitFilter(rate_limit_interval, rate_limit_burst)
+        for name in rate_limited_loggers:
+            logging.getLogger(name).addFilter(rate_filter)
+    logger.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return queue_handler
+
+
+def setup_logging_from_config(config):
+    return setup_logging(level=getattr(config, "log_level", "INFO"),
+                         queue_size=getattr(config, "log_queue_size", 10000),
+                         rate_limit_interval=getattr(config, "log_rate_limit_interval", 1.0),
+                         rate_limit_burst=getattr(config, "log_rate_limit_burst", 10),
+                         rate_limited_loggers=tuple(getattr(config, "log_rate_limited_loggers", RATE_LIMITED_LOGGERS)))
 
-        # Console Handler
-        console_handler = logging.StreamHandler()
-        console_formatter = logging.Formatter('%(asctime)s - %(name)s - [%(levelname)s] %(message)s')
-        console_handler.setFormatter(console_formatter)
-        logger.addHandler(console_handler)
 
+def shutdown_logging():
+    """
+    Flushes queued records and stops the listener thread, then reports how
+    many records were dropped over the whole run, if any.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        queue_handlers = [h for h in logging.getLogger().handlers if isinstance(h, DroppingQueueHandler)]
+        dropped = sum(handler.dropped for handler in queue_handlers)
+        if dropped:
+            record = _dropped_record(dropped, "total since start")
+            for handler in _listener.handlers:
+                handler.handle(record)
+        _listener = None
@@ -0,0 +1,125 @@
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class OllamaStubServer:
+    """
+    Minimal local stand-in for Ollama's /api/generate endpoint, streaming canned
+    NDJSON with chunked transfer encoding over keep-alive connections.
+
+    Parameters:
+        tokens (list): Response tokens to stream, one NDJSON line each.
+        token_delay (float): Seconds to sleep before each token.
+        prefill_delay (float): Seconds to sleep before the response headers,
+            like Ollama evaluating a long prompt.
+        fail_first (int): Number of requests to answer with fail_status first.
+        fail_status (int): Status code used for the failing requests.
+        responder (callable): Optional function taking the request payload and
+            returning the token list, overriding tokens.
+    """
+    def __init__(self, tokens=None, token_delay=0.0, fail_first=0, fail_status=503,
+                 responder=None, host="127.0.0.1", port=0, prefill_delay=0.0):
+        self.logger = logging.getLogger(__name__)
+        self.tokens = tokens if tokens is not None else ["Hello", " there."]
+        self.token_delay = token_delay
+        self.prefill_delay = prefill_delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.responder = responder
+        self.requests = []
+        self.client_ports = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def final_chunk(self, payload, tokens):
+        """
+        Builds the closing NDJSON object. Override to add fields like context.
+        """
+        return {"model": payload.get("model"), "response": "", "done": True,
+                "eval_count": len(tokens)}
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                stub.logger.debug(format, *args)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    stub.requests.append(payload)
+                    stub.client_ports.append(self.client_address[1])
+                    failing = stub.fail_first > 0
+                    if failing:
+                        stub.fail_first -= 1
+
+                if self.path != "/api/generate":
+                    self._send_plain(404, b"not found")
+                    return
+                if failing:
+                    self._send_plain(stub.fail_status, b"stub failure")
+                    return
+
+                tokens = stub.responder(payload) if stub.responder else stub.tokens
+                if stub.prefill_delay:
+                    time.sleep(stub.prefill_delay)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        if stub.token_delay:
+                            time.sleep(stub.token_delay)
+                        self._write_chunk({"model": payload.get("model"), "response": token, "done": False})
+                    self._write_chunk(stub.final_chunk(payload, tokens))
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    stub.logger.debug("client went away mid-stream")
+                    self.close_connection = True
+
+            def _write_chunk(self, obj):
+                line = json.dumps(obj).encode() + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+            def _send_plain(self, status, body):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
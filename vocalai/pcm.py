@@ -0,0 +1,58 @@
+import wave
+import numpy as np
+
+
+class PCMBuffer:
+    """
+    Raw interleaved PCM samples plus the format needed to play them.
+    """
+    def __init__(self, data, channels=1, sample_width=2, sample_rate=48000):
+        self.data = data
+        self.channels = channels
+        self.sample_width = sample_width
+        self.sample_rate = sample_rate
+
+    @property
+    def duration(self):
+        return len(self.data) / float(self.channels * self.sample_width * self.sample_rate)
+
+    @classmethod
+    def from_float(cls, samples, sample_rate, channels=1):
+        """
+        Converts float samples in [-1, 1] (a list, numpy array or tensor) to
+        16-bit PCM in a single vectorized step. Out of range samples are
+        clipped rather than wrapped. Float32 arrays are clipped in place.
+        """
+        if hasattr(samples, "detach"):
+            samples = samples.detach().cpu().numpy()
+        samples = np.asarray(samples, dtype=np.float32)
+        if not samples.flags.writeable:
+            samples = samples.copy()
+        np.clip(samples, -1.0, 1.0, out=samples)
+        pcm = np.empty(samples.shape, dtype=np.int16)
+        np.multiply(samples, 32767, out=pcm, casting="unsafe")
+        # a byte view of the int16 array, so the samples are never copied again
+        return cls(memoryview(pcm).cast("B"), channels=channels, sample_width=2, sample_rate=sample_rate)
+
+    @classmethod
+    def from_wave(cls, wave_file):
+        """
+        Reads a WAV file path or file-like object into a PCMBuffer.
+        """
+        if hasattr(wave_file, "seek"):
+            wave_file.seek(0)
+        with wave.open(wave_file, 'rb') as wav:
+            return cls(wav.readframes(wav.getnframes()),
+                       channels=wav.getnchannels(),
+                       sample_width=wav.getsampwidth(),
+                       sample_rate=wav.getframerate())
+
+    def to_wave(self, wave_file):
+        """
+        Writes the samples to a WAV file path or file-like object.
+        """
+        with wave.open(wave_file, 'wb') as wav:
+            wav.setnchannels(self.channels)
+            wav.setsampwidth(self.sample_width)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(self.data)
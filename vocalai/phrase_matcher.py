@@ -0,0 +1,119 @@
+import re
+from collections import deque
+
+_WORD = re.compile(r"[\w']+")
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over words rather than characters, built once from
+    the command phrases. Stepping one word costs O(1) amortized regardless of
+    how much has been said before.
+
+    Parameters:
+        phrases (dict): Maps a name (e.g. "eom") to the phrase that triggers it.
+    """
+    def __init__(self, phrases):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        for name, phrase in phrases.items():
+            words = tokenize(phrase)
+            if not words:
+                continue
+            state = 0
+            for word in words:
+                if word not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                    self.goto[state][word] = len(self.goto) - 1
+                state = self.goto[state][word]
+            self.output[state].add(name)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and word not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(word, 0) if state else 0
+                self.output[child] |= self.output[self.fail[child]]
+
+    def step(self, state, word):
+        """
+        Advances the automaton by one word. Returns (new_state, matched_names).
+        """
+        while state and word not in self.goto[state]:
+            state = self.fail[state]
+        state = self.goto[state].get(word, 0)
+        return state, self.output[state]
+
+    def find(self, text):
+        """
+        Returns the names of all phrases occurring in text.
+        """
+        state = 0
+        found = set()
+        for word in tokenize(text):
+            state, matches = self.step(state, word)
+            found |= matches
+        return found
+
+    def stream(self):
+        return PhraseStream(self)
+
+
+class PhraseStream:
+    """
+    Feeds a recognizer's partial and final hypotheses through a PhraseMatcher,
+    only stepping over words it has not consumed yet. A phrase fires from the
+    partial hypothesis as soon as it is heard and does not fire again when the
+    final result for the same utterance arrives.
+    """
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self._utterance_start_state = 0
+        self._words = []
+        self._states = []  # automaton state after each word of the utterance
+        self._fired = set()  # (word index, name) already reported this utterance
+
+    def feed_partial(self, text):
+        return self._consume(tokenize(text))
+
+    def feed_final(self, text):
+        matches = self._consume(tokenize(text))
+        if self._states:
+            self._utterance_start_state = self._states[-1]
+        self._words = []
+        self._states = []
+        self._fired = set()
+        return matches
+
+    def _consume(self, words):
+        # Reuse the prefix the recognizer did not revise, rescan from there
+        common = 0
+        limit = min(len(words), len(self._words))
+        while common < limit and words[common] == self._words[common]:
+            common += 1
+        del self._states[common:]
+        self._words = words
+
+        state = self._states[-1] if self._states else self._utterance_start_state
+        matches = set()
+        for index in range(common, len(words)):
+            state, names = self.matcher.step(state, words[index])
+            self._states.append(state)
+            for name in names:
+                if (index, name) not in self._fired:
+                    self._fired.add((index, name))
+                    matches.add(name)
+        return matches
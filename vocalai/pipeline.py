@@ -0,0 +1,349 @@
+import logging
+import queue
+import threading
+import time
+import types
+from vocalai.tracing import annotate, get_tracer
+
+
+class StageStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.items_in = 0
+        self.items_out = 0
+        self.dropped = 0
+        self.wait_time = 0.0  # idle, waiting for input
+        self.busy_time = 0.0  # running the stage function
+        self.blocked_time = 0.0  # waiting for room in the downstream queue
+        self.max_queue_depth = 0
+
+    def add(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def observe_depth(self, depth):
+        with self._lock:
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+
+
+class Stage:
+    """
+    One worker thread wrapped around a callable.
+
+    Parameters:
+        name (str): Name used in logs and stats.
+        func (callable): For the first stage, called with no arguments in a
+            loop to produce items; it returns None when it has nothing, and
+            stops the pipeline once it never will again. For later stages, called with one item. It
+            may return a single item, None to drop the item, or a generator
+            to emit several items downstream as they are produced.
+        maxsize (int): Bound of the stage's input queue.
+        flushable (bool): Whether flush() discards this stage's pending work.
+        combine (callable): Optional; called as combine(item, next_item) with
+            items of the same turn that are already queued when the stage
+            picks up work, returning one merged item or None to stop merging.
+            Lets a stage batch whatever piled up while it was busy without
+            ever waiting for more.
+    """
+    def __init__(self, name, func, maxsize=4, flushable=False, combine=None):
+        self.name = name
+        self.func = func
+        self.flushable = flushable
+        self.combine = combine
+        self.carry = None  # queued entry that could not be merged, taken next
+        self.failures = 0  # consecutive calls that raised
+        self.input = queue.Queue(maxsize=maxsize)
+        self.stats = StageStats()
+        self.thread = None
+
+
+class Pipeline:
+    """
+    Runs stages concurrently, connected by bounded queues, so every stage can
+    work on its next item while the downstream stages are still busy.
+
+    A stage whose function keeps raising waits before its next call, from
+    poll_interval doubling up to max_error_backoff, so a broken input device
+    does not turn into a busy loop.
+
+    Every item produced by the first stage starts a trace that travels with it
+    and everything derived from it; each stage call is recorded as a span of
+    that trace and is the current span while the stage function runs.
+    """
+    def __init__(self, poll_interval=0.1, tracer=None, max_error_backoff=5.0):
+        self.logger = logging.getLogger(__name__)
+        self.tracer = tracer or get_tracer()
+        self.stages = []
+        self.poll_interval = poll_interval
+        self.max_error_backoff = max_error_backoff
+        self._stop_event = threading.Event()
+        self._generation = 0
+        self._local = threading.local()
+
+    def add_stage(self, name, func, maxsize=4, flushable=False, combine=None):
+        stage = Stage(name, func, maxsize=maxsize, flushable=flushable, combine=combine)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        if not self.stages:
+            raise ValueError("Pipeline has no stages")
+        self._stop_event.clear()
+        for index, stage in enumerate(self.stages):
+            target = self._run_source if index == 0 else self._run_stage
+            stage.thread = threading.Thread(target=target, args=(index,), name=f"pipeline-{stage.name}", daemon=True)
+            stage.thread.start()
+        self.logger.debug("Pipeline started with stages: %s", [stage.name for stage in self.stages])
+
+    def stop(self, data=None):
+        """
+        Signals every worker to finish. Safe to call from any thread, including
+        from inside a stage or an event listener.
+        """
+        if not self._stop_event.is_set():
+            self.logger.info("Pipeline stop requested")
+            self._stop_event.set()
+
+    def is_running(self):
+        return not self._stop_event.is_set()
+
+    def join(self, timeout=None):
+        self._stop_event.wait(timeout)
+        for stage in self.stages:
+            if stage.thread and stage.thread is not threading.current_thread():
+                stage.thread.join(timeout=1)
+
+    def flush(self, data=None):
+        """
+        Discards queued and in-flight work in flushable stages, e.g. the rest of
+        an answer after the user barged in.
+        """
+        self._generation += 1
+        for stage in self.stages:
+            if not stage.flushable:
+                continue
+            dropped = 0
+            while True:
+                try:
+                    stage.input.get_nowait()
+                    dropped += 1
+                except queue.Empty:
+                    break
+            stage.stats.add(dropped=dropped)
+        self.logger.debug("Pipeline flushed, generation is now %d", self._generation)
+
+    def current_item_is_stale(self):
+        """
+        Lets a long-running stage function check, from its worker thread,
+        whether the item it is working on was flushed in the meantime.
+        """
+        generation = getattr(self._local, "generation", self._generation)
+        return self._stop_event.is_set() or generation != self._generation
+
+    def stats(self):
+        """
+        Returns a dict of per-stage counters, keyed by stage name.
+        """
+        return {
+            stage.name: {
+                "queue_depth": stage.input.qsize(),
+                "max_queue_depth": stage.stats.max_queue_depth,
+                "items_in": stage.stats.items_in,
+                "items_out": stage.stats.items_out,
+                "dropped": stage.stats.dropped,
+                "wait_time": stage.stats.wait_time,
+                "busy_time": stage.stats.busy_time,
+                "blocked_time": stage.stats.blocked_time,
+            }
+            for stage in self.stages
+        }
+
+    def log_stats(self):
+        for name, counters in self.stats().items():
+            self.logger.info(
+                "stage %s: in=%d out=%d dropped=%d depth=%d max_depth=%d wait=%.3fs busy=%.3fs blocked=%.3fs",
+                name, counters["items_in"], counters["items_out"], counters["dropped"],
+                counters["queue_depth"], counters["max_queue_depth"], counters["wait_time"],
+                counters["busy_time"], counters["blocked_time"])
+
+    def _run_source(self, index):
+        stage = self.stages[index]
+        while not self._stop_event.is_set():
+            trace = self.tracer.start_trace()
+            start = time.monotonic()
+            with self.tracer.span(stage.name, parent=trace) as span:
+                try:
+                    result = stage.func()
+                except Exception as e:
+                    span.error = str(e)
+                    self.logger.error(f"Stage '{stage.name}' failed: {str(e)}")
+                    stage.failures += 1
+                    result = None
+                else:
+                    stage.failures = 0
+                finally:
+                    stage.stats.add(busy_time=time.monotonic() - start)
+            self._emit(index, self._generation, trace, result)
+            self._back_off(stage)
+
+    def _run_stage(self, index):
+        stage = self.stages[index]
+        while not self._stop_event.is_set():
+            wait_start = time.monotonic()
+            try:
+                if stage.carry is not None:
+                    (generation, trace, item), stage.carry = stage.carry, None
+                else:
+                    generation, trace, item = stage.input.get(timeout=self.poll_interval)
+            except queue.Empty:
+                stage.stats.add(wait_time=time.monotonic() - wait_start)
+                continue
+            stage.stats.add(wait_time=time.monotonic() - wait_start, items_in=1)
+
+            if stage.flushable and generation != self._generation:
+                stage.stats.add(dropped=1)
+                continue
+            if stage.combine is not None:
+                item = self._combine_queued(stage, generation, trace, item)
+            if not stage.flushable:
+                generation = self._generation
+
+            self._local.generation = generation
+            with self.tracer.span(stage.name, parent=trace) as span:
+                start = time.monotonic()
+                try:
+                    result = stage.func(item)
+                except Exception as e:
+                    span.error = str(e)
+                    self.logger.error(f"Stage '{stage.name}' failed: {str(e)}")
+                    stage.failures += 1
+                    result = None
+                else:
+                    stage.failures = 0
+                finally:
+                    stage.stats.add(busy_time=time.monotonic() - start)
+                # generators run inside the span, so it covers every item they yield
+                self._emit(index, generation, trace, result)
+            self._back_off(stage)
+
+    def _back_off(self, stage):
+        """
+        Waits after a failed call, longer the more calls in a row failed.
+        """
+        if stage.failures:
+            delay = min(self.poll_interval * 2 ** (stage.failures - 1), self.max_error_backoff)
+            self._stop_event.wait(delay)
+
+    @staticmethod
+    def _combine_queued(stage, generation, trace, item):
+        while True:
+            try:
+                queued = stage.input.get_nowait()
+            except queue.Empty:
+                return item
+            queued_generation, queued_trace, queued_item = queued
+            combined = None
+            if queued_generation == generation and queued_trace is trace:
+                combined = stage.combine(item, queued_item)
+            if combined is None:
+                stage.carry = queued
+                return item
+            stage.stats.add(items_in=1)
+            item = combined
+
+    def _emit(self, index, generation, trace, result):
+        if result is None:
+            return
+        if isinstance(result, types.GeneratorType):
+            stage = self.stages[index]
+            emitted = 0
+            try:
+                while True:
+                    start = time.monotonic()
+                    try:
+                        item = next(result)
+                    except StopIteration:
+                        break
+                    finally:
+                        stage.stats.add(busy_time=time.monotonic() - start)
+                    if self._is_stale(index, generation):
+                        stage.stats.add(dropped=1)
+                        break
+                    self._put(index, generation, trace, item)
+                    emitted += 1
+            finally:
+                result.close()
+                annotate(items=emitted)
+        else:
+            self._put(index, generation, trace, result)
+
+    def _is_stale(self, index, generation):
+        return self._stop_event.is_set() or (self.stages[index].flushable and generation != self._generation)
+
+    def _put(self, index, generation, trace, item):
+        stage = self.stages[index]
+        stage.stats.add(items_out=1)
+        if index + 1 >= len(self.stages):
+            return
+        downstream = self.stages[index + 1]
+        start = time.monotonic()
+        while not self._is_stale(index, generation):
+            try:
+                downstream.input.put((generation, trace, item), timeout=self.poll_interval)
+                break
+            except queue.Full:
+                continue
+        stage.stats.add(blocked_time=time.monotonic() - start)
+        downstream.stats.observe_depth(downstream.input.qsize())
+
+
+def build_pipeline(speech_recognizer, llm_interaction, tts_handler, audio_player):
+    """
+    Wires the voice loop: capture -> transcribe -> clean -> llm -> tts -> play.
+    Used by main.py for the local microphone and by the server per session.
+    """
+    pipeline = Pipeline()
+
+    def listen():
+        if speech_recognizer.end_session_flag:
+            # nothing more will be heard; end_session's own subscriber may
+            # not have run yet, and until it does listen would spin
+            pipeline.stop()
+            return None
+        return speech_recognizer.listen()
+
+    def transcribe(audio_buffer):
+        fast_transcript = getattr(audio_buffer, "fast_transcript", "")
+        if fast_transcript and getattr(llm_interaction, "speculative", False):
+            # let the LLM start on vosk's transcript while whisper runs
+            llm_interaction.speculate(speech_recognizer.remove_command_words(fast_transcript))
+        return speech_recognizer.transcribe(audio_buffer)
+
+    def play(audio_response):
+        if pipeline.current_item_is_stale():
+            return
+        audio_player.enqueue(audio_response)
+        if pipeline.current_item_is_stale():
+            # flushed and stopped between the check and the enqueue; nothing
+            # queued since the flush is current, so the player can drop it all
+            audio_player.flush()
+
+    def combine_sentences(text, sentence):
+        if len(text) + 1 + len(sentence) > tts_handler.batch_chars:
+            return None
+        return text + " " + sentence
+
+    # on CPU the per-call overhead dominates, so TTS synthesizes the sentences
+    # that arrived while it was busy in one pass; it never waits for more, so
+    # the first sentence still goes out alone as soon as it is complete
+    combine = combine_sentences if getattr(tts_handler, "device", "cuda") == "cpu" else None
+
+    pipeline.add_stage("capture", listen)
+    pipeline.add_stage("transcribe", transcribe)
+    pipeline.add_stage("clean", speech_recognizer.remove_command_words)
+    pipeline.add_stage("llm", llm_interaction.stream_sentences, flushable=True)
+    pipeline.add_stage("tts", tts_handler.get_audio, flushable=True, combine=combine)
+    pipeline.add_stage("play", play, maxsize=2, flushable=True)
+    return pipeline
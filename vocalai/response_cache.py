@@ -0,0 +1,168 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Whisper's annotations for non-speech, e.g. "[BLANK_AUDIO]", "(music)", "♪"
+WHISPER_ARTIFACTS = re.compile(r"\[[^\]]*\]|\([^)]*\)|[♪♫]")
+FILLER_WORDS = {"um", "umm", "uh", "uhh", "uhm", "er", "erm", "ah", "hmm", "hm", "mm", "mhm"}
+
+
+def normalize_prompt(prompt):
+    """
+    Reduces a spoken prompt to what matters for its answer: lower case,
+    without punctuation, filler words or whisper's non-speech annotations.
+    "Um, what's the weather?" and "what's the weather" normalize the same.
+    """
+    text = WHISPER_ARTIFACTS.sub(" ", unicodedata.normalize("NFKC", prompt)).lower()
+    text = text.replace("'", "").replace("’", "")
+    words = re.findall(r"\w+", text)
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+
+def response_cache_key(model, instructions, prompt):
+    digest = hashlib.sha256()
+    for part in (model, instructions, normalize_prompt(prompt)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class ResponseCache:
+    """
+    LRU cache of complete LLM answers with a time to live, optionally
+    persisted to a JSON file so it survives restarts. Each entry counts its
+    hits.
+
+    Parameters:
+        max_entries (int): Entries kept; the least recently used go first.
+        ttl_seconds (float): Age after which an entry is no longer served,
+            or None to keep entries until evicted.
+        path (str): JSON file the cache is loaded from and saved to, or None
+            to keep it in memory only.
+    """
+    def __init__(self, max_entries=256, ttl_seconds=3600.0, path=None):
+        self.logger = logging.getLogger(__name__)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = os.path.expanduser(path) if path else None
+        self.stats = ResponseCacheStats()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> {"prompt", "response", "created", "hits"}
+        if self.path:
+            self._load()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(max_entries=getattr(config, "llm_cache_entries", 256),
+                   ttl_seconds=getattr(config, "llm_cache_ttl", 3600.0),
+                   path=getattr(config, "llm_cache_path", None))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def contains(self, key):
+        """
+        Whether key would be served, without counting a lookup.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._expired(entry)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                self.stats.expirations += 1
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry["hits"] += 1
+            self.stats.hits += 1
+            return entry["response"]
+
+    def put(self, key, prompt, response):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {"prompt": normalize_prompt(prompt), "response": response,
+                                  "created": time.time(), "hits": 0}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+            self._save()
+
+    def entries(self):
+        """
+        Returns (normalized prompt, hits) for every entry, most used first.
+        """
+        with self._lock:
+            return sorted(((entry["prompt"], entry["hits"]) for entry in self._entries.values()),
+                          key=lambda item: -item[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+    def _expired(self, entry):
+        return self.ttl_seconds is not None and time.time() - entry["created"] > self.ttl_seconds
+
+    def _load(self):
+        try:
+            with open(self.path) as file:
+                stored = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.logger.warning("Ignoring unreadable LLM response cache %s: %s", self.path, e)
+            return
+        for key, entry in stored:
+            if not self._expired(entry):
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.logger.debug("Loaded %d cached LLM responses from %s", len(self._entries), self.path)
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as file:
+                json.dump(list(self._entries.items()), file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning("Failed to save LLM response cache: %s", e)
@@ -0,0 +1,415 @@
+"""
+Serves the voice loop to several clients at once over websockets.
+
+Protocol, per connection:
+    client -> server: binary messages of 16 kHz 16-bit mono PCM, and a JSON
+        text message {"type": "end"} to finish the session.
+    server -> client: {"type": "ready", "session": id}, then the reply audio
+        as {"type": "audio", "sample_rate": ..., "channels": ..., "bytes": ...}
+        messages, each followed by one binary message of 16-bit PCM, sent
+        slightly ahead of real time for the client to play back to back,
+        {"type": "stop"} when the client should cut playback short (barge-in),
+        and {"type": "stats", ...} when the session ends. The server closes
+        the connection after the stats when the user says the end session
+        phrase.
+
+Models are loaded once and shared: every session gets its own vosk
+recognizer, recording state, event manager, pipeline and LLM context, while
+whisper and TTS inference run one call at a time.
+
+Usage: python3 -m vocalai.server [config.json]
+"""
+import asyncio
+import itertools
+import json
+import logging
+import sys
+import threading
+import time
+import websockets
+from vocalai.audio_player import AudioPlayer
+from vocalai.audio_source import PushSource
+from vocalai.batch_transcriber import BatchTranscriber
+from vocalai.event_manager import EventManager
+from vocalai.llm_client import LLMClient
+from vocalai.llm_interaction import LLMInteraction
+from vocalai.pipeline import build_pipeline
+from vocalai.response_cache import ResponseCache
+from vocalai.speech_recognition import SpeechRecognizer
+from vocalai.startup import StartupOrchestrator
+from vocalai.util import load_config, AppConfig
+
+# websockets close code for "try again later"
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+class _Serialized:
+    """
+    Proxies a model so the named methods run one call at a time across all
+    sessions; other attributes pass straight through.
+    """
+    def __init__(self, target, *methods):
+        self._target = target
+        self._methods = methods
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if name not in self._methods:
+            return attribute
+
+        def serialized(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return serialized
+
+
+class SharedModels:
+    """
+    The models every session shares.
+
+    Parameters:
+        recognizer_factory (callable): Called with a sample rate, returns a
+            new vosk KaldiRecognizer (or equivalent) for one session.
+        whisper_model: Object with transcribe(audio, **options).
+        tts_handler: TTSHandler or equivalent with get_audio(text).
+        llm_client (LLMClient): HTTP client shared by all sessions.
+        whisper_batch_window (float): If set, utterances from different
+            sessions arriving within this many seconds are transcribed in
+            one batch (see BatchTranscriber) instead of one after another.
+        whisper_max_batch (int): Largest whisper batch.
+        response_cache (ResponseCache): LLM answers shared by all sessions,
+            or None. Only answers that do not depend on a conversation's
+            history are stored, so sessions cannot see each other's turns.
+    """
+    def __init__(self, recognizer_factory, whisper_model, tts_handler, llm_client, whisper_batch_window=None,
+                 whisper_max_batch=8, response_cache=None):
+        self.recognizer_factory = recognizer_factory
+        self.response_cache = response_cache
+        if whisper_batch_window is not None:
+            self.whisper_model = BatchTranscriber(whisper_model, whisper_batch_window, whisper_max_batch).start()
+        else:
+            self.whisper_model = _Serialized(whisper_model, "transcribe")
+        self.tts_handler = _Serialized(tts_handler, "get_audio")
+        self.llm_client = llm_client
+
+    def close(self):
+        """
+        Stops the whisper batch scheduler, failing any transcription still
+        queued, and closes the LLM connections.
+        """
+        if isinstance(self.whisper_model, BatchTranscriber):
+            self.whisper_model.stop()
+        self.llm_client.close()
+
+    @classmethod
+    def load(cls, config):
+        import whisper
+        from vocalai.tts_handler import TTSHandler
+        from vosk import Model, KaldiRecognizer, SetLogLevel
+        SetLogLevel(-1)
+        startup = StartupOrchestrator()
+        startup.add("vosk", lambda: Model(config.vosk_model_path), imports=("vosk",))
+        startup.add("whisper", lambda: whisper.load_model(config.whisper_model_name), imports=("whisper",))
+        startup.add("tts", lambda: TTSHandler(config), TTSHandler.warm_up, imports=("TTS.api",))
+        models = startup.run()
+        startup.write_report(getattr(config, "startup_report_path", "startup_times.jsonl"))
+        vosk_model = models["vosk"]
+
+        def new_recognizer(rate):
+            recognizer = KaldiRecognizer(vosk_model, rate)
+            recognizer.SetWords(True)
+            return recognizer
+        return cls(new_recognizer, models["whisper"], models["tts"], LLMClient.from_config(config),
+                   whisper_batch_window=getattr(config, "whisper_batch_window", None),
+                   whisper_max_batch=getattr(config, "whisper_max_batch", 8),
+                   response_cache=ResponseCache.from_config(config)
+                   if getattr(config, "llm_cache", False) and not getattr(config, "llm_conversation", True) else None)
+
+
+class _ClientStream:
+    """
+    Output stream to the session's client. Audio is sent up to lead_seconds
+    before the client needs it, so its playback never runs dry between
+    buffers; the audio counts as pending until the client has played it.
+    """
+    def __init__(self, session, lead_seconds):
+        self.session = session
+        self.lead_seconds = lead_seconds
+        self.ends_at = time.monotonic()
+
+    def write(self, pcm):
+        self.session.send({"type": "audio", "sample_rate": pcm.sample_rate, "channels": pcm.channels,
+                           "bytes": len(pcm.data)})
+        self.session.send(bytes(pcm.data))
+        self.session.bytes_out += len(pcm.data)
+        self.session.audio_seconds_out += pcm.duration
+        self.ends_at = max(self.ends_at, time.monotonic()) + pcm.duration
+        time.sleep(max(0.0, self.ends_at - time.monotonic() - self.lead_seconds))
+
+    def pending(self):
+        return max(0.0, self.ends_at - time.monotonic())
+
+    def stop(self):
+        if self.pending() > 0:
+            self.session.send({"type": "stop"})
+        self.ends_at = time.monotonic()
+
+    def close(self):
+        pass
+
+
+class ClientBackend:
+    """
+    AudioPlayer backend that streams the audio to the session's client.
+    """
+    def __init__(self, session, lead_seconds=0.2):
+        self.session = session
+        self.lead_seconds = lead_seconds
+
+    def open_stream(self, pcm):
+        return _ClientStream(self.session, self.lead_seconds)
+
+
+class Session:
+    """
+    One client's voice loop on top of the shared models.
+
+    Parameters:
+        session_id (int): Identifier used in logs and stats.
+        config (AppConfig): Application config.
+        models (SharedModels): Models shared with the other sessions.
+        send (callable): Thread-safe; queues a dict (sent as JSON) or bytes
+            for the client.
+        rate (int): Sample rate of the audio the client sends.
+    """
+    def __init__(self, session_id, config, models, send, rate=16000, chunk=1024):
+        self.logger = logging.getLogger(__name__)
+        self.config = config
+        self.session_id = session_id
+        self.send = send
+        self.rate = rate
+        self.started_at = time.monotonic()
+        self.ended_at = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.audio_seconds_out = 0.0
+
+        self.event_manager = EventManager.create_local()
+        self.source = PushSource(rate, chunk, getattr(config, "audio_queue_seconds", 10.0)).start()
+        # vosk's model is shared; only the recognizer state is per session
+        self.speech_recognizer = SpeechRecognizer(config, rate, chunk, stream=self.source, session=True,
+                                                  event_manager=self.event_manager,
+                                                  recognizer=models.recognizer_factory(rate),
+                                                  whisper_model=models.whisper_model)
+        self.llm_interaction = LLMInteraction(config, client=models.llm_client, cache=models.response_cache)
+        self.audio_player = AudioPlayer(backend=ClientBackend(self), event_manager=self.event_manager)
+        self.pipeline = build_pipeline(self.speech_recognizer, self.llm_interaction, models.tts_handler,
+                                       self.audio_player)
+        # flush before the player stops, so the play stage cannot queue a
+        # stale sentence in between
+        self.event_manager.subscribe("stop_audio", self.pipeline.flush, synchronous=True, first=True)
+        self.event_manager.subscribe("end_session", self.pipeline.stop)
+
+    def start(self):
+        if getattr(self.config, "event_dispatch", "sync") == "async":
+            self.event_manager.start_dispatcher()
+        self.pipeline.start()
+        self.logger.info("Session %d started", self.session_id)
+
+    def feed(self, data):
+        self.bytes_in += len(data)
+        self.source.feed(data)
+
+    def close(self, timeout=5.0):
+        """
+        Ends the input and stops the session, dropping any reply still in
+        progress. Blocks, so call it off the event loop.
+        """
+        self.source.end()
+        self.pipeline.stop()
+        self.pipeline.join(timeout)
+        self.audio_player.cleanup()
+        self.speech_recognizer.cleanup()
+        self.event_manager.stop_dispatcher(timeout=timeout)
+        self.ended_at = time.monotonic()
+        self.logger.info("Session %d ended: %s", self.session_id, self.stats())
+
+    def stats(self):
+        stages = self.pipeline.stats()
+        end = self.ended_at if self.ended_at is not None else time.monotonic()
+        return {
+            "session": self.session_id,
+            "duration": end - self.started_at,
+            "turns": stages["transcribe"]["items_out"],
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "audio_seconds_in": self.bytes_in / 2.0 / self.rate,
+            "audio_seconds_out": self.audio_seconds_out,
+            "busy_time": {name: counters["busy_time"] for name, counters in stages.items()},
+            "capture": self.source.stats(),
+            "speculation": self.llm_interaction.speculation_stats.as_dict(),
+            "transcription_tiers": self.speech_recognizer.tier_stats.as_dict(),
+        }
+
+
+class VoiceServer:
+    """
+    Accepts websocket clients and runs a Session for each, up to
+    max_sessions at a time; further clients get an error and are closed
+    with code 1013 (try again later).
+
+    Parameters:
+        config (AppConfig): Application config.
+        models (SharedModels): Models shared by all sessions.
+        host (str): Interface to listen on.
+        port (int): Port to listen on; 0 picks a free one.
+        max_sessions (int): Concurrent sessions admitted.
+    """
+    def __init__(self, config, models, host="127.0.0.1", port=8765, max_sessions=4):
+        self.logger = logging.getLogger(__name__)
+        self.config = config
+        self.models = models
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.accepted = 0
+        self.rejected = 0
+        self._ids = itertools.count(1)
+        self._loop = None
+        self._stop = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, config, models):
+        return cls(config, models,
+                   host=getattr(config, "server_host", "127.0.0.1"),
+                   port=getattr(config, "server_port", 8765),
+                   max_sessions=getattr(config, "server_max_sessions", 4))
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    def stats(self):
+        return {"active": len(self.sessions), "accepted": self.accepted, "rejected": self.rejected}
+
+    async def handler(self, websocket):
+        # no await between the check and the insert, so admission is atomic
+        if len(self.sessions) >= self.max_sessions:
+            self.rejected += 1
+            self.logger.warning("Rejecting client: %d sessions active", len(self.sessions))
+            await websocket.send(json.dumps({"type": "error", "reason": "server busy"}))
+            await websocket.close(CLOSE_TRY_AGAIN_LATER, "server busy")
+            return
+
+        loop = asyncio.get_running_loop()
+        outgoing = asyncio.Queue()
+
+        def send(message):
+            loop.call_soon_threadsafe(outgoing.put_nowait, message)
+
+        session_id = next(self._ids)
+        self.accepted += 1
+        session = Session(session_id, self.config, self.models, send)
+        self.sessions[session_id] = session
+        # saying the end session phrase ends the connection too, freeing the slot
+        ended = asyncio.Event()
+        session.event_manager.subscribe("end_session", lambda _=None: loop.call_soon_threadsafe(ended.set))
+        writer = asyncio.ensure_future(self._write(websocket, outgoing))
+        receiver = asyncio.ensure_future(self._receive(websocket, session))
+        ending = asyncio.ensure_future(ended.wait())
+        try:
+            session.start()
+            send({"type": "ready", "session": session_id})
+            await asyncio.wait((receiver, ending), return_when=asyncio.FIRST_COMPLETED)
+            if receiver.done():
+                receiver.result()
+            else:
+                self.logger.info("Session %d ended by the end session phrase", session_id)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            self.logger.error("Session %d failed: %s", session_id, e)
+        finally:
+            receiver.cancel()
+            ending.cancel()
+            await loop.run_in_executor(None, session.close)
+            del self.sessions[session_id]
+            send({"type": "stats", **session.stats()})
+            send(None)
+            try:
+                await asyncio.wait_for(writer, timeout=5.0)
+            except (asyncio.TimeoutError, websockets.ConnectionClosed):
+                writer.cancel()
+
+    @staticmethod
+    async def _receive(websocket, session):
+        async for message in websocket:
+            if isinstance(message, bytes):
+                session.feed(message)
+            elif json.loads(message).get("type") == "end":
+                return
+
+    async def _write(self, websocket, outgoing):
+        # one writer per connection keeps messages in the order they were queued
+        while True:
+            message = await outgoing.get()
+            if message is None:
+                return
+            try:
+                await websocket.send(message if isinstance(message, bytes) else json.dumps(message))
+            except websockets.ConnectionClosed:
+                return
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        async with websockets.serve(self.handler, self.host, self.port, max_size=None) as server:
+            self.port = next(iter(server.sockets)).getsockname()[1]
+            self.logger.info("Listening on %s (max %d sessions)", self.url, self.max_sessions)
+            self._ready.set()
+            await self._stop.wait()
+
+    def run(self):
+        asyncio.run(self.serve())
+
+    def start(self):
+        """
+        Serves from a background thread; returns once the port is bound.
+        """
+        self._thread = threading.Thread(target=self.run, name="voice-server", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(10):
+            raise RuntimeError(f"Server did not start listening on {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join(10)
+
+
+def main():
+    from vocalai import tracing
+    from vocalai.logger import setup_logging_from_config, shutdown_logging
+    config = AppConfig(load_config(sys.argv[1] if len(sys.argv) > 1 else "config.json"))
+    setup_logging_from_config(config)
+    tracer = tracing.configure(config)
+    models = SharedModels.load(config)
+    server = VoiceServer.from_config(config, models)
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        models.close()
+        tracer.close()
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
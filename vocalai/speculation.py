@@ -0,0 +1,115 @@
+import threading
+import time
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Word-level edit distance between two transcripts, divided by the number
+    of reference words.
+    """
+    reference = reference.split()
+    hypothesis = hypothesis.split()
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1,
+                               current[j - 1] + 1,
+                               previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / float(len(reference))
+
+
+class SpeculationStats:
+    def __init__(self):
+        self.accepted = 0
+        self.discarded = 0
+        self.saved_seconds = 0.0  # head start of accepted speculations
+        self.wasted_seconds = 0.0  # generation time thrown away with discarded ones
+
+    def as_dict(self):
+        return {
+            "accepted": self.accepted,
+            "discarded": self.discarded,
+            "saved_seconds": self.saved_seconds,
+            "wasted_seconds": self.wasted_seconds,
+        }
+
+
+class Speculation:
+    """
+    An LLM request started on a provisional prompt. A background thread reads
+    the response chunks into a buffer until the request is claimed, through
+    chunks(), or cancelled. Cancelling closes the stream from the cancelling
+    thread, so generation stops even while the reader is blocked waiting for
+    the next chunk or for Ollama to finish evaluating the prompt.
+
+    Parameters:
+        prompt (str): The provisional prompt.
+        chunks: Iterable of Ollama NDJSON objects whose close() may be called
+            from another thread, e.g. LLMClient.open_stream().
+        payload (dict): The request, kept for the caller.
+    """
+    def __init__(self, prompt, chunks, payload=None):
+        self.prompt = prompt
+        self.payload = payload
+        self.started = time.monotonic()
+        self._source = chunks
+        self._buffer = []
+        self._done = False
+        self._error = None
+        self._cancelled = threading.Event()
+        self._changed = threading.Condition()
+        self._thread = threading.Thread(target=self._run, args=(chunks,), name="llm-speculation", daemon=True)
+        self._thread.start()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _run(self, chunks):
+        iterator = iter(chunks)
+        try:
+            for json_obj in iterator:
+                if self._cancelled.is_set():
+                    break
+                with self._changed:
+                    self._buffer.append(json_obj)
+                    self._changed.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+            with self._changed:
+                self._done = True
+                self._changed.notify_all()
+
+    def cancel(self):
+        if self._cancelled.is_set():
+            return
+        self._cancelled.set()
+        if hasattr(self._source, "close"):
+            self._source.close()
+
+    def chunks(self):
+        """
+        Yields the buffered chunks, then the rest as they arrive. Closing the
+        generator early cancels the request.
+        """
+        index = 0
+        try:
+            while True:
+                with self._changed:
+                    self._changed.wait_for(lambda: index < len(self._buffer) or self._done)
+                    if index >= len(self._buffer):
+                        if self._error is not None:
+                            raise self._error
+                        return
+                    json_obj = self._buffer[index]
+                index += 1
+                yield json_obj
+        finally:
+            self.cancel()
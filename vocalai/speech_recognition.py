@@ -1,12 +1,18 @@
 import json
 import logging
 import numpy as np
-import pyaudio
 import re
+import threading
+import time
 import whisper
-from io import BytesIO
+from vocalai.audio_buffer import AudioBuffer
+from vocalai.audio_source import create_audio_source
 from vocalai.event_manager import EventManager
-from vocalai.util import suppress_output, restore_output
+from vocalai.incremental_transcriber import IncrementalTranscriber
+from vocalai.phrase_matcher import PhraseMatcher
+from vocalai.tiered_transcription import TieredTranscriptionPolicy, TierStats
+from vocalai.tracing import annotate, get_tracer, mark
+from vocalai.vad import PauseEndpointer, level_db, trim_silence
 from vosk import Model, KaldiRecognizer, SetLogLevel
 
 class SpeechRecognizer:
@@ -14,37 +20,67 @@ class SpeechRecognizer:
     event_manager = EventManager.get_instance()
     logger = logging.getLogger(__name__)
 
-    def __new__(cls, config):
+    def __new__(cls, config, *args, session=False, **kwargs):
+        if session:
+            # server sessions each get their own recognizer state
+            return super(SpeechRecognizer, cls).__new__(cls)
         if cls._instance is None:
             cls._instance = super(SpeechRecognizer, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, config, rate=16000, chunk=1024):
+    def __init__(self, config, rate=16000, chunk=1024, stream=None, session=False, event_manager=None,
+                 recognizer=None, whisper_model=None):
+        """
+        recognizer (a vosk KaldiRecognizer with SetWords(True)) and
+        whisper_model may be passed in, e.g. by the server, which shares the
+        models between sessions; otherwise they are loaded on first use.
+        """
         self.config = config
-        self.event_manager = SpeechRecognizer.event_manager
-        self.event_manager.subscribe("audio_started", self.handle_audio_started)
-        self.event_manager.subscribe("audio_stopped", self.handle_audio_stopped)
+        if recognizer is not None:
+            self.recognizer = recognizer
+        if whisper_model is not None:
+            self.whisper_model = whisper_model
+        self.event_manager = event_manager or SpeechRecognizer.event_manager
+        self.event_manager.subscribe("audio_started", self.handle_audio_started, synchronous=True)
+        self.event_manager.subscribe("audio_stopped", self.handle_audio_stopped, synchronous=True)
         self.logger = SpeechRecognizer.logger
+        # set while nothing is playing, so barge-in can block on it
+        self._playback_stopped = threading.Event()
         self.is_audio_playing = False
+        self.barge_in_timeout = getattr(config, "barge_in_timeout", 1.0)
+        self.last_barge_in_latency = None
         self.end_session_flag = False
         self.speech_detected = False
-
-        old_stdout, old_stderr, devnull = suppress_output()
-        try:
-            self.p = pyaudio.PyAudio()
-        except Exception as e:
-            raise Exception(f"Failed to create pyaudio instance {str(e)}")
-        finally:
-            restore_output(old_stdout, old_stderr, devnull)
-
+        self.incremental_transcriber = None
+        self.last_transcribe_latency = None
+        self.last_trimmed_seconds = 0.0
+        self.last_fast_transcript = ""
+        self.fast_words = []
+        # vosk's word times count from the recognizer's first sample
+        self._fast_samples = 0
+        self._utterance_offset = 0.0
+        self.tiered_policy = None
+        if getattr(config, "tiered_transcription", False):
+            self.tiered_policy = TieredTranscriptionPolicy.from_config(config)
+        self.tier_stats = TierStats()
+        self.whisper_calls = 0
+        self.whisper_time = 0.0  # wall-clock seconds inside whisper calls
+        self.endpointing = getattr(config, "endpointing", "phrase")
+
+        self.phrase_matcher = PhraseMatcher({
+            "eom": config.eom_phrase,
+            "end_session": config.end_session_phrase,
+            "stop": config.stop_phrase,
+        })
+        self.phrase_stream = self.phrase_matcher.stream()
+        command_words = [config.eom_phrase, config.end_session_phrase]
+        self.command_pattern = re.compile("|".join(re.escape(word) for word in command_words), re.IGNORECASE)
 
         self.rate = rate
         self.chunk = chunk
-        self.stream = self.p.open(format=pyaudio.paInt16,
-                                  channels=1, # mono
-                                  rate=rate,
-                                  input=True,
-                                  frames_per_buffer=chunk)
+        # anything with PyAudio's read(frames); by default an AudioSource that
+        # captures continuously in the background
+        self.stream = stream if stream is not None else create_audio_source(config, rate, chunk).start()
 
     def _load_fast_recognizer(self):
         SetLogLevel(-1)
@@ -55,126 +91,304 @@ class SpeechRecognizer:
 
         self.recognizer = KaldiRecognizer(self.model, self.rate)
         self.recognizer.SetWords(True)  # Enable word-level recognition
+        self._fast_samples = 0
 
     def _load_whisper(self):
         self.whisper_model = whisper.load_model(self.config.whisper_model_name)
 
-    def listen_until_stop_phrase(self):
+    def warm_up_fast_recognizer(self, _=None):
+        """Run half a second of silence through vosk so the first turn is not a cold start."""
+        self.recognizer.AcceptWaveform(bytes(self.rate))
+        self._fast_samples += self.rate // 2
+        self.recognizer.Reset()
 
-        if not hasattr(self, "model"):
-            self._load_fast_recognizer()
+    def warm_up_whisper(self, _=None):
+        """Run one second of silence through whisper so the first turn is not a cold start."""
+        self.whisper_model.transcribe(np.zeros(self.rate, dtype=np.float32))
+
+    @property
+    def is_audio_playing(self):
+        return not self._playback_stopped.is_set()
 
-        audio_buffer = BytesIO()
-        transcript = ""
+    @is_audio_playing.setter
+    def is_audio_playing(self, playing):
+        if playing:
+            self._playback_stopped.clear()
+        else:
+            self._playback_stopped.set()
+
+    def listen(self):
+        """
+        Listens for one turn using the session's endpointing mode: "phrase"
+        waits for the EOM phrase, "pause" also ends the turn on a pause.
+        """
+        if self.endpointing == "pause":
+            return self.listen_until_pause()
+        return self.listen_until_stop_phrase()
+
+    def set_endpointing(self, mode):
+        if mode not in ("phrase", "pause"):
+            raise ValueError(f"Unknown endpointing mode: {mode}")
+        self.logger.info("Endpointing mode set to '%s'", mode)
+        self.endpointing = mode
 
+    def listen_until_stop_phrase(self):
         self.logger.debug("Listening until stop phrase")
+        return self._listen()
+
+    def listen_until_pause(self):
+        self.logger.debug("Listening until a pause")
+        endpointer = PauseEndpointer.from_config(self.config, rate=self.rate)
+        return self._listen(endpointer)
+
+    def _listen(self, endpointer=None):
+        if not hasattr(self, "recognizer"):
+            self._load_fast_recognizer()
+
+        audio_buffer = AudioBuffer.from_config(self.config, rate=self.rate)
+        self.fast_transcript = []
+        self.fast_partial = ""
+        self.fast_words = []
+        self._utterance_offset = self._fast_samples / float(self.rate)
+        self.phrase_stream = self.phrase_matcher.stream()
+        self.speech_detected = False
+        self._start_incremental_transcription()
 
         while True:
             data = self._read_audio_data()
-            transcript += self._process_audio_data(data, audio_buffer)
-            
-            self.logger.info(f"You Said: '{transcript}'")
-
-            if self._should_stop_recording(transcript):
+            if data is None:
+                self.logger.info("Audio input ended")
+                self._end_session()
+                break
+            chunk_arrived = time.monotonic()
+            matches = self._process_audio_data(data, audio_buffer)
+
+            # the assistant's own voice must not count as the user speaking
+            if endpointer is not None and not self.is_audio_playing:
+                pause_detected = endpointer.feed(data)
+                self.speech_detected = endpointer.speech_detected
+                if pause_detected:
+                    self.logger.info("Sufficient pause detected, stopping listening")
+                    mark("eom", chunk_arrived)
+                    break
+
+            if not matches:
+                continue
+
+            self._handle_matches(matches)
+
+            if "eom" in matches:
+                self.logger.info("EOM phrase '%s' detected. Ending message.", self.config.eom_phrase)
+                # how long vosk took to surface the phrase once its last chunk arrived
+                get_tracer().record_span("eom_detection", chunk_arrived, time.monotonic())
+                mark("eom", chunk_arrived)
                 break
 
-            self._handle_special_phrases(transcript)
+            if self.end_session_flag:
+                break
 
-        audio_buffer.seek(0)
+        # the turn usually ends on a partial result; finalizing it keeps those
+        # words out of the next turn, where they would match the EOM phrase again
+        self._finalize_fast_result()
+        self.last_fast_transcript = " ".join(self.fast_transcript + ([self.fast_partial] if self.fast_partial else []))
+        self.logger.info("You Said: '%s'", self.last_fast_transcript)
+        annotate(audio_seconds=audio_buffer.duration, words=len(self.last_fast_transcript.split()))
+        audio_buffer.fast_transcript = self.last_fast_transcript
+        audio_buffer.fast_words = [dict(word, start=word["start"] - self._utterance_offset,
+                                        end=word["end"] - self._utterance_offset) for word in self.fast_words]
+        audio_buffer.incremental_transcriber = self.incremental_transcriber
+        self.incremental_transcriber = None
         return audio_buffer
 
-   # def listen_until_pause(self, audio_player):
-   #     audio_buffer = BytesIO()
-   #     total_silence_duration = 0
-   #     max_silence = self.config.eom_pause_duration
-
-   #     self.logger.debug("Listening until a pause")
-
-   #     while True:
-   #         data = self._read_audio_data()
-   #         audio_buffer.write(data)
-   #         is_silent = self._is_silent(data)
-
-   #         recognized_text = self._process_audio_data(data, audio_buffer)
-   #         if recognized_text != "":
-   #             self._handle_commands(recognized_text)
-
-   #         if not self.speech_detected:
-   #             if not is_silent:
-   #                 self.speech_detected = True
-   #                 self.logger.debug("Speech detected, starting to monitor for pause")
-   #         else:
-   #             if is_silent:
-   #                 total_silence_duration += len(data) / self.rate # duration in seconds
-   #                 if total_silence_duration  >= max_silence:
-   #                     self.logger.info("Sufficient pause detected, stopping listening")
-   #                     break
-   #             else:
-   #                 total_silence_duration = 0
+    def _start_incremental_transcription(self):
+        if not getattr(self.config, "incremental_transcription", False):
+            return
+        if not hasattr(self, 'whisper_model'):
+            self._load_whisper()
+        self.incremental_transcriber = IncrementalTranscriber(
+            self.whisper_model,
+            rate=self.rate,
+            step_seconds=getattr(self.config, "incremental_step_seconds", 2.0),
+            overlap_seconds=getattr(self.config, "incremental_overlap_seconds", 1.0)).start()
 
     def _is_silent(self, data):
-        amplitude = self._calulate_amplitude(self, data)
+        amplitude = self._calulate_amplitude(data)
         return amplitude < self.config.silence_threshold
 
     def _calulate_amplitude(self, data):
-        samples = np.frombuffer(data, dtype=np.int16)
-        avg_amplitude = np.mean(np.abs(samples))
-        self.logger.debug(f"Average Amplitude: '{avg_amplitude}'")
-
-        if avg_amplitude == 0:
-            return -float('inf')
-        else:
-            amplitude_db = 20 * np.log10(avg_amplitude)
-            return amplitude_db
+        """
+        Average amplitude of the chunk in dBFS, comparable to silence_threshold.
+        """
+        return level_db(np.frombuffer(data, dtype=np.int16))
 
     def _read_audio_data(self):
         return self.stream.read(self.chunk)
 
     def _process_audio_data(self, data, audio_buffer):
+        """
+        Buffers one chunk and feeds it to vosk. Returns the names of the
+        command phrases ("eom", "end_session", "stop") first heard in this
+        chunk, from either the partial or the final hypothesis.
+        """
         audio_buffer.write(data)
+        if self.incremental_transcriber is not None:
+            self.incremental_transcriber.feed(data)
+        self._fast_samples += len(data) // 2
         if self.recognizer.AcceptWaveform(data):
             result = json.loads(self.recognizer.Result())
-            self.logger.info(f"Recognized text: '{result.get('text', '')}'")
-            return result.get('text', '') + " "
-        return ""
+            text = result.get('text', '')
+            self.logger.debug("Recognized text: '%s'", text)
+            if text:
+                self.fast_transcript.append(text)
+            # per-word confidences and times, since SetWords(True)
+            self.fast_words.extend(result.get('result', []))
+            self.fast_partial = ""
+            return self.phrase_stream.feed_final(text)
+        partial = json.loads(self.recognizer.PartialResult()).get('partial', '')
+        self.fast_partial = partial
+        return self.phrase_stream.feed_partial(partial)
+
+    def _finalize_fast_result(self):
+        """
+        Ends vosk's utterance at the end of a turn: its pending hypothesis
+        becomes a final result, which unlike a partial carries word
+        confidences, and the next turn starts from an empty hypothesis.
+        """
+        result = json.loads(self.recognizer.FinalResult())
+        text = result.get('text', '') or self.fast_partial
+        if text:
+            self.fast_transcript.append(text)
+        self.fast_words.extend(result.get('result', []))
+        self.fast_partial = ""
 
     def _should_stop_recording(self, transcript):
-        if self.config.eom_phrase in transcript:
-            self.logger.info(f"EOM phrase '{self.config.eom_phrase}' detected. Ending message.")
+        if "eom" in self.phrase_matcher.find(transcript):
+            self.logger.info("EOM phrase '%s' detected. Ending message.", self.config.eom_phrase)
             return True
         return False
 
     def _handle_special_phrases(self, transcript):
-        if self.config.end_session_phrase in transcript:
-            self.logger.info(f"End session phrase '{self.config.end_session_phrase}' detected.")
-            self.end_session_flag = True
-        if self.config.stop_phrase  in transcript:
+        self._handle_matches(self.phrase_matcher.find(transcript))
+
+    def _handle_matches(self, matches):
+        if "end_session" in matches:
+            self.logger.info("End session phrase '%s' detected.", self.config.end_session_phrase)
+            self._end_session()
+        if "stop" in matches:
             self._react_to_stop_phrase()
 
+    def _end_session(self):
+        self.end_session_flag = True
+        self.event_manager.publish("end_session", None)
+
     def _react_to_stop_phrase(self):
         if self.is_audio_playing:
             self.logger.debug("stop phrase detected and audio is playing, publishing event")
-            self._publish_stop_audio()
+            self._publish_stop_audio(detected_at=time.monotonic())
         else:
             self.logger.debug("stop phrase detected in recognized text, no audio playing")
 
-    def _publish_stop_audio(self):
-        self.logger.debug("Internal call to _publish_stop_audio")
+    def _publish_stop_audio(self, detected_at=None):
+        """
+        Asks the player to stop and waits, at most barge_in_timeout seconds,
+        for it to report audio_stopped. Records the time from detecting the
+        stop phrase to the output going silent in last_barge_in_latency.
+        """
+        detected_at = detected_at or time.monotonic()
         self.logger.debug("Stopping audio playback")
         self.event_manager.publish("stop_audio", None)
-        while (self.is_audio_playing):
-            self.logger.debug("waiting for audio to stop")
-        return BytesIO() # reset empty buffer, ready for new audio message
+        if not self._playback_stopped.wait(self.barge_in_timeout):
+            self.logger.warning("Audio did not stop within %.1fs of the stop phrase", self.barge_in_timeout)
+            return False
+        self.last_barge_in_latency = time.monotonic() - detected_at
+        self.logger.info("Barge-in silenced playback in %.1f ms", self.last_barge_in_latency * 1000)
+        return True
 
     def transcribe(self, audio_buffer):
-        self.logger.debug("transcribing audio with whisper")
-        audio_data = np.frombuffer(audio_buffer.getvalue(), dtype=np.int16).astype(np.float32) / 32768.0
-
+        start = time.monotonic()
+        incremental_transcriber = getattr(audio_buffer, "incremental_transcriber", None)
+        if incremental_transcriber is not None:
+            self.logger.debug("finishing incremental whisper transcription")
+            with get_tracer().span("whisper", incremental=True):
+                text = incremental_transcriber.finish()
+        else:
+            self.logger.debug("transcribing audio with whisper")
+            if isinstance(audio_buffer, AudioBuffer):
+                audio_data = audio_buffer.as_float32()
+            else:
+                audio_data = np.frombuffer(audio_buffer.getvalue(), dtype=np.int16).astype(np.float32) / 32768.0
+
+            fast_words = getattr(audio_buffer, "fast_words", None)
+            if self.tiered_policy is not None and fast_words is not None:
+                text, mode = self._transcribe_tiered(audio_data, fast_words), "tiered"
+            else:
+                text, mode = self._transcribe_whole(audio_data), "full buffer"
+
+        self.last_transcribe_latency = time.monotonic() - start
+        self.logger.info("Post-EOM transcription took %.3fs (%s)", self.last_transcribe_latency,
+                         "incremental" if incremental_transcriber is not None else mode)
+        return text
+
+    def _transcribe_whole(self, audio_data):
+        audio_data = self._trim_silence(audio_data)
+        if len(audio_data) == 0:
+            self.logger.info("No speech found in recording, skipping whisper")
+            return ""
+        return self._whisper(audio_data)
+
+    def _whisper(self, audio_data, **attributes):
         if not hasattr(self, 'whisper_model'):
             self._load_whisper()
-
-        result = self.whisper_model.transcribe(audio_data)
-        return result["text"]
+        self.whisper_calls += 1
+        with get_tracer().span("whisper", audio_seconds=len(audio_data) / float(self.rate), **attributes):
+            start = time.monotonic()
+            try:
+                return self.whisper_model.transcribe(audio_data)["text"]
+            finally:
+                self.whisper_time += time.monotonic() - start
+
+    def _transcribe_tiered(self, audio_data, fast_words):
+        """
+        Uses vosk's transcript when its words are confident enough, and
+        whisper for the low-confidence segments or the whole utterance
+        otherwise. See TieredTranscriptionPolicy.
+        """
+        decision = self.tiered_policy.decide(fast_words, len(audio_data) / float(self.rate))
+        calls, whisper_time = self.whisper_calls, self.whisper_time
+        if decision.tier == "vosk":
+            text = decision.assemble()
+        elif decision.tier == "segments":
+            texts = [self._whisper(audio_data[int(start * self.rate):int(end * self.rate)], segment=True)
+                     for start, end in decision.spans]
+            text = decision.assemble(texts)
+        else:
+            text = self._transcribe_whole(audio_data)
+        self.tier_stats.record(decision, self.whisper_time - whisper_time, self.whisper_calls - calls)
+        annotate(tier=decision.tier)
+        self.logger.info("Transcribed by the %s tier (mean word confidence %s, %.2fs of %.2fs speech to whisper)",
+                         decision.tier,
+                         "n/a" if decision.mean_confidence is None else f"{decision.mean_confidence:.2f}",
+                         decision.whisper_seconds, decision.speech_seconds)
+        return text
+
+    def _trim_silence(self, audio_data):
+        """
+        Drops leading/trailing silence and compresses long pauses so whisper
+        only processes speech. Records how many seconds were removed.
+        """
+        self.last_trimmed_seconds = 0.0
+        if not getattr(self.config, "trim_silence", False):
+            return audio_data
+        trimmed, removed = trim_silence(audio_data,
+                                        rate=self.rate,
+                                        threshold_db=getattr(self.config, "silence_threshold", -40.0),
+                                        padding_seconds=getattr(self.config, "trim_padding_seconds", 0.2),
+                                        max_pause_seconds=getattr(self.config, "trim_max_pause_seconds", 0.5),
+                                        full_scale=1.0)
+        self.last_trimmed_seconds = removed
+        self.logger.info("Removed %.2fs of silence from %.2fs of audio before whisper",
+                         removed, len(audio_data) / float(self.rate))
+        return trimmed
 
     def handle_audio_started(self, _=None):
         self.logger.debug("handle_audio_started: setting flag to true")
@@ -186,13 +400,16 @@ class SpeechRecognizer:
 
     def remove_command_words(self, text_prompt):
         self.logger.debug("BEFORE removing command words: %s", text_prompt)
-        command_words = [self.config.eom_phrase, self.config.end_session_phrase]
-        pattern = re.compile("|".join(re.escape(word) for word in command_words), re.IGNORECASE)
-        self.logger.debug("AFTER removing command words: %s", pattern.sub("", text_prompt))
-        return pattern.sub("", text_prompt)
+        cleaned = self.command_pattern.sub("", text_prompt)
+        self.logger.debug("AFTER removing command words: %s", cleaned)
+        return cleaned
 
     def cleanup(self):
         self.logger.debug("Cleanup on speech_recognition!")
+        if hasattr(self.stream, "stats"):
+            self.logger.info("Audio capture stats: %s", self.stream.stats())
+        if self.tiered_policy is not None:
+            self.logger.info("Transcription tiers: %s", self.tier_stats.as_dict())
         self.stream.stop_stream()
         self.stream.close()
 
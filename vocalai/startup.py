@@ -0,0 +1,131 @@
+import importlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ComponentTiming:
+    def __init__(self, name):
+        self.name = name
+        self.import_seconds = 0.0
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.error = None
+
+    @property
+    def total_seconds(self):
+        return self.import_seconds + self.load_seconds + self.warmup_seconds
+
+    def as_dict(self):
+        return {
+            "import": round(self.import_seconds, 4),
+            "load": round(self.load_seconds, 4),
+            "warmup": round(self.warmup_seconds, 4),
+            "total": round(self.total_seconds, 4),
+            "error": self.error,
+        }
+
+
+class StartupOrchestrator:
+    """
+    Loads and warms up models in parallel on a worker pool and times each
+    phase per component, so the first user turn does not pay for cold starts.
+
+    Parameters:
+        max_workers (int): Size of the worker pool.
+    """
+    def __init__(self, max_workers=4):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.components = []
+        self.timings = {}
+        self.results = {}
+        self.wall_seconds = 0.0
+
+    def add(self, name, load, warmup=None, imports=()):
+        """
+        Registers a component.
+
+        Parameters:
+            name (str): Name used in the report.
+            load (callable): Loads the model. Its return value is kept in
+                results[name] and passed to warmup.
+            warmup (callable): Runs a short inference; called with the value
+                returned by load.
+            imports (tuple): Modules to import first, timed separately.
+        """
+        self.components.append((name, load, warmup, imports))
+
+    def run(self):
+        """
+        Runs every component and returns the results dict. Raises the first
+        failure once all components have finished.
+        """
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="startup") as pool:
+            futures = {name: pool.submit(self._run_component, name, load, warmup, imports)
+                       for name, load, warmup, imports in self.components}
+            errors = []
+            for name, future in futures.items():
+                try:
+                    self.results[name] = future.result()
+                except Exception as e:
+                    errors.append(e)
+        self.wall_seconds = time.monotonic() - start
+        self.log_report()
+        if errors:
+            raise errors[0]
+        return self.results
+
+    def _run_component(self, name, load, warmup, imports):
+        timing = ComponentTiming(name)
+        self.timings[name] = timing
+        try:
+            phase_start = time.monotonic()
+            for module in imports:
+                importlib.import_module(module)
+            timing.import_seconds = time.monotonic() - phase_start
+
+            phase_start = time.monotonic()
+            result = load()
+            timing.load_seconds = time.monotonic() - phase_start
+
+            if warmup is not None:
+                phase_start = time.monotonic()
+                warmup(result)
+                timing.warmup_seconds = time.monotonic() - phase_start
+            return result
+        except Exception as e:
+            timing.error = str(e)
+            self.logger.error(f"Startup of '{name}' failed: {str(e)}")
+            raise
+
+    def report(self):
+        serial = sum(timing.total_seconds for timing in self.timings.values())
+        return {
+            "timestamp": time.time(),
+            "wall_seconds": round(self.wall_seconds, 4),
+            "serial_seconds": round(serial, 4),
+            "components": {name: timing.as_dict() for name, timing in self.timings.items()},
+        }
+
+    def log_report(self):
+        for name, timing in self.timings.items():
+            self.logger.info("startup %s: import %.2fs, load %.2fs, warm-up %.2fs%s", name,
+                             timing.import_seconds, timing.load_seconds, timing.warmup_seconds,
+                             f" (failed: {timing.error})" if timing.error else "")
+        self.logger.info("startup finished in %.2fs wall time", self.wall_seconds)
+
+    def write_report(self, path):
+        """
+        Appends the report as one JSON line, so the file keeps a history that
+        cold-start regressions can be tracked against.
+        """
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a") as file:
+            file.write(json.dumps(self.report()) + "\n")
@@ -0,0 +1,89 @@
+import re
+
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc",
+    "e.g", "i.e", "inc", "ltd", "approx", "fig",
+}
+
+INITIAL = re.compile(r'[A-Z]\.')
+
+# A sentence ends at ., ! or ? (optionally followed by closing quotes or
+# brackets) when the next character is whitespace. Newlines always end a chunk.
+SENTENCE_END = re.compile(r'([.!?]+["\')\]]*)(\s+)|(\n+)')
+
+
+class SentenceSegmenter:
+    """
+    Accumulates streamed text and emits speakable sentence-sized chunks.
+
+    Parameters:
+        min_chars (int): Sentences shorter than this are merged with the next
+            one so TTS is not invoked for fragments like "Yes."
+    """
+    def __init__(self, min_chars=12):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text):
+        """
+        Adds streamed text and returns the list of completed chunks.
+        """
+        self._buffer += text
+        chunks = []
+        chunk_start = 0
+        for match in SENTENCE_END.finditer(self._buffer):
+            is_newline = match.group(3) is not None
+            end = match.start(3) if is_newline else match.start(2)
+            if not is_newline and self._is_false_boundary(self._buffer[chunk_start:end], match.group(1),
+                                                          self._buffer[match.end():]):
+                continue
+            candidate = self._buffer[chunk_start:end].strip()
+            if not is_newline and len(candidate) < self.min_chars:
+                continue
+            if candidate:
+                chunks.append(candidate)
+            chunk_start = match.end()
+        self._buffer = self._buffer[chunk_start:]
+        return chunks
+
+    def flush(self):
+        """
+        Returns whatever text is left once the stream has ended.
+        """
+        remainder = self._buffer.strip()
+        self._buffer = ""
+        return [remainder] if remainder else []
+
+    @staticmethod
+    def _is_false_boundary(text, terminator, following):
+        # "Dr. Smith", "e.g. this" and "J. R. R. Tolkien" should not end a
+        # sentence, while "Is it no?" and "Take plan A. Then" should
+        if terminator.rstrip("\"')]") != ".":
+            return False
+        words = text.split()
+        if not words:
+            return False
+        if words[-1].rstrip(".\"')]").lower() in ABBREVIATIONS:
+            return True
+        if not INITIAL.fullmatch(words[-1]):
+            return False
+        if len(words) > 1 and INITIAL.fullmatch(words[-2]):
+            return True
+        # until the next word has streamed in it may still be an initial
+        next_word = following[:2]
+        if len(next_word) < 2:
+            return next_word == "" or next_word.isupper()
+        return INITIAL.fullmatch(next_word) is not None
+
+
+def segment_sentences(tokens, min_chars=12):
+    """
+    Turns an iterable of streamed tokens into an iterator of sentences.
+    """
+    segmenter = SentenceSegmenter(min_chars=min_chars)
+    for token in tokens:
+        for sentence in segmenter.feed(token):
+            yield sentence
+    for sentence in segmenter.flush():
+        yield sentence
+
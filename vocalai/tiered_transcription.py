@@ -0,0 +1,174 @@
+TIERS = ("vosk", "segments", "whisper")
+
+
+class TierDecision:
+    """
+    How one utterance is transcribed.
+
+    Parameters:
+        tier (str): "vosk" to use vosk's transcript as is, "segments" to have
+            whisper transcribe only the spans of low-confidence words, or
+            "whisper" for the whole utterance.
+        words (list): vosk's words, each a dict with "word", "conf" and
+            "start"/"end" in seconds from the start of the utterance.
+        spans (list): (start, end) seconds whisper transcribes, for "segments".
+        mean_confidence (float): Mean word confidence, None without words.
+    """
+    def __init__(self, tier, words=(), spans=(), mean_confidence=None):
+        self.tier = tier
+        self.words = list(words)
+        self.spans = list(spans)
+        self.mean_confidence = mean_confidence
+
+    @property
+    def speech_seconds(self):
+        """
+        Audio from the first word to the last, about what whisper would get
+        after trimming silence.
+        """
+        if not self.words:
+            return 0.0
+        return self.words[-1]["end"] - self.words[0]["start"]
+
+    @property
+    def whisper_seconds(self):
+        if self.tier == "whisper":
+            return self.speech_seconds
+        return sum(end - start for start, end in self.spans)
+
+    def assemble(self, span_texts=()):
+        """
+        The transcript: vosk's words, with the words centred in a span
+        replaced by whisper's text for that span. A span's padding may clip a
+        neighbouring word; whisper is not relied on for it.
+        """
+        parts = []
+        texts = dict(zip(self.spans, span_texts))
+        used = set()
+        for word in self.words:
+            middle = (word["start"] + word["end"]) / 2.0
+            span = next((span for span in self.spans if span[0] < middle < span[1]), None)
+            if span is None:
+                parts.append(word["word"])
+            elif span not in used:
+                used.add(span)
+                parts.append(texts.get(span, "").strip())
+        return " ".join(part for part in parts if part)
+
+
+class TieredTranscriptionPolicy:
+    """
+    Decides from vosk's word-level confidences how much of an utterance
+    whisper has to transcribe. When every word is confident vosk's transcript
+    is used as is. When only a few words are not, just the audio around them
+    goes to whisper. Otherwise the whole utterance does.
+
+    Whisper pads every call to a 30 second window, so each segment costs a
+    full encoder pass; an utterance needing more than max_segments segments
+    is sent whole instead.
+
+    Parameters:
+        min_mean_confidence (float): Mean word confidence needed to skip
+            whisper.
+        min_word_confidence (float): Words below it are low-confidence.
+        max_low_fraction (float): Largest share of low-confidence words still
+            transcribed segment by segment; 0 sends every uncertain utterance
+            to whisper whole.
+        max_segments (int): Most whisper calls made for one utterance.
+        padding_seconds (float): Audio kept either side of a low-confidence
+            word.
+    """
+    def __init__(self, min_mean_confidence=0.9, min_word_confidence=0.6, max_low_fraction=0.3,
+                 max_segments=1, padding_seconds=0.15):
+        self.min_mean_confidence = min_mean_confidence
+        self.min_word_confidence = min_word_confidence
+        self.max_low_fraction = max_low_fraction
+        self.max_segments = max_segments
+        self.padding_seconds = padding_seconds
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(min_mean_confidence=getattr(config, "tiered_min_mean_confidence", 0.9),
+                   min_word_confidence=getattr(config, "tiered_min_word_confidence", 0.6),
+                   max_low_fraction=getattr(config, "tiered_max_low_fraction", 0.3),
+                   max_segments=getattr(config, "tiered_max_segments", 1))
+
+    def decide(self, words, duration):
+        """
+        Parameters:
+            words (list): vosk's word results for the utterance, with times
+                relative to its start.
+            duration (float): Length of the utterance's audio in seconds.
+        """
+        if not words:
+            return TierDecision("whisper")
+        mean_confidence = sum(word["conf"] for word in words) / len(words)
+        low = [word for word in words if word["conf"] < self.min_word_confidence]
+        if not low and mean_confidence >= self.min_mean_confidence:
+            return TierDecision("vosk", words, mean_confidence=mean_confidence)
+        if low and len(low) / len(words) <= self.max_low_fraction:
+            spans = self._spans(low, duration)
+            if len(spans) <= self.max_segments:
+                return TierDecision("segments", words, spans, mean_confidence)
+        return TierDecision("whisper", words, mean_confidence=mean_confidence)
+
+    def _spans(self, low_words, duration):
+        spans = []
+        for word in low_words:
+            start = max(0.0, word["start"] - self.padding_seconds)
+            end = min(duration, word["end"] + self.padding_seconds)
+            if spans and start <= spans[-1][1]:
+                spans[-1] = (spans[-1][0], max(end, spans[-1][1]))
+            else:
+                spans.append((start, end))
+        return spans
+
+
+class TierStats:
+    """
+    Turns served by each tier and the whisper time they saved. Whisper time
+    is wall-clock time measured around each whisper call, so unlike process
+    CPU time it excludes TTS or other sessions running at the same time.
+    Whisper's cost is dominated by its fixed 30 second encoder window, so the
+    saving is estimated per call: the mean time of a whole-utterance call for
+    every turn that did not need one, less the time spent on segments.
+    """
+    def __init__(self):
+        self.turns = dict.fromkeys(TIERS, 0)
+        self.speech_seconds = 0.0
+        self.whisper_seconds = 0.0
+        self.whisper_time = dict.fromkeys(TIERS, 0.0)
+        self.calls = dict.fromkeys(TIERS, 0)
+
+    def record(self, decision, whisper_time=0.0, calls=0):
+        """
+        Counts a turn, with the time spent in the whisper calls it made.
+        """
+        self.turns[decision.tier] += 1
+        self.speech_seconds += decision.speech_seconds
+        self.whisper_seconds += decision.whisper_seconds
+        self.whisper_time[decision.tier] += whisper_time
+        self.calls[decision.tier] += calls
+
+    @property
+    def whisper_time_saved(self):
+        """
+        Estimated seconds of whisper calls saved, or None until a whole
+        utterance has been transcribed to compare against.
+        """
+        if not self.calls["whisper"]:
+            return None
+        full_call = self.whisper_time["whisper"] / self.calls["whisper"]
+        return full_call * (self.turns["vosk"] + self.turns["segments"]) - self.whisper_time["segments"]
+
+    def as_dict(self):
+        total = sum(self.turns.values())
+        return {
+            "turns": dict(self.turns),
+            "share": {tier: count / total if total else 0.0 for tier, count in self.turns.items()},
+            "speech_seconds": self.speech_seconds,
+            "whisper_seconds": self.whisper_seconds,
+            "whisper_calls": sum(self.calls.values()),
+            "whisper_time": sum(self.whisper_time.values()),
+            "whisper_time_saved": self.whisper_time_saved,
+        }
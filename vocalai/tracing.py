@@ -0,0 +1,390 @@
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, fine enough for p50/p95 on the voice loop.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ids = itertools.count(1)
+_local = threading.local()
+
+
+class Trace:
+    """
+    Groups the spans of one user turn. Marks record the first time a named
+    moment was reached, e.g. "eom" or "first_audio".
+    """
+    def __init__(self, name="turn"):
+        self.trace_id = next(_ids)
+        self.name = name
+        self.start = time.monotonic()
+        self.wall_start = time.time()
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name, at=None):
+        """
+        Records a moment once. Returns True the first time.
+        """
+        with self._lock:
+            if name in self.marks:
+                return False
+            self.marks[name] = at if at is not None else time.monotonic()
+            return True
+
+    def wall_time(self, monotonic_time):
+        return self.wall_start + (monotonic_time - self.start)
+
+
+class Span:
+    """
+    A timed operation within a trace. Use it as a context manager to make it
+    the current span of the thread while it runs, so spans started inside it
+    become its children.
+    """
+    def __init__(self, tracer, name, trace, parent_id=None, start=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace = trace
+        self.span_id = next(_ids)
+        self.parent_id = parent_id
+        self.start = start if start is not None else time.monotonic()
+        self.end_time = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    @property
+    def duration(self):
+        end = self.end_time if self.end_time is not None else time.monotonic()
+        return end - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def end(self, at=None):
+        if self.end_time is None:
+            self.end_time = at if at is not None else time.monotonic()
+            self.tracer._finish(self)
+
+    def __enter__(self):
+        _stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stack = _stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc is not None:
+            self.error = repr(exc)
+        self.end()
+        return False
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.trace.wall_time(self.start), 6),
+            "offset": round(self.start - self.trace.start, 6),
+            "duration": round(self.duration, 6),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the exporters. With no exporters
+    spans are still timed, so callers can read durations, but nothing is kept.
+    """
+    def __init__(self, exporters=()):
+        self.logger = logging.getLogger(__name__)
+        self.exporters = list(exporters)
+
+    def add_exporter(self, exporter):
+        self.exporters.append(exporter)
+        return exporter
+
+    def start_trace(self, name="turn"):
+        return Trace(name)
+
+    def start_span(self, name, parent=None, start=None, **attributes):
+        """
+        Starts a span without making it current. parent may be a Span, a
+        Trace, or None for the thread's current span (or a new trace).
+        """
+        if parent is None:
+            parent = current_span()
+        if isinstance(parent, Span):
+            return Span(self, name, parent.trace, parent.span_id, start, attributes)
+        return Span(self, name, parent or Trace(), None, start, attributes)
+
+    def span(self, name, parent=None, **attributes):
+        """
+        Same as start_span; use with `with` to make it current and end it.
+        """
+        return self.start_span(name, parent, **attributes)
+
+    def record_span(self, name, start, end, parent=None, **attributes):
+        """
+        Records an operation that was timed elsewhere.
+        """
+        span = self.start_span(name, parent, start=start, **attributes)
+        span.end(end)
+        return span
+
+    def _finish(self, span):
+        if span.name == "playback" and "eom" in span.trace.marks and span.trace.mark("first_audio", span.start):
+            # end of the user's turn to the first sound of the reply
+            self.record_span("response", span.trace.marks["eom"], span.start, parent=span.trace)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                self.logger.error("Trace exporter %s failed: %s", type(exporter).__name__, e)
+
+    def close(self):
+        for exporter in self.exporters:
+            exporter.close()
+
+
+class BackgroundExporter:
+    """
+    Hands spans to another exporter on a background thread through a bounded
+    queue, so file and socket I/O never runs on the pipeline threads. When
+    the queue is full the span is dropped and counted; close() reports the
+    count after exporting everything still queued.
+
+    Parameters:
+        exporter: The exporter doing the work.
+        max_queue (int): Spans buffered before new ones are dropped.
+    """
+    def __init__(self, exporter, max_queue=10000):
+        self.logger = logging.getLogger(__name__)
+        self.exporter = exporter
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name=f"trace-{type(exporter).__name__}", daemon=True)
+        self._thread.start()
+
+    def export(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=None):
+        """
+        Blocks until every queued span has been exported. Returns False on
+        timeout.
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: self._queue.unfinished_tasks == 0, timeout)
+
+    def _run(self):
+        while True:
+            span = self._queue.get()
+            try:
+                if span is None:
+                    return
+                self.exporter.export(span)
+            except Exception as e:
+                self.logger.error("Trace exporter %s failed: %s", type(self.exporter).__name__, e)
+            finally:
+                self._queue.task_done()
+
+    def close(self, timeout=5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+        if self.dropped:
+            self.logger.warning("%d spans dropped, the %s queue was full", self.dropped,
+                                type(self.exporter).__name__)
+        self.exporter.close()
+
+
+class JsonlExporter:
+    """
+    Appends one JSON object per finished span to a file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+
+    def export(self, span):
+        line = json.dumps(span.as_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusExporter:
+    """
+    Aggregates span durations into histograms and numeric span attributes
+    into counters, rendered in the Prometheus text exposition format. The
+    text can be written to a file (for the node exporter's textfile
+    collector) and/or served over HTTP.
+
+    Parameters:
+        path (str): File rewritten at most every write_interval seconds.
+        port (int): Serve /metrics on this port; 0 picks a free port.
+        buckets (tuple): Histogram upper bounds in seconds.
+    """
+    def __init__(self, path=None, port=None, buckets=DEFAULT_BUCKETS, write_interval=5.0, host="127.0.0.1"):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.buckets = tuple(buckets)
+        self.write_interval = write_interval
+        self._lock = threading.Lock()
+        self._histograms = {}  # span name -> [bucket counts, sum, count]
+        self._attributes = {}  # (span name, attribute) -> total
+        self._last_write = 0.0
+        self._server = None
+        if port is not None:
+            self._serve(host, port)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def export(self, span):
+        duration = span.duration
+        with self._lock:
+            histogram = self._histograms.setdefault(span.name, [[0] * len(self.buckets), 0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += duration
+            histogram[2] += 1
+            for attribute, value in span.attributes.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    key = (span.name, attribute)
+                    self._attributes[key] = self._attributes.get(key, 0) + value
+            due = self.path and time.monotonic() - self._last_write >= self.write_interval
+        if due:
+            self.write()
+
+    def render(self):
+        lines = ["# HELP vocalai_span_seconds Duration of voice loop spans.",
+                 "# TYPE vocalai_span_seconds histogram"]
+        with self._lock:
+            for name in sorted(self._histograms):
+                bucket_counts, total, count = self._histograms[name]
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    lines.append(f'vocalai_span_seconds_bucket{{span="{name}",le="{bound}"}} {bucket_count}')
+                lines.append(f'vocalai_span_seconds_bucket{{span="{name}",le="+Inf"}} {count}')
+                lines.append(f'vocalai_span_seconds_sum{{span="{name}"}} {total}')
+                lines.append(f'vocalai_span_seconds_count{{span="{name}"}} {count}')
+            lines.append("# HELP vocalai_span_attribute_total Sum of numeric span attributes.")
+            lines.append("# TYPE vocalai_span_attribute_total counter")
+            for (name, attribute) in sorted(self._attributes):
+                lines.append(f'vocalai_span_attribute_total{{span="{name}",attribute="{attribute}"}} '
+                             f'{self._attributes[(name, attribute)]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """
+        Atomically replaces the metrics file.
+        """
+        if not self.path:
+            return
+        self._last_write = time.monotonic()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as metrics_file:
+            metrics_file.write(self.render())
+        os.replace(temp_path, self.path)
+
+    def _serve(self, host, port):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                exporter.logger.debug(format, *args)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, args=(0.5,), name="metrics-http", daemon=True).start()
+        self.logger.info("Serving metrics on %s", self.url)
+
+    def close(self):
+        self.write()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    return _tracer
+
+
+def current_span():
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def annotate(**attributes):
+    """
+    Sets attributes on the thread's current span, if there is one.
+    """
+    span = current_span()
+    if span is not None:
+        span.set(**attributes)
+
+
+def mark(name, at=None):
+    """
+    Marks a moment in the current span's trace, if there is one.
+    """
+    span = current_span()
+    if span is not None:
+        span.trace.mark(name, at)
+
+
+def configure(config):
+    """
+    Adds the exporters enabled in config: trace_path (JSONL spans),
+    metrics_path (Prometheus text file) and metrics_port (HTTP /metrics).
+    Each runs on its own background thread.
+    """
+    max_queue = getattr(config, "trace_queue_size", 10000)
+    trace_path = getattr(config, "trace_path", None)
+    if trace_path:
+        _tracer.add_exporter(BackgroundExporter(JsonlExporter(trace_path), max_queue))
+    metrics_path = getattr(config, "metrics_path", None)
+    metrics_port = getattr(config, "metrics_port", None)
+    if metrics_path or metrics_port is not None:
+        _tracer.add_exporter(BackgroundExporter(PrometheusExporter(path=metrics_path, port=metrics_port), max_queue))
+    return _tracer
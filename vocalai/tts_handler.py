@@ -1,17 +1,27 @@
 import logging
-import numpy as np
+import time
 import torch
-import wave
-from io import BytesIO
+from vocalai.audio_cache import AudioCache, cache_key
+from vocalai.pcm import PCMBuffer
+from vocalai.tracing import get_tracer
 from vocalai.util import suppress_output, restore_output
 
 class TTSHandler:
-    def __init__(self, config):
+    def __init__(self, config, cache=None):
         from TTS.api import TTS # move import so it can be mocked in tests
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        if self.device != "cuda":
-            raise RuntimeError("TTS requires a GPU")
         self.logger = logging.getLogger(__name__)
+        self.device = self._select_device(getattr(config, "tts_device", "auto"))
+        self.model_path = config.tts_model_path
+        self.cache = cache or AudioCache.from_config(config)
+        self.batch_chars = getattr(config, "tts_batch_chars", 400)
+        self.quantized = False
+        self.last_rtf = None
+
+        if self.device == "cpu":
+            threads = getattr(config, "tts_threads", None)
+            if threads:
+                torch.set_num_threads(threads)
+            self.logger.info("TTS running on CPU with %d intra-op threads", torch.get_num_threads())
 
         old_stdout, old_stderr, devnull = suppress_output()
         try:
@@ -21,15 +31,79 @@ class TTSHandler:
         finally:
             restore_output(old_stdout, old_stderr, devnull)
 
-    def get_audio(self, text):
-        wav_samples = self.tts_model.tts(text=text)
-        scaled_samples = np.int16(np.array(wav_samples, dtype=np.float32) * 32767)
-        wav_buffer = BytesIO()
-        with wave.open(wav_buffer, 'wb') as wav_bytes:
-            wav_bytes.setnchannels(1)
-            wav_bytes.setsampwidth(2)
-            wav_bytes.setframerate(48000)
-            wav_bytes.writeframes(bytearray(scaled_samples))
-        wav_buffer.seek(0)
-        return wav_buffer
+        if self.device == "cpu" and getattr(config, "tts_quantize", False):
+            self._quantize()
+        self.sample_rate = self._output_sample_rate()
+
+    def _select_device(self, requested):
+        if requested == "auto":
+            return "cuda" if torch.cuda.is_available() else "cpu"
+        if requested == "cuda" and not torch.cuda.is_available():
+            raise RuntimeError("TTS requires a GPU when tts_device is 'cuda'")
+        if requested not in ("cuda", "cpu"):
+            raise ValueError(f"Unknown tts_device: {requested}")
+        return requested
+
+    def _quantize(self):
+        """
+        Replaces the Linear layers of the underlying model with dynamically
+        quantized int8 versions, which run faster on CPU.
+        """
+        synthesizer = getattr(self.tts_model, "synthesizer", None)
+        model = getattr(synthesizer, "tts_model", None)
+        if not isinstance(model, torch.nn.Module):
+            self.logger.warning("TTS model does not expose a torch module, skipping quantization")
+            return
+        synthesizer.tts_model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.quantized = True
+        self.logger.info("TTS model dynamically quantized to int8")
+
+    @property
+    def model_id(self):
+        return self.model_path + ("+int8" if self.quantized else "")
+
+    @property
+    def audio_format(self):
+        return f"pcm_s16le/mono/{self.sample_rate}"
+
+    def _output_sample_rate(self):
+        rate = getattr(getattr(self.tts_model, "synthesizer", None), "output_sample_rate", None)
+        return rate if isinstance(rate, int) else 48000
+
+    def warm_up(self, _=None):
+        """Synthesize a short sentence, bypassing the cache, so the first turn is not a cold start."""
+        self.get_audio("Hello.", use_cache=False)
+
+    def get_audio(self, text, use_cache=True):
+        """
+        Synthesizes text and returns it as a PCMBuffer at the model's own
+        sample rate, ready for the player without any WAV encoding.
+        """
+        key = cache_key(text, self.model_id, self.audio_format)
+        with get_tracer().span("tts_synthesis", chars=len(text)) as span:
+            if use_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.logger.debug("TTS cache hit")
+                    pcm = PCMBuffer(cached, sample_rate=self.sample_rate)
+                    span.set(cached=True, audio_seconds=pcm.duration)
+                    return pcm
+
+            start = time.monotonic()
+            # one forward pass for the whole text instead of one per sentence
+            wav_samples = self.tts_model.tts(text=text, split_sentences=False)
+            self._record_rtf(time.monotonic() - start, len(wav_samples))
+
+            pcm = PCMBuffer.from_float(wav_samples, sample_rate=self.sample_rate)
+            span.set(cached=False, audio_seconds=pcm.duration, rtf=self.last_rtf)
+            if use_cache:
+                self.cache.put(key, bytes(pcm.data))
+            return pcm
 
+    def _record_rtf(self, synthesis_seconds, sample_count):
+        audio_seconds = sample_count / float(self.sample_rate)
+        if audio_seconds <= 0:
+            return
+        self.last_rtf = synthesis_seconds / audio_seconds
+        self.logger.info("TTS synthesized %.2fs of audio in %.2fs on %s (RTF %.2f)",
+                         audio_seconds, synthesis_seconds, self.device, self.last_rtf)
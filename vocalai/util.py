@@ -1,6 +1,8 @@
 import json
+import numpy as np
 import os
 import sys
+import wave
 
 def suppress_output():
     """Suppress stdout and stderr."""
@@ -29,6 +31,20 @@ def load_config(file_path):
     return config_dict
 
 
+def load_wav(file_path, rate=16000):
+    """Read a WAV file as mono int16 samples at the given rate."""
+    with wave.open(file_path, 'rb') as wave_file:
+        if wave_file.getsampwidth() != 2:
+            raise ValueError(f"Only 16-bit WAV files are supported: {file_path}")
+        samples = np.frombuffer(wave_file.readframes(wave_file.getnframes()), dtype=np.int16)
+        channels, file_rate = wave_file.getnchannels(), wave_file.getframerate()
+    samples = samples.reshape(-1, channels).mean(axis=1)
+    if file_rate != rate:
+        positions = np.arange(0, len(samples), file_rate / rate)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    return samples.astype(np.int16)
+
+
 class AppConfig:
     def __init__(self, config_dict):
         self.__dict__.update(config_dict)
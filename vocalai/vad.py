@@ -0,0 +1,178 @@
+import numpy as np
+
+SILENCE_FLOOR_DB = -120.0
+
+
+def level_db(samples):
+    """
+    Average absolute amplitude of int16 samples in dB relative to full scale.
+    """
+    samples = np.asarray(samples)
+    if samples.size == 0:
+        return SILENCE_FLOOR_DB
+    avg_amplitude = np.mean(np.abs(samples.astype(np.float32)))
+    if avg_amplitude == 0:
+        return SILENCE_FLOOR_DB
+    return float(20 * np.log10(avg_amplitude / 32768.0))
+
+
+def frame_levels_db(samples, frame_samples, full_scale=32768.0):
+    """
+    Per-frame levels in dBFS for every complete frame in samples, computed
+    in one vectorized pass. Trailing samples that do not fill a frame are
+    ignored. Use full_scale=1.0 for float audio in [-1, 1).
+    """
+    samples = np.asarray(samples)
+    frames = len(samples) // frame_samples
+    if frames == 0:
+        return np.empty(0, dtype=np.float32)
+    framed = samples[:frames * frame_samples].reshape(frames, frame_samples)
+    amplitude = np.abs(framed, dtype=np.float32).mean(axis=1) / np.float32(full_scale)
+    with np.errstate(divide="ignore"):
+        levels = 20 * np.log10(amplitude)
+    return np.maximum(levels, SILENCE_FLOOR_DB)
+
+
+def speech_regions(samples, rate=16000, threshold_db=-40.0, padding_seconds=0.2, max_pause_seconds=0.5,
+                   frame_seconds=0.02, full_scale=32768.0):
+    """
+    Finds the spans of samples that contain speech, using frame levels for
+    the whole recording at once.
+
+    Each span is widened by padding_seconds on both sides, and spans closer
+    than max_pause_seconds are merged so short pauses inside a sentence are
+    kept. Returns a list of (start, end) sample offsets.
+    """
+    frame_samples = max(1, int(frame_seconds * rate))
+    levels = frame_levels_db(samples, frame_samples, full_scale)
+    speech = levels >= threshold_db
+    if not speech.any():
+        return []
+
+    # widen every speech frame by the padding and fill the short gaps,
+    # both as one convolution over the frame mask
+    pad = int(round(padding_seconds / frame_seconds))
+    bridge = int(round(max_pause_seconds / frame_seconds))
+    kernel = np.ones(2 * pad + 1, dtype=np.int32)
+    padded = np.convolve(speech.astype(np.int32), kernel, mode="same") > 0
+    edges = np.diff(np.concatenate(([0], padded.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = np.concatenate(([True], starts[1:] - ends[:-1] > bridge))
+    merged_starts = starts[keep]
+    merged_ends = np.concatenate((ends[np.flatnonzero(keep)[1:] - 1], ends[-1:]))
+
+    total = len(samples)
+    return [(int(start) * frame_samples, min(total, int(end) * frame_samples if end < len(levels) else total))
+            for start, end in zip(merged_starts, merged_ends)]
+
+
+def trim_silence(samples, rate=16000, threshold_db=-40.0, padding_seconds=0.2, max_pause_seconds=0.5,
+                 full_scale=32768.0):
+    """
+    Cuts leading and trailing silence and pauses longer than
+    max_pause_seconds out of samples. Returns (trimmed, removed_seconds).
+    """
+    regions = speech_regions(samples, rate, threshold_db, padding_seconds, max_pause_seconds,
+                             full_scale=full_scale)
+    if not regions:
+        return samples[:0], len(samples) / float(rate)
+    if len(regions) == 1:
+        trimmed = samples[regions[0][0]:regions[0][1]]
+    else:
+        trimmed = np.concatenate([samples[start:end] for start, end in regions])
+    return trimmed, (len(samples) - len(trimmed)) / float(rate)
+
+
+class VoiceActivityDetector:
+    """
+    Energy based voice activity detector working on 20 ms frames.
+
+    Speech starts once min_speech_frames consecutive frames are louder than
+    threshold_db + hysteresis_db, and ends once the level has stayed below
+    threshold_db for longer than hangover_seconds. The two thresholds keep
+    the decision from flickering on levels close to the threshold.
+
+    Parameters:
+        rate (int): Sample rate of the int16 input.
+        threshold_db (float): Level in dBFS under which a frame is silence.
+        hysteresis_db (float): Extra level required to start speech.
+        hangover_seconds (float): Quiet time tolerated inside speech.
+    """
+    def __init__(self, rate=16000, threshold_db=-40.0, hysteresis_db=6.0, frame_seconds=0.02,
+                 hangover_seconds=0.2, min_speech_frames=3):
+        self.rate = rate
+        self.threshold_db = threshold_db
+        self.start_db = threshold_db + hysteresis_db
+        self.frame_samples = max(1, int(frame_seconds * rate))
+        self.frame_seconds = self.frame_samples / float(rate)
+        self.hangover_frames = int(round(hangover_seconds / self.frame_seconds))
+        self.min_speech_frames = min_speech_frames
+        self.reset()
+
+    def reset(self):
+        self.in_speech = False
+        self._loud_run = 0
+        self._quiet_run = 0
+        self._remainder = np.empty(0, dtype=np.int16)
+
+    def process(self, data):
+        """
+        Consumes a chunk of int16 PCM bytes and returns the speech/non-speech
+        decision for each complete frame in it.
+        """
+        samples = np.frombuffer(data, dtype=np.int16)
+        if len(self._remainder):
+            samples = np.concatenate((self._remainder, samples))
+        levels = frame_levels_db(samples, self.frame_samples)
+        self._remainder = samples[len(levels) * self.frame_samples:].copy()
+
+        loud = levels >= self.start_db
+        quiet = levels < self.threshold_db
+        decisions = np.empty(len(levels), dtype=bool)
+        for index in range(len(levels)):
+            self._loud_run = self._loud_run + 1 if loud[index] else 0
+            self._quiet_run = self._quiet_run + 1 if quiet[index] else 0
+            if not self.in_speech and self._loud_run >= self.min_speech_frames:
+                self.in_speech = True
+            elif self.in_speech and self._quiet_run > self.hangover_frames:
+                self.in_speech = False
+            decisions[index] = self.in_speech
+        return decisions
+
+
+class PauseEndpointer:
+    """
+    Decides when a turn is over: after speech has been heard, a continuous
+    pause of pause_seconds ends it. The pause is counted from the first
+    quiet frame, so the VAD's hangover is part of it rather than added to it.
+    """
+    def __init__(self, vad, pause_seconds=1.5):
+        self.vad = vad
+        self.pause_frames = int(round(pause_seconds / vad.frame_seconds))
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config, rate=16000):
+        vad = VoiceActivityDetector(rate=rate, threshold_db=getattr(config, "silence_threshold", -40.0))
+        return cls(vad, pause_seconds=getattr(config, "eom_pause_duration", 1.5))
+
+    def reset(self):
+        self.vad.reset()
+        self.speech_detected = False
+        self._pause_frames = 0
+
+    def feed(self, data):
+        """
+        Returns True once the end of the turn has been reached.
+        """
+        for is_speech in self.vad.process(data):
+            if is_speech:
+                self.speech_detected = True
+                self._pause_frames = 0
+            elif self.speech_detected:
+                # the VAD only ends speech after hangover_frames + 1 quiet frames
+                self._pause_frames = self._pause_frames + 1 if self._pause_frames else self.vad.hangover_frames + 1
+                if self._pause_frames >= self.pause_frames:
+                    return True
+        return False